@@ -4,8 +4,16 @@ import random
 import re
 import os
 import math
-import requests
+import time
+import asyncio
+import threading
 from pathlib import Path
+from llm_client import get_shared_client, LLMClientError
+from hedging import LatencyHistogram, HedgePolicy
+from circuit_breaker import CircuitBreaker, AIMDLimiter
+from llm_cache import LLMResponseCache
+from keyword_matcher import KeywordMatcher
+from formula_registry import shared_registry
 
 # Try to import dotenv, but don't fail if not available
 try:
@@ -14,10 +22,44 @@ try:
 except ImportError:
     print("dotenv not installed, skipping environment loading")
 
+# Words the query routing checks for besides the topic keywords; they are compiled
+# into the keyword matcher so every check is a set lookup
+ROUTING_KEYWORDS = (
+    'hi', 'hello', 'hey', 'what', 'what is', 'how', 'how do', 'how to calculate', 'how to find',
+    'formula', 'theorem', 'definition', 'explain', 'value', 'equal', 'find', 'calculate', 'determine',
+    'measure', 'add', 'plus', 'minus', 'subtract', 'multiplied', 'multiplication', 'divided',
+    'integration', 'kinematic', 'kinetic', 'potential', 'fundamental', 'gravitational',
+    'elementary charge', 'sine law', 'cosine law', 'soh cah toa', 'sohcahtoa', 'π'
+)
+
+# Questions answered by handle_specific_math_question
+SPECIFIC_QUESTION_PATTERN = re.compile('|'.join([
+    # Times tables questions
+    r'what is (\d+) times (\d+)',
+    r'what is (\d+) multiplied by (\d+)',
+    # Division questions
+    r'what is (\d+) divided by (\d+)',
+    r'what is (\d+) over (\d+)',
+    # Trigonometry questions
+    r'what is (sin|cos|tan) of (\d+) degrees',
+    r'what is (sin|cos|tan) (\d+)',
+    # Area/perimeter questions
+    r'area of (a|an)? (circle|square|triangle|rectangle) with (radius|side|base|height|width|length) (\d+)',
+    r'perimeter of (a|an)? (circle|square|triangle|rectangle) with (radius|side|base|height|width|length) (\d+)',
+    # Angle questions
+    r'(supplement|complement) of (\d+) degrees',
+    r'convert (\d+) (degrees|radians) to (degrees|radians)'
+]))
+
+ARITHMETIC_SYMBOLS_PATTERN = re.compile(r'\d[\+\-\*\/\^\(\)]\d')
+ARITHMETIC_WORDS_PATTERN = re.compile(r'\d+\s*(plus|minus|times|multiplied by|divided by|over)\s*\d+')
+
 class MathAIModel:
     def __init__(self, formulas_file):
         """Initialize the AI model with math knowledge"""
-        self.formulas = self.load_formulas(formulas_file)
+        # Flattened and indexed once, so formula lookups and searches don't walk the JSON,
+        # and rebuilt in the background when the formula file changes. Shared with MathProcessor.
+        self.formula_registry = shared_registry(formulas_file)
         self.math_topics = {
             'algebra': ['equation', 'solve', 'variable', 'expression', 'simplify', 'factor', 'expand', 'sequence', 'arithmetic', 'geometric', 'matrices', 'determinant', 'multiply', 'times', 'division', 'divide', 'fractions', 'exponent', 'power', 'roots', 'logarithm', 'factoring'],
             'geometry': ['area', 'perimeter', 'volume', 'circle', 'triangle', 'square', 'rectangle', 'sphere', 'cylinder', 'cone', 'prism', 'pyramid', 'shape', 'angle', 'degree', 'parallelogram', 'trapezoid', 'polygon', 'rhombus', 'cube', 'surface area', 'diameter', 'radius', 'height', 'width', 'length', 'diagonal', 'circumference'],
@@ -28,6 +70,27 @@ class MathAIModel:
             'constants': ['pi', 'e', 'avogadro', 'boltzmann', 'planck', 'speed of light', 'gravitational constant', 'golden ratio', 'phi', 'euler number']
         }
         
+        # Direct topic mentions take precedence over keyword scoring
+        self.direct_mentions = {
+            'algebra': ['algebra', 'algebraic', 'equation', 'polynomial', 'quadratic', 'linear'],
+            'geometry': ['geometry', 'geometric', 'shape', 'angle', 'circle', 'triangle', 'square'],
+            'trigonometry': ['trigonometry', 'trigonometric', 'sin', 'cos', 'tan', 'angle', 'soh', 'cah', 'toa'],
+            'calculus': ['calculus', 'derivative', 'integral', 'differentiate', 'integrate'],
+            'statistics': ['statistics', 'statistical', 'probability', 'mean', 'median', 'mode'],
+            'physics': ['physics', 'physical', 'force', 'motion', 'energy', 'mechanics'],
+            'constants': ['constant', 'pi', 'e', 'euler', 'avogadro', 'planck']
+        }
+        
+        # All routing keywords compiled into one automaton, matched in a single pass per query
+        self.keyword_topics = {}
+        for topic, keywords in self.math_topics.items():
+            for keyword in keywords:
+                self.keyword_topics.setdefault(keyword, []).append(topic)
+        vocabulary = set(self.keyword_topics) | set(ROUTING_KEYWORDS)
+        for mentions in self.direct_mentions.values():
+            vocabulary.update(mentions)
+        self.keyword_matcher = KeywordMatcher(vocabulary)
+        
         # AI Model Configuration
         self.use_advanced_ai = True
         self.primary_model = "claude_sonnet"  # "claude_sonnet" or "grok"
@@ -37,6 +100,39 @@ class MathAIModel:
         self.claude_api_key = os.getenv("ANTHROPIC_API_KEY", "")
         self.grok_api_key = os.getenv("GROK_API_KEY", "")
         
+        # Provider endpoints can be pointed at a local stub server for testing
+        self.claude_api_url = os.getenv("ANTHROPIC_API_URL", "https://api.anthropic.com/v1/messages")
+        self.grok_api_url = os.getenv("GROK_API_URL", "https://api.grok.com/v1/chat/completions")
+        
+        # Pooled keep-alive HTTP client shared by all provider calls
+        self.http_client = get_shared_client()
+        if self.http_client is None:
+            self.use_advanced_ai = False
+        
+        # Hedging: if the primary is slower than its usual p95, race the other provider
+        self.hedge_requests = True
+        self.hedge_policy = HedgePolicy.from_env()
+        self.provider_latency = {
+            'claude_sonnet': LatencyHistogram(),
+            'grok': LatencyHistogram()
+        }
+        self.hedge_stats = {'requests': 0, 'hedged': 0, 'primary_wins': 0, 'secondary_wins': 0}
+        # Hedged calls run on many request threads and event loops at once
+        self._hedge_lock = threading.Lock()
+        
+        # Failing or overloaded providers are skipped instead of paying for a doomed call
+        self.circuit_breakers = {
+            'claude_sonnet': CircuitBreaker.from_env('claude_sonnet'),
+            'grok': CircuitBreaker.from_env('grok')
+        }
+        self.concurrency_limiters = {
+            'claude_sonnet': AIMDLimiter.from_env(),
+            'grok': AIMDLimiter.from_env()
+        }
+        
+        # Answers to questions asked before (after normalizing) skip the providers
+        self.response_cache = LLMResponseCache.from_env()
+        
         # Greeting templates
         self.greetings = [
             "Hello! How can I help with math today?",
@@ -63,102 +159,64 @@ class MathAIModel:
             ]
         }
 
-    def load_formulas(self, formulas_file):
-        """Load math formulas from JSON file"""
-        try:
-            with open(formulas_file, 'r') as file:
-                return json.load(file)
-        except Exception as e:
-            print(f"Error loading formulas: {e}")
-            return {"formulas": {}}
+    # The formula data currently in use. A reload can replace it at any time,
+    # so code that makes several calls should read formula_registry.current() once.
+    @property
+    def formulas(self):
+        return self.formula_registry.current().formulas
+
+    @property
+    def formula_store(self):
+        return self.formula_registry.current().store
+
+    @property
+    def formula_search(self):
+        return self.formula_registry.current().search
+
+    @property
+    def formula_suggester(self):
+        return self.formula_registry.current().suggester
 
     def get_formula(self, category, topic=None):
         """Get a formula from a specific category"""
-        try:
-            if topic:
-                formula_data = self.formulas["formulas"][category].get(topic, None)
-                if formula_data:
-                    if isinstance(formula_data, dict):
-                        # If it's a nested dictionary (like circle with area, circumference)
-                        result = []
-                        for sub_name, sub_formula in formula_data.items():
-                            # Handle potentially deeper nesting
-                            if isinstance(sub_formula, dict):
-                                result.append(f"{topic} {sub_name}:")
-                                for sub_sub_name, sub_sub_formula in sub_formula.items():
-                                    result.append(f"  • {sub_sub_name}: {sub_sub_formula}")
-                            else:
-                                result.append(f"{topic} {sub_name}: {sub_formula}")
-                        return "\n".join(result)
-                    else:
-                        return f"{topic}: {formula_data}"
-                else:
-                    return f"Formula for {topic} not found in {category}."
-            else:
-                # Return all formulas in the category
-                formulas = self.formulas["formulas"].get(category, {})
-                if not formulas:
-                    return f"No formulas found for {category}."
-                
-                result = []
-                # For large formula collections, limit to a reasonable number
-                max_formulas = 15
-                formula_count = 0
-                
-                for name, formula in formulas.items():
-                    if formula_count >= max_formulas:
-                        result.append(f"... and more {category} formulas (ask for specific topics for more details)")
-                        break
-                        
-                    if isinstance(formula, dict):
-                        # If it's a nested dictionary
-                        result.append(f"{name}:")
-                        sub_count = 0
-                        for sub_name, sub_formula in formula.items():
-                            if sub_count < 3:  # Limit to 3 subformulas per topic
-                                if isinstance(sub_formula, dict):
-                                    result.append(f"  • {sub_name}: (complex formula - ask specifically for details)")
-                                else:
-                                    result.append(f"  • {sub_name}: {sub_formula}")
-                                sub_count += 1
-                            formula_count += 1
-                            if formula_count >= max_formulas:
-                                break
-                        if sub_count >= 3:
-                            result.append(f"  • ... and more formulas for {name}")
-                    else:
-                        result.append(f"{name}: {formula}")
-                        formula_count += 1
-                
-                return "\n".join(result)
-        except Exception as e:
-            print(f"Error getting formula: {e}")
-            return "Formula not found."
+        store = self.formula_store
+        if not store.has_category(category):
+            return f"No formulas found for {category}." if not topic else "Formula not found."
+        if topic:
+            formula = store.topic_text(category, topic)
+            return formula if formula is not None else f"Formula for {topic} not found in {category}."
+        
+        # Return all formulas in the category
+        formulas = store.category_text(category)
+        return formulas if formulas is not None else f"No formulas found for {category}."
 
-    def detect_math_expression(self, text):
+    def detect_math_expression(self, text, hits=None):
         """Detect if the input contains a math expression to evaluate"""
+        if hits is None:
+            hits = self.keyword_matcher.find(text)
+        
         # Skip detection if this is asking about a formula or explanation
-        if any(word in text.lower() for word in ['formula', 'explain', 'what is', 'definition']):
+        if hits.any(['formula', 'explain', 'what is', 'definition']):
             return False
             
         # Skip detection if this is a question about solving quadratic equation
-        if 'quadratic' in text.lower() and 'equation' in text.lower() and any(word in text.lower() for word in ['solve', 'how']):
+        if 'quadratic' in hits and 'equation' in hits and hits.any(['solve', 'how']):
             return False
             
         # Skip if asking about trigonometric functions
-        if any(trig in text.lower() for trig in ['sin', 'cos', 'tan', 'soh', 'cah', 'toa']):
+        if hits.any(['sin', 'cos', 'tan', 'soh', 'cah', 'toa']):
             return False
             
         # Skip if asking about integration or differentiation
-        if any(calc in text.lower() for calc in ['integrate', 'derivative', 'differentiate']):
+        if hits.any(['integrate', 'derivative', 'differentiate']):
             return False
             
         # Check for basic arithmetic with symbols
-        if re.search(r'\d[\+\-\*\/\^\(\)]\d', text):
+        if ARITHMETIC_SYMBOLS_PATTERN.search(text):
             return True
             
         # Check for arithmetic with words
-        if re.search(r'\d+\s*(plus|minus|times|multiplied by|divided by|over)\s*\d+', text.lower()):
+        if ARITHMETIC_WORDS_PATTERN.search(hits.text):
             return True
         
         # Check for equation
@@ -167,53 +225,35 @@ class MathAIModel:
             
         return False
 
-    def identify_topic(self, user_input):
+    def identify_topic(self, user_input, hits=None):
         """Identify which math topic the query relates to"""
-        user_input = user_input.lower()
-        
-        # Direct topic mentions take precedence
-        direct_mentions = {
-            'algebra': ['algebra', 'algebraic', 'equation', 'polynomial', 'quadratic', 'linear'],
-            'geometry': ['geometry', 'geometric', 'shape', 'angle', 'circle', 'triangle', 'square'],
-            'trigonometry': ['trigonometry', 'trigonometric', 'sin', 'cos', 'tan', 'angle', 'soh', 'cah', 'toa'],
-            'calculus': ['calculus', 'derivative', 'integral', 'differentiate', 'integrate'],
-            'statistics': ['statistics', 'statistical', 'probability', 'mean', 'median', 'mode'],
-            'physics': ['physics', 'physical', 'force', 'motion', 'energy', 'mechanics'],
-            'constants': ['constant', 'pi', 'e', 'euler', 'avogadro', 'planck']
-        }
+        if hits is None:
+            hits = self.keyword_matcher.find(user_input)
         
         # First check for direct mentions of topics
-        for topic, mentions in direct_mentions.items():
-            if any(mention in user_input for mention in mentions):
+        for topic, mentions in self.direct_mentions.items():
+            if hits.any(mentions):
                 return topic
         
-        # Then check using the expanded keyword list with scoring
-        topic_scores = {}
-        for topic, keywords in self.math_topics.items():
-            score = 0
-            matched_keywords = []
-            
-            for keyword in keywords:
-                if keyword in user_input:
-                    # Give higher score to longer keyword matches
-                    score += len(keyword)
-                    matched_keywords.append(keyword)
-            
-            if score > 0:
-                topic_scores[topic] = score
+        # Then score the topics by the keywords found, giving higher scores to longer keywords
+        scores = {}
+        for keyword in hits:
+            for topic in self.keyword_topics.get(keyword, ()):
+                scores[topic] = scores.get(topic, 0) + len(keyword)
+        topic_scores = {topic: scores[topic] for topic in self.math_topics if topic in scores}
         
         if topic_scores:
             # Return the topic with the highest score
             return max(topic_scores, key=topic_scores.get)
         
         # Handle specific operations that might not be captured by keywords
-        if any(op in user_input for op in ['times', 'multiply', 'multiplied', 'multiplication', 'divided', 'division', 'plus', 'add', 'minus', 'subtract']):
+        if hits.any(['times', 'multiply', 'multiplied', 'multiplication', 'divided', 'division', 'plus', 'add', 'minus', 'subtract']):
             return 'algebra'
             
-        if any(shape in user_input for shape in ['circle', 'square', 'triangle', 'rectangle', 'sphere', 'cube', 'cone', 'cylinder']):
+        if hits.any(['circle', 'square', 'triangle', 'rectangle', 'sphere', 'cube', 'cone', 'cylinder']):
             return 'geometry'
             
-        if 'angle' in user_input or 'degree' in user_input or 'radian' in user_input:
+        if 'angle' in hits or 'degree' in hits or 'radian' in hits:
             return 'trigonometry'
             
         # Default return if no topic identified
@@ -221,113 +261,364 @@ class MathAIModel:
             
     def call_claude_api(self, query):
         """Call Claude Sonnet 3.5 API to solve math problems"""
+        try:
+            return self.http_client.run(self.acall_claude_api(query))
+        except Exception as e:
+            print(f"Error calling Claude API: {e}")
+            return None
+    
+    def _claude_request(self, query, stream=False):
+        """Headers and payload for a Claude Messages API request"""
+        headers = {
+            "x-api-key": self.claude_api_key,
+            "anthropic-version": "2023-06-01",
+            "content-type": "application/json"
+        }
+        
+        payload = {
+            "model": "claude-3-sonnet-20240229",
+            "max_tokens": 2048,
+            "messages": [
+                {"role": "user", "content": f"Solve this math problem and explain step by step: {query}"}
+            ]
+        }
+        if stream:
+            payload["stream"] = True
+        return headers, payload
+    
+    async def acall_claude_api(self, query):
+        """Async version of call_claude_api"""
         try:
             # Claude API requires a specific format
             if not self.claude_api_key:
                 return None
                 
-            headers = {
-                "x-api-key": self.claude_api_key,
-                "content-type": "application/json"
-            }
+            headers, payload = self._claude_request(query)
+            status, result = await self.http_client.apost_json(self.claude_api_url, headers, payload)
             
-            payload = {
-                "model": "claude-3-sonnet-20240229",
-                "max_tokens": 2048,
-                "messages": [
-                    {"role": "user", "content": f"Solve this math problem and explain step by step: {query}"}
-                ]
-            }
-            
-            response = requests.post(
-                "https://api.anthropic.com/v1/messages",
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
+            if status == 200 and result:
                 if 'content' in result and len(result['content']) > 0:
                     # Extract the text content from Claude's response
                     return result['content'][0]['text']
             
-            print(f"Claude API error: {response.status_code}")
+            print(f"Claude API error: {status}")
             return None
         except Exception as e:
             print(f"Error calling Claude API: {e}")
             return None
     
+    async def astream_claude_api(self, query):
+        """Yield Claude's answer in text chunks using the streaming Messages API"""
+        headers, payload = self._claude_request(query, stream=True)
+        async for line in self.http_client.astream_lines(self.claude_api_url, headers, payload):
+            if not line.startswith('data:'):
+                continue
+            event = json.loads(line[5:])
+            if event.get('type') == 'content_block_delta':
+                text = event.get('delta', {}).get('text')
+                if text:
+                    yield text
+            elif event.get('type') == 'error':
+                raise LLMClientError(f"Claude stream error: {event.get('error')}")
+            elif event.get('type') == 'message_stop':
+                break
+    
     def call_grok_api(self, query):
         """Call Grok's advanced AI API to solve math problems"""
+        try:
+            return self.http_client.run(self.acall_grok_api(query))
+        except Exception as e:
+            print(f"Error calling Grok API: {e}")
+            return None
+    
+    def _grok_request(self, query, stream=False):
+        """Headers and payload for a Grok chat completions request"""
+        headers = {
+            "Authorization": f"Bearer {self.grok_api_key}",
+            "Content-Type": "application/json"
+        }
+        
+        payload = {
+            "messages": [
+                {"role": "user", "content": f"Solve this math problem step by step: {query}"}
+            ],
+            "model": "grok-advanced-math",
+            "temperature": 0.2,
+            "max_tokens": 2048
+        }
+        if stream:
+            payload["stream"] = True
+        return headers, payload
+    
+    async def acall_grok_api(self, query):
+        """Async version of call_grok_api"""
         try:
             if not self.grok_api_key:
                 return None
                 
-            headers = {
-                "Authorization": f"Bearer {self.grok_api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            payload = {
-                "messages": [
-                    {"role": "user", "content": f"Solve this math problem step by step: {query}"}
-                ],
-                "model": "grok-advanced-math",
-                "temperature": 0.2,
-                "max_tokens": 2048
-            }
+            headers, payload = self._grok_request(query)
+            status, result = await self.http_client.apost_json(self.grok_api_url, headers, payload)
             
-            response = requests.post(
-                "https://api.grok.com/v1/chat/completions",
-                headers=headers,
-                json=payload
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
+            if status == 200 and result:
                 if 'choices' in result and len(result['choices']) > 0:
                     return result['choices'][0]['message']['content']
             
-            print(f"Grok API error: {response.status_code}")
+            print(f"Grok API error: {status}")
             return None
         except Exception as e:
             print(f"Error calling Grok API: {e}")
             return None
+    
+    async def astream_grok_api(self, query):
+        """Yield Grok's answer in text chunks using the streaming chat completions API"""
+        headers, payload = self._grok_request(query, stream=True)
+        async for line in self.http_client.astream_lines(self.grok_api_url, headers, payload):
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            choices = json.loads(data).get('choices') or []
+            if choices:
+                text = (choices[0].get('delta') or {}).get('content')
+                if text:
+                    yield text
+            
+    def provider_available(self, provider):
+        """Whether a provider has an API key and its circuit breaker would let a call through"""
+        api_key = self.claude_api_key if provider == 'claude_sonnet' else self.grok_api_key
+        return bool(api_key) and self.circuit_breakers[provider].is_available()
+
+    def _reserve_provider(self, provider):
+        """Take a call slot from a provider's circuit breaker and concurrency limit.
+
+        Returns False straight away if the provider has no key, its breaker
+        is open or it is at its concurrency limit.
+        """
+        api_key = self.claude_api_key if provider == 'claude_sonnet' else self.grok_api_key
+        if not api_key:
+            return False
+        
+        breaker = self.circuit_breakers[provider]
+        if not breaker.allow_request():
+            return False
+        if not self.concurrency_limiters[provider].try_acquire():
+            breaker.release()
+            return False
+        return True
+
+    async def _areserve_provider(self, provider):
+        """Like _reserve_provider, but waits for a free concurrency slot instead
+        of giving up; the caller's overall timeout bounds the wait"""
+        if not self.provider_available(provider):
+            return False
+        limiter = self.concurrency_limiters[provider]
+        if not await limiter.acquire():
+            return False
+        if not self.circuit_breakers[provider].allow_request():
+            limiter.release()
+            return False
+        return True
+
+    def _settle_provider(self, provider, succeeded, latency, observe_latency=True):
+        """Give back a reserved call slot and record how the call went.
+        succeeded=None means the call was cancelled (e.g. it lost a hedge race)."""
+        breaker = self.circuit_breakers[provider]
+        self.concurrency_limiters[provider].release(succeeded, latency)
+        if succeeded is None:
+            breaker.release()
+        elif succeeded:
+            breaker.record_success(latency)
+            if observe_latency:
+                self.provider_latency[provider].observe(latency)
+        else:
+            breaker.record_failure()
+
+    async def acall_provider(self, provider, query):
+        """Call one provider by name through its circuit breaker and concurrency
+        limit, waiting for a slot when the provider is at its limit"""
+        call = self.acall_claude_api if provider == 'claude_sonnet' else self.acall_grok_api
+        if not await self._areserve_provider(provider):
+            return None
+        
+        start = time.monotonic()
+        succeeded = None  # stays None if the call is cancelled
+        try:
+            solution = await call(query)
+            succeeded = bool(solution)
+            return solution
+        finally:
+            self._settle_provider(provider, succeeded, time.monotonic() - start)
+
+    def stream_advanced_solution(self, query):
+        """Yield an advanced AI answer in chunks as the provider writes it.
+
+        The primary model streams first; if it fails before writing anything
+        the other model is tried. Streams are not hedged, and their latency
+        (time to the first chunk) is kept out of the hedging histograms.
+        """
+        if not self.use_advanced_ai:
+            return
+        cached = self.cached_solution(query)
+        if cached is not None:
+            yield cached
+            return
+        
+        primary = self.primary_model
+        secondary = 'grok' if primary == 'claude_sonnet' else 'claude_sonnet'
+        providers = [primary, secondary] if self.fallback_to_basic else [primary]
+        
+        for provider in providers:
+            if not self._reserve_provider(provider):
+                continue
+            stream = self.astream_claude_api if provider == 'claude_sonnet' else self.astream_grok_api
+            start = time.monotonic()
+            first_chunk = None
+            succeeded = None  # stays None if the client goes away mid-stream
+            chunks = []
+            try:
+                for chunk in self.http_client.iter_async(stream(query)):
+                    if first_chunk is None:
+                        first_chunk = time.monotonic() - start
+                    chunks.append(chunk)
+                    yield chunk
+                succeeded = first_chunk is not None
+                if succeeded and self.response_cache is not None:
+                    self.response_cache.put(query, ''.join(chunks), latency=time.monotonic() - start)
+            except Exception as e:
+                print(f"Error streaming from {provider}: {e}")
+                succeeded = False
+            finally:
+                latency = first_chunk if first_chunk is not None else time.monotonic() - start
+                self._settle_provider(provider, succeeded, latency, observe_latency=False)
             
+            if first_chunk is not None:
+                if not succeeded:
+                    yield "\n\n(The answer was cut off. Please try again.)"
+                return
+
+    def cached_solution(self, query):
+        """Answer from the response cache, or None"""
+        if self.response_cache is None:
+            return None
+        return self.response_cache.get(query)
+
     def get_advanced_solution(self, query):
         """Get solution from advanced AI models (Claude or Grok)"""
         if not self.use_advanced_ai:
             return None
+        cached = self.cached_solution(query)
+        if cached is not None:
+            return cached
+        # Go straight to the local fallback when no provider can take the call
+        if not any(self.provider_available(provider) for provider in self.circuit_breakers):
+            return None
+        try:
+            return self.http_client.run(self._asolve_and_cache(query))
+        except Exception as e:
+            print(f"Error getting advanced solution: {e}")
+            return None
+
+    async def aget_advanced_solution(self, query):
+        """Async version of get_advanced_solution"""
+        if not self.use_advanced_ai:
+            return None
+        # The response cache reads from disk, which must not block the event loop
+        cached = await asyncio.get_running_loop().run_in_executor(None, self.cached_solution, query)
+        if cached is not None:
+            return cached
+        if not any(self.provider_available(provider) for provider in self.circuit_breakers):
+            return None
+        return await self._asolve_and_cache(query)
+
+    async def _asolve_and_cache(self, query):
+        """Ask the providers and remember a good answer"""
+        start = time.monotonic()
+        solution = await self._arace_providers(query)
+        if solution and self.response_cache is not None:
+            latency = time.monotonic() - start
+            await asyncio.get_running_loop().run_in_executor(
+                None, lambda: self.response_cache.put(query, solution, latency=latency))
+        return solution
+
+    async def _arace_providers(self, query):
+        """Ask the providers for an answer.
+
+        The primary model is asked first. If it fails, or hasn't answered
+        within the hedge delay, the other model is asked too and the first
+        good answer wins; the slower request is cancelled.
+        """
+        primary = self.primary_model
+        secondary = 'grok' if primary == 'claude_sonnet' else 'claude_sonnet'
+        if not self.fallback_to_basic:
+            return await self.acall_provider(primary, query)
+        
+        self._record_hedge('requests')
+        delay = self.hedge_policy.delay_for(self.provider_latency[primary]) if self.hedge_requests else None
+        
+        primary_task = asyncio.ensure_future(self.acall_provider(primary, query))
+        tasks = {primary_task: primary}
+        try:
+            # Wait for the primary until the hedge delay (or until it finishes, without hedging)
+            done, pending = await asyncio.wait([primary_task], timeout=delay)
+            if primary_task in done and primary_task.result():
+                self._record_hedge('primary_wins')
+                return primary_task.result()
             
-        # Try primary model first
-        if self.primary_model == "claude_sonnet":
-            solution = self.call_claude_api(query)
-            if solution:
-                return solution
-            elif self.fallback_to_basic:
-                # Try Grok as fallback
-                solution = self.call_grok_api(query)
-                if solution:
-                    return solution
-        else:  # Grok is primary
-            solution = self.call_grok_api(query)
-            if solution:
-                return solution
-            elif self.fallback_to_basic:
-                # Try Claude as fallback
-                solution = self.call_claude_api(query)
-                if solution:
-                    return solution
-                    
-        return None
+            # The primary failed or is slow: race the secondary against it
+            if pending:
+                self._record_hedge('hedged')
+            tasks[asyncio.ensure_future(self.acall_provider(secondary, query))] = secondary
+            pending = {task for task in tasks if not task.done()}
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    solution = task.result()
+                    if solution:
+                        winner = 'primary_wins' if tasks[task] == primary else 'secondary_wins'
+                        self._record_hedge(winner)
+                        return solution
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _record_hedge(self, name):
+        with self._hedge_lock:
+            self.hedge_stats[name] += 1
+
+    def _hedge_snapshot(self):
+        with self._hedge_lock:
+            return dict(self.hedge_stats)
+
+    def provider_status(self):
+        """Circuit breaker, concurrency, latency and hedging status of the LLM providers"""
+        primary = self.primary_model
+        return {
+            'primary_model': primary,
+            'hedge_delay': self.hedge_policy.delay_for(self.provider_latency[primary]),
+            'hedge_stats': self._hedge_snapshot(),
+            'response_cache': self.response_cache.stats() if self.response_cache is not None else None,
+            'providers': {
+                name: {
+                    'configured': bool(self.claude_api_key if name == 'claude_sonnet' else self.grok_api_key),
+                    'circuit_breaker': self.circuit_breakers[name].status(),
+                    'concurrency': self.concurrency_limiters[name].status(),
+                    'latency': self.provider_latency[name].summary()
+                }
+                for name in self.circuit_breakers
+            }
+        }
 
     def process_query(self, user_input):
         """Process the user's query and generate a response"""
         original_input = user_input
-        user_input = user_input.lower()
+        hits = self.keyword_matcher.find(user_input)
         
         # Check if it's a greeting
-        if any(greeting in user_input for greeting in ['hi', 'hello', 'hey']):
+        if hits.any(['hi', 'hello', 'hey']):
             return random.choice(self.greetings)
         
         # First, try to get solution from advanced AI
@@ -335,18 +626,62 @@ class MathAIModel:
             advanced_solution = self.get_advanced_solution(original_input)
             if advanced_solution:
                 return advanced_solution
-                
+
         # If advanced AI didn't provide a solution, fall back to basic processing
+        return self._basic_response(original_input, hits)
+
+    async def aprocess_query(self, user_input):
+        """Async version of process_query: provider calls are awaited instead of blocking a thread"""
+        hits = self.keyword_matcher.find(user_input)
+        if hits.any(['hi', 'hello', 'hey']):
+            return random.choice(self.greetings)
+
+        if self.use_advanced_ai:
+            try:
+                advanced_solution = await asyncio.wait_for(self.aget_advanced_solution(user_input),
+                                                           self.http_client.total_timeout)
+            except Exception as e:
+                print(f"Error getting advanced solution: {e}")
+                advanced_solution = None
+            if advanced_solution:
+                return advanced_solution
+
+        # The built-in answers do regex and formula work; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self._basic_response, user_input, hits)
+
+    def stream_query(self, user_input):
+        """Like process_query, but yields the answer in chunks as the provider writes it"""
+        hits = self.keyword_matcher.find(user_input)
+        if hits.any(['hi', 'hello', 'hey']):
+            yield random.choice(self.greetings)
+            return
+
+        if self.use_advanced_ai:
+            streamed = False
+            for chunk in self.stream_advanced_solution(user_input):
+                streamed = True
+                yield chunk
+            if streamed:
+                return
+
+        yield self._basic_response(user_input, hits)
+
+    def _basic_response(self, original_input, hits=None):
+        """Answer a query from the built-in formulas and explanations"""
+        user_input = original_input.lower()
+        if hits is None:
+            hits = self.keyword_matcher.find(user_input)
+
         # Identify the math topic
-        topic = self.identify_topic(user_input)
+        topic = self.identify_topic(user_input, hits)
         
         # Detect if this is a math expression to evaluate (like "2+2")
-        if self.detect_math_expression(user_input):
+        if self.detect_math_expression(user_input, hits):
             return f"I detected a math expression. To calculate {original_input}, please use the main input field or type 'calculate' followed by your expression."
         
         # Special case for basic operations
-        if ('what is' in user_input or 'how do' in user_input or 'explain' in user_input) and any(op in user_input for op in ['times', 'multiply', 'division', 'divide']):
-            if 'times' in user_input or 'multiply' in user_input:
+        if ('what is' in hits or 'how do' in hits or 'explain' in hits) and hits.any(['times', 'multiply', 'division', 'divide']):
+            if 'times' in hits or 'multiply' in hits:
                 return """Multiplication (often called "times") is a mathematical operation where numbers are added to themselves a specified number of times.
                 
 For example:
@@ -372,7 +707,7 @@ Important properties:
 - Division is not associative: (a ÷ b) ÷ c ≠ a ÷ (b ÷ c)"""
                 
         # Special case for trigonometry (SOH-CAH-TOA)
-        if any(trig in user_input for trig in ['soh cah toa', 'soh-cah-toa', 'sohcahtoa']):
+        if hits.any(['soh cah toa', 'soh-cah-toa', 'sohcahtoa']):
             return """SOH-CAH-TOA is a mnemonic used to remember the three basic trigonometric functions:
 
 SOH = Sine equals Opposite over Hypotenuse
@@ -390,7 +725,7 @@ In a right triangle:
 - The adjacent side is next to the angle you're focusing on"""
             
         # Special case for angles and degrees
-        if ('angle' in user_input or 'degree' in user_input) and ('what' in user_input or 'explain' in user_input or 'measure' in user_input):
+        if ('angle' in hits or 'degree' in hits) and ('what' in hits or 'explain' in hits or 'measure' in hits):
             return """Angles measure the amount of rotation between two lines that meet at a common point (vertex).
 
 Angles are commonly measured in:
@@ -410,7 +745,7 @@ The formula to convert between degrees and radians is:
 - Degrees = Radians × (180/π)"""
             
         # Special case for integral formulas
-        if ('integral' in user_input or 'integration' in user_input) and 'formula' in user_input:
+        if ('integral' in hits or 'integration' in hits) and 'formula' in hits:
             return """Integration (finding integrals) is a fundamental concept in calculus.
 
 Basic integral formulas:
@@ -431,11 +766,11 @@ Integration techniques:
 - Integration by Parts: ∫ u(x)v'(x) dx = u(x)v(x) - ∫ v(x)u'(x) dx"""
             
         # Special case for circle area formula
-        if 'circle' in user_input and 'area' in user_input and 'formula' in user_input:
+        if 'circle' in hits and 'area' in hits and 'formula' in hits:
             return "The formula for the area of a circle is: A = πr², where r is the radius of the circle."
             
         # Special case for quadratic equations
-        if 'quadratic' in user_input and 'equation' in user_input:
+        if 'quadratic' in hits and 'equation' in hits:
             # Extract the actual equation if possible
             equation_match = re.search(r'x\^2\s*[\+\-]\s*\d+x\s*[\+\-]\s*\d+\s*=\s*0', user_input)
             if not equation_match:
@@ -518,10 +853,10 @@ For example, with x² + 5x + 6 = 0:
 - So x = -2 or x = -3"""
             
         # Special case for geometry formulas
-        if 'formula' in user_input and 'geometry' in user_input:
+        if 'formula' in hits and 'geometry' in hits:
             shape = None
             for shape_name in ['circle', 'triangle', 'square', 'rectangle', 'sphere', 'cylinder', 'cone', 'prism', 'pyramid']:
-                if shape_name in user_input:
+                if shape_name in hits:
                     shape = shape_name
                     break
             
@@ -533,10 +868,10 @@ For example, with x² + 5x + 6 = 0:
                 return f"Here are some geometry formulas:\n{formulas}"
         
         # Special case for physics formulas
-        if 'formula' in user_input and 'physics' in user_input:
+        if 'formula' in hits and 'physics' in hits:
             branch = None
             for branch_name in ['mechanics', 'thermodynamics', 'electromagnetism', 'waves', 'optics', 'quantum', 'relativity']:
-                if branch_name in user_input:
+                if branch_name in hits:
                     branch = branch_name
                     break
             
@@ -548,10 +883,10 @@ For example, with x² + 5x + 6 = 0:
                 return f"Here are some physics formulas:\n{formulas}"
         
         # Special case for physical constants
-        if ('constant' in user_input or 'value' in user_input) and any(const in user_input for const in ['physics', 'physical', 'fundamental']):
+        if ('constant' in hits or 'value' in hits) and hits.any(['physics', 'physical', 'fundamental']):
             constant = None
             for const_name in ['pi', 'speed of light', 'planck', 'gravitational', 'boltzmann', 'avogadro', 'elementary charge']:
-                if const_name in user_input:
+                if const_name in hits:
                     constant = const_name
                     break
             
@@ -563,7 +898,7 @@ For example, with x² + 5x + 6 = 0:
                 return f"Here are some fundamental physical constants:\n{constants}"
         
         # Check if it's asking for a formula
-        if 'formula' in user_input or 'equation' in user_input or any(q in user_input for q in ['what is', 'how to calculate', 'how to find']):
+        if 'formula' in hits or 'equation' in hits or hits.any(['what is', 'how to calculate', 'how to find']):
             # Direct formula mappings for common requests
             formula_mappings = {
                 'area circle': ('geometry', 'circle', 'The formula for the area of a circle is: A = πr²'),
@@ -583,7 +918,7 @@ For example, with x² + 5x + 6 = 0:
             
             # Check for direct formula matches
             for key_phrase, (category, subtopic, direct_answer) in formula_mappings.items():
-                if all(word in user_input for word in key_phrase.split()):
+                if hits.all(key_phrase.split()):
                     if direct_answer:
                         return direct_answer
                     elif subtopic:
@@ -597,7 +932,7 @@ For example, with x² + 5x + 6 = 0:
                 matched_keywords = []
                 
                 for keyword in self.math_topics[topic]:
-                    if keyword in user_input:
+                    if keyword in hits:
                         matched_keywords.append(keyword)
                 
                 # Choose the longest keyword match
@@ -608,38 +943,38 @@ For example, with x² + 5x + 6 = 0:
                 if topic == 'physics':
                     # Check for specific physics branches
                     for branch in ['mechanics', 'thermodynamics', 'electromagnetism', 'waves', 'optics', 'quantum', 'relativity']:
-                        if branch in user_input:
+                        if branch in hits:
                             formula_name = branch
                             break
                     
                     # Check for specific mechanics terms
-                    if 'mechanics' in user_input or any(term in user_input for term in ['force', 'motion', 'energy', 'power', 'work']):
+                    if 'mechanics' in hits or hits.any(['force', 'motion', 'energy', 'power', 'work']):
                         # Handle mechanics subtopics
-                        if 'kinematic' in user_input or any(term in user_input for term in ['velocity', 'acceleration', 'displacement']):
+                        if 'kinematic' in hits or hits.any(['velocity', 'acceleration', 'displacement']):
                             return self.get_formula('physics', 'mechanics')
-                        if 'energy' in user_input or 'potential' in user_input or 'kinetic' in user_input:
+                        if 'energy' in hits or 'potential' in hits or 'kinetic' in hits:
                             return self.get_formula('physics', 'mechanics')
                             
                 elif topic == 'calculus':
                     # Check for specific calculus topics
                     for calc_topic in ['derivative', 'integral', 'limit', 'series']:
-                        if calc_topic in user_input:
+                        if calc_topic in hits:
                             formula_name = calc_topic
                             break
                             
                 elif topic == 'trigonometry':
                     # Handle specific trig formulas
-                    if any(trig in user_input for trig in ['sin', 'sine']):
+                    if hits.any(['sin', 'sine']):
                         return "Sine (sin): sin(θ) = opposite / hypotenuse"
-                    elif any(trig in user_input for trig in ['cos', 'cosine']):
+                    elif hits.any(['cos', 'cosine']):
                         return "Cosine (cos): cos(θ) = adjacent / hypotenuse"
-                    elif any(trig in user_input for trig in ['tan', 'tangent']):
+                    elif hits.any(['tan', 'tangent']):
                         return "Tangent (tan): tan(θ) = opposite / adjacent = sin(θ) / cos(θ)"
-                    elif 'identity' in user_input:
+                    elif 'identity' in hits:
                         return self.get_formula('trigonometry', 'identities')
-                    elif any(law in user_input for law in ['law of sines', 'sine law']):
+                    elif hits.any(['law of sines', 'sine law']):
                         return "Law of Sines: a/sin(A) = b/sin(B) = c/sin(C)"
-                    elif any(law in user_input for law in ['law of cosines', 'cosine law']):
+                    elif hits.any(['law of cosines', 'cosine law']):
                         return "Law of Cosines: c² = a² + b² - 2ab·cos(C)"
                         
                 # Get the formula based on the identified name
@@ -651,40 +986,40 @@ For example, with x² + 5x + 6 = 0:
                     return f"Here are some {topic} formulas that might help:\n{formulas}"
             else:
                 # Topic wasn't identified, try to guess from keywords
-                if any(word in user_input for word in ['area', 'volume', 'perimeter', 'circle', 'triangle', 'square', 'rectangle', 'angle']):
-                    if 'circle' in user_input:
+                if hits.any(['area', 'volume', 'perimeter', 'circle', 'triangle', 'square', 'rectangle', 'angle']):
+                    if 'circle' in hits:
                         formulas = self.get_formula('geometry', 'circle')
-                    elif 'triangle' in user_input:
+                    elif 'triangle' in hits:
                         formulas = self.get_formula('geometry', 'triangle')
-                    elif 'square' in user_input:
+                    elif 'square' in hits:
                         formulas = self.get_formula('geometry', 'square')
-                    elif 'rectangle' in user_input:
+                    elif 'rectangle' in hits:
                         formulas = self.get_formula('geometry', 'rectangle')
                     else:
                         formulas = self.get_formula('geometry')
                     return f"Here are geometry formulas that might help:\n{formulas}"
                     
-                elif any(word in user_input for word in ['force', 'energy', 'power', 'work', 'motion', 'velocity', 'acceleration']):
+                elif hits.any(['force', 'energy', 'power', 'work', 'motion', 'velocity', 'acceleration']):
                     formulas = self.get_formula('physics', 'mechanics')
                     return f"Here are some physics mechanics formulas that might help:\n{formulas}"
                     
-                elif any(word in user_input for word in ['sin', 'cos', 'tan', 'angle', 'degree', 'radian', 'soh', 'cah', 'toa']):
-                    if 'identity' in user_input:
+                elif hits.any(['sin', 'cos', 'tan', 'angle', 'degree', 'radian', 'soh', 'cah', 'toa']):
+                    if 'identity' in hits:
                         formulas = self.get_formula('trigonometry', 'identities')
                     else:
                         formulas = self.get_formula('trigonometry', 'basic_ratios')
                     return f"Here are trigonometry formulas that might help:\n{formulas}"
                     
-                elif any(word in user_input for word in ['derivative', 'integral', 'differentiate', 'integrate', 'calculus']):
-                    if 'derivative' in user_input or 'differentiate' in user_input:
+                elif hits.any(['derivative', 'integral', 'differentiate', 'integrate', 'calculus']):
+                    if 'derivative' in hits or 'differentiate' in hits:
                         formulas = self.get_formula('calculus', 'derivatives')
-                    elif 'integral' in user_input or 'integrate' in user_input:
+                    elif 'integral' in hits or 'integrate' in hits:
                         formulas = self.get_formula('calculus', 'integrals')
                     else:
                         formulas = self.get_formula('calculus')
                     return f"Here are calculus formulas that might help:\n{formulas}"
                     
-                elif any(word in user_input for word in ['mean', 'average', 'median', 'mode', 'standard deviation', 'variance', 'probability']):
+                elif hits.any(['mean', 'average', 'median', 'mode', 'standard deviation', 'variance', 'probability']):
                     formulas = self.get_formula('statistics')
                     return f"Here are statistics formulas that might help:\n{formulas}"
                     
@@ -701,7 +1036,7 @@ For example, with x² + 5x + 6 = 0:
 What specific formula or topic are you interested in?"""
         
         # Check if it's asking to solve an equation
-        if 'solve' in user_input or 'find' in user_input or 'calculate' in user_input:
+        if 'solve' in hits or 'find' in hits or 'calculate' in hits:
             # Extract the equation (this is very simplified)
             equation_match = re.search(r'(?:solve|find|calculate)\s+(?:for)?\s*(.+)', user_input)
             if equation_match:
@@ -711,13 +1046,13 @@ What specific formula or topic are you interested in?"""
                 return "Could you provide the equation or expression you want me to solve?"
         
         # Try to handle specific math questions
-        if self.is_specific_math_question(user_input):
+        if self.is_specific_math_question(user_input, hits):
             return self.handle_specific_math_question(user_input)
             
         # Default response with topic if identified
         if topic:
             response = f"I see you're asking about {topic}. "
-            if 'formula' in user_input:
+            if 'formula' in hits:
                 response += f"I have many {topic} formulas available. Could you specify which formula you're looking for? "
                 
                 # Suggest some specific formulas based on topic
@@ -748,38 +1083,21 @@ What specific formula or topic are you interested in?"""
 
 What specific question or problem do you have?"""
     
-    def is_specific_math_question(self, user_input):
+    def is_specific_math_question(self, user_input, hits=None):
         """Check if the input is a specific math question"""
-        # List of patterns for specific math questions
-        patterns = [
-            # Times tables questions
-            r'what is (\d+) times (\d+)',
-            r'what is (\d+) multiplied by (\d+)',
-            # Division questions
-            r'what is (\d+) divided by (\d+)',
-            r'what is (\d+) over (\d+)',
-            # Trigonometry questions
-            r'what is (sin|cos|tan) of (\d+) degrees',
-            r'what is (sin|cos|tan) (\d+)',
-            # Area/perimeter questions
-            r'area of (a|an)? (circle|square|triangle|rectangle) with (radius|side|base|height|width|length) (\d+)',
-            r'perimeter of (a|an)? (circle|square|triangle|rectangle) with (radius|side|base|height|width|length) (\d+)',
-            # Angle questions
-            r'(supplement|complement) of (\d+) degrees',
-            r'convert (\d+) (degrees|radians) to (degrees|radians)'
-        ]
+        if hits is None:
+            hits = self.keyword_matcher.find(user_input)
         
-        # Check if any pattern matches
-        for pattern in patterns:
-            if re.search(pattern, user_input.lower()):
-                return True
+        # Check if any of the question patterns matches
+        if SPECIFIC_QUESTION_PATTERN.search(hits.text):
+            return True
                 
         # Check for specific keywords in combination
-        if ('value' in user_input or 'equal' in user_input) and any(op in user_input for op in ['sin', 'cos', 'tan', 'angle', 'π', 'pi']):
+        if ('value' in hits or 'equal' in hits) and hits.any(['sin', 'cos', 'tan', 'angle', 'π', 'pi']):
             return True
             
-        if ('find' in user_input or 'calculate' in user_input or 'determine' in user_input) and \
-           any(term in user_input for term in ['area', 'volume', 'perimeter', 'derivative', 'integral']):
+        if ('find' in hits or 'calculate' in hits or 'determine' in hits) and \
+           hits.any(['area', 'volume', 'perimeter', 'derivative', 'integral']):
             return True
             
         return False
@@ -1,17 +1,21 @@
 # Mathly - Math AI Assistant Backend
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, send_file, Response, stream_with_context
 from flask_cors import CORS # type: ignore
 import os
+import hmac
 import json
-import re
 import base64
-import io
+import time
 import numpy as np # type: ignore
-from PIL import Image # type: ignore
-import cv2 # type: ignore
-from pathlib import Path
 from math_processor import MathProcessor
-import pytesseract # type: ignore
+from formula_registry import shared_registry, DEFAULT_FORMULAS_FILE
+from symbolic_pool import SymbolicWorkerPool, SymbolicTimeoutError
+from result_cache import ResultCache
+from plot_renderer import PlotRenderer, PLOT_FORMATS
+from image_upload import read_upload, ImageUploadError
+from ocr_preprocess import OCRPreprocessor
+from ocr_engine import OCREnginePool, OCRBusyError
+from ocr_cache import OCRResultCache
 
 # Try to import new AI model, fall back to old one if it doesn't exist
 try:
@@ -24,12 +28,36 @@ except ImportError:
 # Initialize Flask app
 app = Flask(__name__, static_folder='../frontend')
 # Enable CORS with explicit origins for better security
-CORS(app, resources={r"/api/*": {"origins": ["http://localhost:5000", "http://localhost:5001", "http://127.0.0.1:5000", "http://127.0.0.1:5001"]}})  # Enable CORS for API routes
+CORS_ORIGINS = ["http://localhost:5000", "http://localhost:5001", "http://127.0.0.1:5000", "http://127.0.0.1:5001"]
+CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}})  # Enable CORS for API routes
 
-# Initialize our models
-data_path = Path(__file__).parent.parent / 'data' / 'expanded_formulas.json'
-math_processor = MathProcessor()
-math_ai = MathAIModel(str(data_path))
+# Initialize our models. Both share one copy of the formula data.
+data_path = os.getenv('MATHLY_FORMULA_FILE') or str(DEFAULT_FORMULAS_FILE)
+math_processor = MathProcessor(
+    symbolic_pool=SymbolicWorkerPool.from_env(),
+    result_cache=ResultCache.from_env('MATHLY_RESULT_CACHE'),
+    formula_registry=shared_registry(data_path)
+)
+math_ai = MathAIModel(data_path)
+plot_renderer = PlotRenderer.from_env(math_processor)
+ocr_preprocessor = OCRPreprocessor.from_env()
+ocr_pool = OCREnginePool.from_env()
+# Settings that change what OCR reads from an image, so changing them invalidates cached results
+ocr_cache = OCRResultCache.from_env(settings=[
+    ocr_preprocessor.max_side, ocr_preprocessor.target_dpi, ocr_preprocessor.max_skew,
+    ocr_pool.backend, ocr_pool.psm, ocr_pool.whitelist, ocr_pool.lang
+])
+# AsyncChatPipeline answering /api/chat when served through asgi.py
+chat_pipeline = None
+
+TIMEOUT_RESPONSE = "That problem took too long to solve. Please try a simpler version or check your input."
+
+# Symbolic jobs that overrun their time budget get a structured timeout response
+@app.errorhandler(SymbolicTimeoutError)
+def handle_symbolic_timeout(e):
+    result = e.to_dict()
+    result['response'] = TIMEOUT_RESPONSE
+    return jsonify(result), 504
 
 # Serve frontend static files
 @app.route('/', defaults={'path': ''})
@@ -55,6 +83,36 @@ def calculate():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def plan_chat(user_input):
+    """Decide how to answer a chat message.
+    
+    Returns (handler, args, kwargs): handler is the name of a step-by-step
+    solver on the math processor, 'arithmetic', or 'ai' for the AI model.
+    """
+    parsed = math_processor.classify(user_input)
+    
+    # Special case for quadratic equations, use AI model handler
+    if 'quadratic' in parsed.cues and 'equation' in parsed.cues:
+        return 'ai', (user_input,), {}
+    
+    # Step-by-step solvers for equations, calculus, factoring and expansion
+    call = parsed.solver_call()
+    if call is not None:
+        return call
+    elif 'arithmetic' in parsed.cues:
+        # Handle basic arithmetic
+        return 'arithmetic', (user_input,), {}
+    else:
+        # Use the AI model for general queries
+        return 'ai', (user_input,), {}
+
+def arithmetic_response(user_input):
+    """Answer a plain arithmetic chat message"""
+    result = math_processor.evaluate_expression(user_input)
+    return f"The result of {user_input} is {result}"
+
+CHAT_ERROR_RESPONSE = "I had trouble processing that request. Please check your input and try again."
+
 # API endpoint for the chat functionality
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -64,96 +122,72 @@ def chat():
     if not user_input:
         return jsonify({'error': 'No input provided'}), 400
     
-    # Identify the problem type
-    problem_type = math_processor.identify_problem_type(user_input)
-    
     try:
-        # Special case for quadratic equations, use AI model handler
-        if 'quadratic' in user_input.lower() and 'equation' in user_input.lower():
-            response = math_ai.process_query(user_input)
-            
-        elif problem_type == 'quadratic_equation' or problem_type == 'equation':
-            # Extract the equation if wrapped in words like "solve"
-            if 'solve' in user_input.lower():
-                equation = re.sub(r'.*?(?:solve|find the solution to|solve for x in)\s+', '', user_input)
-                equation = re.sub(r'\s+(?:for|where).*', '', equation)
-            else:
-                equation = user_input
-                
-            # Solve equation with steps
-            solution = math_processor.solve_equation_with_steps(equation)
-            response = solution
-        elif problem_type == 'differentiation':
-            # Get expression to differentiate
-            if 'differentiate' in user_input.lower() or 'derivative' in user_input.lower():
-                # Extract variable if specified
-                var_match = re.search(r'with respect to ([a-z])', user_input.lower())
-                variable = var_match.group(1) if var_match else 'x'
-                
-                # Extract expression
-                expr = re.sub(r'.*?(?:differentiate|derivative of|find the derivative of)\s+', '', user_input)
-                expr = re.sub(r'\s+with respect.*', '', expr)
-                
-                solution = math_processor.differentiate_with_steps(expr, variable=variable)
-                response = solution
-            else:
-                response = math_processor.differentiate_with_steps(user_input)
-        elif problem_type == 'integration':
-            # Get expression to integrate
-            if 'integrate' in user_input.lower() or 'integral' in user_input.lower():
-                # Extract variable if specified
-                var_match = re.search(r'with respect to ([a-z])', user_input.lower())
-                variable = var_match.group(1) if var_match else 'x'
-                
-                # Extract expression
-                expr = re.sub(r'.*?(?:integrate|integral of|find the integral of)\s+', '', user_input)
-                expr = re.sub(r'\s+with respect.*', '', expr)
-                
-                solution = math_processor.integrate_with_steps(expr, variable=variable)
-                response = solution
-            else:
-                response = math_processor.integrate_with_steps(user_input)
-        elif problem_type == 'limit':
-            # Get expression for limit
-            if 'limit' in user_input.lower():
-                # Extract variable and point
-                var_match = re.search(r'(?:as|when)\s+([a-z])\s+(?:approaches|→|goes to|tends to)\s+([\w\-\+\.∞]+)', user_input.lower())
-                if var_match:
-                    variable = var_match.group(1)
-                    point = var_match.group(2)
-                else:
-                    variable = 'x'
-                    point = '0'
-                
-                # Extract expression
-                expr = re.sub(r'.*?(?:limit of|find the limit of)\s+', '', user_input)
-                expr = re.sub(r'\s+(?:as|when).*', '', expr)
-                
-                solution = math_processor.calculate_limit(expr, variable=variable, point=point)
-                response = solution
-            else:
-                response = math_processor.calculate_limit(user_input)
-        elif problem_type == 'factoring':
-            expr = re.sub(r'.*?(?:factor|factorize|factorize)\s+', '', user_input)
-            response = math_processor.factor_expression(expr)
-        elif problem_type == 'expansion':
-            expr = re.sub(r'.*?(?:expand|distribute)\s+', '', user_input)
-            response = math_processor.expand_expression(expr)
-        elif contains_math := re.search(r'\d[\+\-\*\/\^\(\)]\d', user_input):
-            # Handle basic arithmetic
-            result = math_processor.evaluate_expression(user_input)
-            response = f"The result of {user_input} is {result}"
+        handler, args, kwargs = plan_chat(user_input)
+        if handler == 'ai':
+            response = math_ai.process_query(*args)
+        elif handler == 'arithmetic':
+            response = arithmetic_response(*args)
         else:
-            # Use the AI model for general queries
-            response = math_ai.process_query(user_input)
+            response = getattr(math_processor, handler)(*args, **kwargs)
+    except SymbolicTimeoutError:
+        raise
     except Exception as e:
         import traceback
         traceback_str = traceback.format_exc()
         print(f"Error processing request: {traceback_str}")
-        response = f"I had trouble processing that request. Please check your input and try again."
+        response = CHAT_ERROR_RESPONSE
     
     return jsonify({'response': response})
 
+def sse_event(event, data):
+    """Format one server-sent event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming variant of /api/chat: the answer arrives as server-sent events.
+# 'start' is sent straight away, then 'delta' events carry pieces of text
+# to append (solver steps or AI model chunks), and 'done' or 'error' ends
+# the stream.
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    data = request.get_json(silent=True) or {}
+    user_input = data.get('input')
+    
+    if not user_input:
+        return jsonify({'error': 'No input provided'}), 400
+    
+    def generate():
+        try:
+            handler, args, kwargs = plan_chat(user_input)
+            yield sse_event('start', {'handler': handler})
+            
+            if handler == 'ai':
+                chunks = math_ai.stream_query(*args) if hasattr(math_ai, 'stream_query') else [math_ai.process_query(*args)]
+            elif handler == 'arithmetic':
+                chunks = [arithmetic_response(*args)]
+            else:
+                # Steps are joined with newlines, as in the non-streaming response
+                steps = math_processor.iter_steps(handler, *args, **kwargs)
+                chunks = (('\n' if index else '') + step for index, step in enumerate(steps))
+            
+            for chunk in chunks:
+                yield sse_event('delta', {'text': chunk})
+            yield sse_event('done', {})
+        except SymbolicTimeoutError as e:
+            result = e.to_dict()
+            result['response'] = TIMEOUT_RESPONSE
+            yield sse_event('error', result)
+        except Exception:
+            import traceback
+            print(f"Error streaming response: {traceback.format_exc()}")
+            yield sse_event('error', {'error': CHAT_ERROR_RESPONSE})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 # API endpoint to get a specific formula
 @app.route('/api/formula/<category>', methods=['GET'])
 def get_formula(category):
@@ -166,6 +200,29 @@ def get_formula_topic(category, topic):
     formula = math_ai.get_formula(category, topic)
     return jsonify({'formula': formula})
     
+# Largest page of /api/formula_search results
+MAX_SEARCH_PAGE_SIZE = 50
+
+# Suggestions only change with the formula database, which the ETag tracks
+SUGGEST_MAX_AGE = int(os.getenv('MATHLY_SUGGEST_MAX_AGE', '3600'))
+MAX_SUGGEST_QUERY = 100
+
+# API endpoint for formula autocomplete, called as the user types
+@app.route('/api/formula_suggest', methods=['GET'])
+def suggest_formula():
+    # One state for the whole answer, so the ETag matches the suggestions across a reload
+    formulas = math_ai.formula_registry.current()
+    etag = formulas.version
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        query = request.args.get('q', '')[:MAX_SUGGEST_QUERY]
+        response = jsonify({'query': query, 'suggestions': formulas.suggester.suggest(query)})
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = SUGGEST_MAX_AGE
+    return response
+
 # API endpoint for advanced formula search
 @app.route('/api/formula_search', methods=['POST'])
 def search_formula():
@@ -177,37 +234,25 @@ def search_formula():
     if not category and not search_term:
         return jsonify({'error': 'No category or search term provided'}), 400
     
-    # If we have a search term, try to find matching formulas
+    # If we have a search term, rank the matching formulas
     if search_term:
-        # Search through all categories if none specified
-        categories = [category] if category else ["algebra", "geometry", "trigonometry", "calculus", "statistics", "physics", "constants"]
-        results = []
-        
-        for cat in categories:
-            try:
-                # Get all formulas in this category
-                formulas = math_ai.formulas["formulas"].get(cat, {})
-                
-                # Search through formulas
-                for name, formula in formulas.items():
-                    if search_term in name.lower():
-                        if isinstance(formula, dict):
-                            # If it's a nested dictionary, search through sub-formulas
-                            for sub_name, sub_formula in formula.items():
-                                if search_term in sub_name.lower() or search_term in name.lower():
-                                    if isinstance(sub_formula, dict):
-                                        results.append(f"{cat} > {name} > {sub_name}: (complex formula)")
-                                    else:
-                                        results.append(f"{cat} > {name} > {sub_name}: {sub_formula}")
-                        else:
-                            results.append(f"{cat} > {name}: {formula}")
-            except Exception as e:
-                print(f"Error searching in category {cat}: {e}")
+        try:
+            page = max(1, int(data.get('page', 1)))
+            per_page = min(MAX_SEARCH_PAGE_SIZE, max(1, int(data.get('per_page', 10))))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'page and per_page must be integers'}), 400
+        total, matches = math_ai.formula_search.search(search_term, category or None, page=page, per_page=per_page)
         
-        if results:
-            return jsonify({'results': results})
-        else:
+        if not total:
             return jsonify({'message': f"No formulas found matching '{search_term}'"}), 404
+        # A page past the end is empty, not "not found"
+        return jsonify({
+            'results': [entry.display for entry, score in matches],
+            'scores': [round(score, 3) for entry, score in matches],
+            'total': total,
+            'page': page,
+            'per_page': per_page
+        })
     
     # Otherwise use standard formula lookup
     formula_result = math_ai.get_formula(category, topic)
@@ -226,71 +271,236 @@ def solve_math():
         'answer': result
     })
 
+# API endpoint to evaluate an expression over many points at once
+@app.route('/api/evaluate_points', methods=['POST'])
+def evaluate_points():
+    data = request.get_json(silent=True) or {}
+    expression = data.get('expression')
+    variable = data.get('variable', 'x')
+    output_format = data.get('format', 'json')
+    
+    if not expression:
+        return jsonify({'error': 'No expression provided'}), 400
+    if output_format not in ('json', 'base64', 'binary'):
+        return jsonify({'error': "Format must be 'json', 'base64' or 'binary'"}), 400
+    
+    try:
+        # Points come as a JSON list, a base64 float64 array or a range
+        if 'points' in data:
+            points = np.asarray(data['points'], dtype=np.float64)
+        elif 'points_base64' in data:
+            points = np.frombuffer(base64.b64decode(data['points_base64']), dtype='<f8')
+        elif 'start' in data and 'stop' in data:
+            points = math_processor.make_points(data['start'], data['stop'], step=data.get('step'), num=data.get('num'))
+        else:
+            return jsonify({'error': 'Provide points, points_base64 or a start/stop range'}), 400
+        
+        values = math_processor.evaluate_over_points(expression, points, variable=variable)
+    except SymbolicTimeoutError:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 400
+    
+    raw = values.astype('<f8', copy=False).tobytes()
+    if output_format == 'binary':
+        return Response(raw, mimetype='application/octet-stream', headers={
+            'X-Mathly-Count': str(values.size),
+            'X-Mathly-Dtype': 'float64-le'
+        })
+    if output_format == 'base64':
+        return jsonify({
+            'count': values.size,
+            'dtype': 'float64-le',
+            'values_base64': base64.b64encode(raw).decode('ascii')
+        })
+    
+    # JSON has no NaN, so undefined points become null
+    finite = np.isfinite(values)
+    return jsonify({
+        'count': values.size,
+        'values': [value if ok else None for value, ok in zip(values.tolist(), finite.tolist())]
+    })
+
+# API endpoint to plot a function, with its derivative and roots marked
+@app.route('/api/plot', methods=['GET', 'POST'])
+def plot():
+    params = request.args if request.method == 'GET' else (request.get_json(silent=True) or {})
+    expression = params.get('expression')
+    output_format = params.get('format', 'png')
+    
+    if not expression:
+        return jsonify({'error': 'No expression provided'}), 400
+    if output_format not in PLOT_FORMATS:
+        return jsonify({'error': "Format must be 'png' or 'svg'"}), 400
+    
+    def flag(name):
+        value = params.get(name, True)
+        return value if isinstance(value, bool) else str(value).lower() not in ('0', 'false', 'no')
+    
+    try:
+        key, path = plot_renderer.render(
+            expression,
+            variable=params.get('variable', 'x'),
+            x_min=params.get('x_min', -10),
+            x_max=params.get('x_max', 10),
+            fmt=output_format,
+            show_derivative=flag('derivative'),
+            show_roots=flag('roots')
+        )
+    except TimeoutError:
+        return jsonify({'error': 'Rendering the plot took too long', 'timed_out': True}), 504
+    except SymbolicTimeoutError:
+        raise
+    except Exception as e:
+        return jsonify({'error': f"Could not plot {expression}: {str(e)}"}), 400
+    
+    # Plots are content-addressed, so the key doubles as a strong ETag
+    response = send_file(path, mimetype=PLOT_FORMATS[output_format], etag=key, max_age=86400)
+    response.cache_control.public = True
+    return response
+
+# Largest number of questions accepted by the batch endpoints
+MAX_BATCH_QUESTIONS = int(os.getenv('MATHLY_BATCH_MAX_QUESTIONS', '500'))
+
+def get_batch_questions():
+    """Validate the question list of a batch request, returning (questions, error response)"""
+    data = request.get_json(silent=True) or {}
+    questions = data.get('questions')
+    
+    if not isinstance(questions, list) or not questions:
+        return None, (jsonify({'error': 'No questions provided'}), 400)
+    if len(questions) > MAX_BATCH_QUESTIONS:
+        return None, (jsonify({'error': f'A batch can contain at most {MAX_BATCH_QUESTIONS} questions'}), 413)
+    if not all(isinstance(question, str) for question in questions):
+        return None, (jsonify({'error': 'Every question must be a string'}), 400)
+    return questions, None
+
+# API endpoint to solve a list of math questions in one request
+@app.route('/api/solve_batch', methods=['POST'])
+def solve_batch():
+    questions, error = get_batch_questions()
+    if error:
+        return error
+    
+    results = math_processor.solve_batch(questions)
+    return jsonify({
+        'count': len(results),
+        'results': results
+    })
+
+# Streaming variant of /api/solve_batch: one JSON object per line, in completion order
+@app.route('/api/solve_batch/stream', methods=['POST'])
+def solve_batch_stream():
+    questions, error = get_batch_questions()
+    if error:
+        return error
+    
+    def generate():
+        for item in math_processor.iter_question_batch(questions):
+            yield json.dumps(item) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# API endpoint reporting cache and worker pool statistics
+@app.route('/api/status', methods=['GET'])
+def status():
+    result = {}
+    if math_processor.result_cache is not None:
+        result['result_cache'] = math_processor.result_cache.stats()
+    if math_processor.symbolic_pool is not None:
+        result['symbolic_pool'] = dict(math_processor.symbolic_pool.stats)
+    result['plot_cache'] = plot_renderer.cache.stats()
+    result['ocr'] = ocr_pool.status()
+    if ocr_cache is not None:
+        result['ocr_cache'] = ocr_cache.stats()
+    if chat_pipeline is not None:
+        result['async_chat'] = chat_pipeline.stats()
+    if hasattr(math_ai, 'provider_status'):
+        result['llm_providers'] = math_ai.provider_status()
+    if hasattr(math_ai, 'formula_registry'):
+        formulas = math_ai.formula_registry.current()
+        result['formula_data'] = math_ai.formula_registry.status()
+        result['formula_store'] = formulas.store.stats()
+        result['formula_search'] = formulas.search.stats()
+        result['formula_suggest'] = formulas.suggester.stats()
+    return jsonify(result)
+
+# Token required by the admin endpoints; they are disabled while it is unset
+ADMIN_TOKEN = os.getenv('MATHLY_ADMIN_TOKEN', '')
+
+# API endpoint reporting which version of the formula data is loaded
+@app.route('/api/formulas/version', methods=['GET'])
+def formulas_version():
+    if not hasattr(math_ai, 'formula_registry'):
+        return jsonify({'error': 'Formula reloading is not available'}), 404
+    return jsonify(math_ai.formula_registry.status())
+
+# Admin endpoint to reload the formula data now instead of waiting for the file watcher.
+# It reloads this worker process only; the watcher picks up the change in every worker.
+@app.route('/api/formulas/reload', methods=['POST'])
+def reload_formulas():
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    if not hasattr(math_ai, 'formula_registry'):
+        return jsonify({'error': 'Formula reloading is not available'}), 404
+    registry = math_ai.formula_registry
+    reloaded = registry.reload(force=request.args.get('force') == '1')
+    result = registry.status()
+    result['reloaded'] = reloaded
+    return jsonify(result), 500 if registry.last_error else 200
+
 # API endpoint to process images of math problems
 @app.route('/api/image', methods=['POST'])
 def process_image():
-    data = request.json
-    image_data = data.get('image', '')
+    try:
+        # Opened from the request stream (raw body, multipart or legacy base64 JSON), not yet decoded
+        upload = read_upload(request)
+    except ImageUploadError as e:
+        return jsonify({'error': str(e)}), e.status
     
-    if not image_data:
-        return jsonify({'error': 'No image provided'}), 400
+    # The same image uploaded again is answered from the cache
+    formula_version = math_processor.formula_registry.current().version
+    cached = ocr_cache.get(upload.sha256, formula_version) if ocr_cache is not None else None
+    if cached is not None and cached[1] is not None:
+        return jsonify({'response': cached[1], 'cached': True})
     
     try:
-        # Extract base64 data
-        image_data = image_data.split(',')[1]
-        
-        # Decode base64 image
-        image_bytes = base64.b64decode(image_data)
-        image = Image.open(io.BytesIO(image_bytes))
-        
-        # Convert to OpenCV format
-        open_cv_image = np.array(image)
-        open_cv_image = open_cv_image[:, :, ::-1].copy()  # RGB to BGR
-        
-        # Preprocess the image
-        gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
-        gray = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
-        
-        # OCR to extract text
-        math_problem = pytesseract.image_to_string(gray)
-        math_problem = math_problem.strip()
+        start = time.perf_counter()
+        if cached is not None:
+            # Read before, but the formulas have changed since: only solve it again
+            math_problem = cached[0]
+        else:
+            # Decode small and grayscale, crop to the text, straighten and scale it for Tesseract
+            try:
+                prepared = ocr_preprocessor.prepare(upload.image)
+            except (OSError, SyntaxError) as e:
+                return jsonify({'error': f"Could not read the image: {e}"}), 400
+            
+            # OCR to extract text, on a warm Tesseract engine from the pool
+            math_problem = ocr_pool.recognize(prepared.image, prepared.dpi)
+            math_problem = math_problem.strip()
         
+        solved = True
         if not math_problem:
-            return jsonify({
-                'response': "I couldn't read any text from the image. Please make sure the math problem is clearly visible."
-            })
-        
-        # Process the extracted math problem
-        response = f"I extracted this math problem: {math_problem}\n\n"
-        
-        # Identify the problem type and process accordingly
-        problem_type = math_processor.identify_problem_type(math_problem)
-        
-        if problem_type == 'equation':
-            solution = math_processor.solve_equation_with_steps(math_problem)
-            response += solution
-        elif problem_type == 'differentiation':
-            solution = math_processor.differentiate_with_steps(math_problem)
-            response += solution
-        elif problem_type == 'integration':
-            solution = math_processor.integrate_with_steps(math_problem)
-            response += solution
-        elif problem_type == 'limit':
-            solution = math_processor.calculate_limit(math_problem)
-            response += solution
-        elif problem_type == 'factoring':
-            solution = math_processor.factor_expression(math_problem)
-            response += solution
-        elif problem_type == 'expansion':
-            solution = math_processor.expand_expression(math_problem)
-            response += solution
+            response = "I couldn't read any text from the image. Please make sure the math problem is clearly visible."
         else:
-            # Try to use the image text processor
+            # Identify the problem type and solve it
             solution = math_processor.process_image_text(math_problem)
-            response += solution
+            solved = not solution.startswith('Error')
+            
+            # Process the extracted math problem
+            response = f"I extracted this math problem: {math_problem}\n\n" + solution
         
+        if ocr_cache is not None:
+            # A failed solve keeps only the text, so the next upload solves it again
+            ocr_cache.put(upload.sha256, math_problem, response if solved else None, formula_version,
+                          time.perf_counter() - start)
         return jsonify({'response': response})
     
+    except OCRBusyError as e:
+        return jsonify({'error': str(e), 'busy': True}), 503, {'Retry-After': str(e.retry_after)}
+    except SymbolicTimeoutError:
+        raise
     except Exception as e:
         return jsonify({'error': f"Error processing image: {str(e)}"}), 500
 
@@ -304,15 +514,14 @@ if __name__ == '__main__':
     
     args = parser.parse_args()
     
-    # Check for environment variable to override formula file
-    if 'MATHLY_FORMULA_FILE' in os.environ and not args.formula_file:
-        formula_file = os.environ['MATHLY_FORMULA_FILE']
-        # Reinitialize AI model with the specified formula file
-        print(f"Using formula file from environment: {formula_file}")
-        math_ai = MathAIModel(formula_file)
-    elif args.formula_file:
+    # MATHLY_FORMULA_FILE is already applied above; the argument overrides it
+    if args.formula_file:
         print(f"Using formula file from argument: {args.formula_file}")
+        # Reinitialize both models with the specified formula file
+        math_processor.formula_registry = shared_registry(args.formula_file)
         math_ai = MathAIModel(args.formula_file)
+    elif 'MATHLY_FORMULA_FILE' in os.environ:
+        print(f"Using formula file from environment: {data_path}")
     
     print(f"Mathly server running on port {args.port}")
     app.run(debug=args.debug, host='0.0.0.0', port=args.port)
\ No newline at end of file
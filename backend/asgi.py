@@ -0,0 +1,106 @@
+# Mathly - ASGI entry point
+#
+# POST /api/chat is answered natively on the event loop by AsyncChatPipeline,
+# so a chat waiting on an LLM costs no thread. Every other route is passed to
+# the Flask app, which a2wsgi runs in a thread pool of MATHLY_THREADS threads.
+#
+#     uvicorn asgi:application --port 5000
+#     python serve.py --asgi
+import json
+import os
+
+from a2wsgi import WSGIMiddleware # type: ignore
+
+import app as mathly
+from chat_pipeline import AsyncChatPipeline
+from symbolic_pool import SymbolicTimeoutError
+
+# Largest /api/chat request body
+MAX_CHAT_BODY = 1024 * 1024
+
+flask_application = WSGIMiddleware(mathly.app, workers=int(os.getenv('MATHLY_THREADS', '4')))
+chat_pipeline = AsyncChatPipeline.from_env(mathly.math_processor, mathly.math_ai, mathly.plan_chat,
+                                           mathly.arithmetic_response)
+# Reported by /api/status
+mathly.chat_pipeline = chat_pipeline
+
+
+async def send_json(send, status, data, headers=()):
+    body = json.dumps(data).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())] + list(headers),
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def read_body(receive, limit):
+    """The request body, or None if it is larger than limit"""
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return b''
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > limit:
+            return None
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+def cors_headers(scope):
+    """Same CORS answer Flask-CORS gives the other /api routes"""
+    origin = dict(scope['headers']).get(b'origin', b'').decode('latin-1')
+    if origin in mathly.CORS_ORIGINS:
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+    return []
+
+
+async def chat(scope, receive, send):
+    """Async /api/chat, answering exactly like the Flask route"""
+    headers = cors_headers(scope)
+    body = await read_body(receive, MAX_CHAT_BODY)
+    if body is None:
+        return await send_json(send, 413, {'error': 'Request too large'}, headers)
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return await send_json(send, 400, {'error': 'Invalid JSON'}, headers)
+
+    user_input = data.get('input') if isinstance(data, dict) else None
+    if not user_input:
+        return await send_json(send, 400, {'error': 'No input provided'}, headers)
+
+    try:
+        response = await chat_pipeline.answer(user_input)
+    except SymbolicTimeoutError as e:
+        result = e.to_dict()
+        result['response'] = mathly.TIMEOUT_RESPONSE
+        return await send_json(send, 504, result, headers)
+    except Exception:
+        import traceback
+        print(f"Error processing request: {traceback.format_exc()}")
+        response = mathly.CHAT_ERROR_RESPONSE
+    await send_json(send, 200, {'response': response}, headers)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == '/api/chat':
+        return await chat(scope, receive, send)
+    await flask_application(scope, receive, send)
@@ -0,0 +1,107 @@
+# Mathly - Async chat pipeline: LLM calls are awaited, CPU-bound work runs in an executor
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StageLimit:
+    """Bounds how many requests are in one stage of the pipeline at once.
+
+    Requests over the limit wait on the event loop, which costs no thread.
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self._semaphore = asyncio.Semaphore(limit)
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+
+    async def __aenter__(self):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        self.active -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    def stats(self):
+        return {'limit': self.limit, 'active': self.active, 'waiting': self.waiting, 'completed': self.completed}
+
+
+class AsyncChatPipeline:
+    """Answers chat messages on an event loop.
+
+    A chat that goes to the AI model awaits the provider calls, so thousands
+    of them can wait on the LLMs in one process without holding a thread
+    each. SymPy solvers and arithmetic are CPU-bound and run in a thread
+    pool. Each stage has its own concurrency limit.
+    """
+
+    def __init__(self, math_processor, math_ai, plan, arithmetic, llm_concurrency=1000, cpu_concurrency=None):
+        self.math_processor = math_processor
+        self.math_ai = math_ai
+        # plan(user_input) -> (handler, args, kwargs) and arithmetic(user_input), as used by /api/chat
+        self.plan = plan
+        self.arithmetic = arithmetic
+
+        pool = math_processor.symbolic_pool
+        cpu_concurrency = cpu_concurrency or (pool.size if pool is not None else os.cpu_count() or 2)
+        self.stages = {
+            'llm': StageLimit('llm', llm_concurrency),
+            'cpu': StageLimit('cpu', cpu_concurrency),
+        }
+
+        # Executor for the CPU stage, created on first use (and again after a fork)
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, math_processor, math_ai, plan, arithmetic):
+        """Build a pipeline with stage limits from MATHLY_ASYNC_*_CONCURRENCY"""
+        cpu_concurrency = os.getenv('MATHLY_ASYNC_CPU_CONCURRENCY')
+        return cls(
+            math_processor, math_ai, plan, arithmetic,
+            llm_concurrency=int(os.getenv('MATHLY_ASYNC_LLM_CONCURRENCY', '1000')),
+            cpu_concurrency=int(cpu_concurrency) if cpu_concurrency else None
+        )
+
+    def _get_executor(self):
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.stages['cpu'].limit,
+                                                    thread_name_prefix='mathly-async-cpu')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    async def run_cpu(self, function, *args, **kwargs):
+        """Run CPU-bound work in the executor, within the CPU stage limit"""
+        async with self.stages['cpu']:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), lambda: function(*args, **kwargs))
+
+    async def answer(self, user_input):
+        """The response text for a chat message (raises SymbolicTimeoutError like /api/chat)"""
+        handler, args, kwargs = self.plan(user_input)
+        if handler == 'ai':
+            if hasattr(self.math_ai, 'aprocess_query'):
+                async with self.stages['llm']:
+                    return await self.math_ai.aprocess_query(*args)
+            # The standard model has no async path
+            return await self.run_cpu(self.math_ai.process_query, *args)
+        if handler == 'arithmetic':
+            return await self.run_cpu(self.arithmetic, *args)
+        return await self.run_cpu(getattr(self.math_processor, handler), *args, **kwargs)
+
+    def stats(self):
+        """Load of every stage"""
+        return {name: stage.stats() for name, stage in self.stages.items()}
@@ -0,0 +1,227 @@
+# Mathly - Circuit breaker and adaptive concurrency limit for provider calls
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+
+class CircuitBreaker:
+    """Stop calling a provider that keeps failing.
+
+    closed:    calls go through; consecutive failures are counted
+    open:      calls are rejected until recovery_timeout has passed
+    half_open: a few trial calls go through; a success closes the
+               breaker again, a failure re-opens it
+    Calls slower than slow_call_threshold count as failures.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1,
+                 slow_call_threshold=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.slow_call_threshold = slow_call_threshold
+
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+        self.stats = {'successes': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    @classmethod
+    def from_env(cls, name):
+        """Build a breaker from MATHLY_BREAKER_* environment variables"""
+        slow_call = os.getenv('MATHLY_BREAKER_SLOW_CALL', '30')
+        return cls(
+            name,
+            failure_threshold=int(os.getenv('MATHLY_BREAKER_FAILURES', '5')),
+            recovery_timeout=float(os.getenv('MATHLY_BREAKER_RECOVERY', '30')),
+            slow_call_threshold=float(slow_call) if slow_call else None
+        )
+
+    def _refresh(self):
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self.state = self.HALF_OPEN
+            self._half_open_calls = 0
+
+    def _open(self):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.stats['opened'] += 1
+
+    def is_available(self):
+        """Whether a call would currently be allowed, without reserving it"""
+        with self._lock:
+            self._refresh()
+            return self.state == self.CLOSED or (
+                self.state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls)
+
+    def allow_request(self):
+        """Reserve a call, or return False if the breaker rejects it"""
+        with self._lock:
+            self._refresh()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+            self.stats['rejected'] += 1
+            return False
+
+    def record_success(self, latency=None):
+        """Record a successful call"""
+        if self.slow_call_threshold is not None and latency is not None and latency > self.slow_call_threshold:
+            self.record_failure()
+            return
+        with self._lock:
+            self.stats['successes'] += 1
+            self.consecutive_failures = 0
+            if self.state == self.HALF_OPEN:
+                self.state = self.CLOSED
+
+    def record_failure(self):
+        """Record a failed (or too slow) call"""
+        with self._lock:
+            self.stats['failures'] += 1
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or (
+                    self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold):
+                self._open()
+
+    def release(self):
+        """Give back a reserved call that was cancelled before it finished"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def status(self):
+        """Current state and counters"""
+        with self._lock:
+            self._refresh()
+            retry_in = None
+            if self.state == self.OPEN:
+                retry_in = round(max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at)), 3)
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in': retry_in,
+                'stats': dict(self.stats)
+            }
+
+
+class AIMDLimiter:
+    """Adaptive limit on in-flight calls (additive increase, multiplicative decrease).
+
+    Every good call raises the limit by 1/limit, so it grows by about one per
+    round of calls; a failed or slow call multiplies it by backoff_ratio.
+    try_acquire() rejects calls beyond the limit immediately, for threads
+    that must not block; acquire() lets a coroutine wait for a free slot,
+    which costs nothing while it waits.
+    """
+
+    def __init__(self, initial_limit=20, min_limit=1, max_limit=200, backoff_ratio=0.5, latency_threshold=None):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_threshold = latency_threshold
+
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        # (event loop, future) of coroutines waiting in acquire(), oldest first
+        self._waiters = deque()
+
+    @classmethod
+    def from_env(cls):
+        """Build a limiter from MATHLY_LLM_CONCURRENCY_* environment variables"""
+        latency_target = os.getenv('MATHLY_LLM_LATENCY_TARGET', '20')
+        return cls(
+            initial_limit=int(os.getenv('MATHLY_LLM_CONCURRENCY_INITIAL', '20')),
+            min_limit=int(os.getenv('MATHLY_LLM_CONCURRENCY_MIN', '1')),
+            max_limit=int(os.getenv('MATHLY_LLM_CONCURRENCY_MAX', '200')),
+            latency_threshold=float(latency_target) if latency_target else None
+        )
+
+    def try_acquire(self):
+        """Take a slot, or return False if the limit is reached"""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    async def acquire(self, timeout=None):
+        """Take a slot, waiting up to timeout seconds (forever if None) for one
+        to free up. Returns False if none did"""
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while True:
+            with self._lock:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return True
+                remaining = None if deadline is None else deadline - loop.time()
+                if remaining is not None and remaining <= 0:
+                    self.rejected += 1
+                    return False
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+            except asyncio.CancelledError:
+                # Pass on a wake-up this coroutine can no longer use
+                self._wake_next()
+                raise
+
+    def _wake_next(self):
+        """Wake the oldest coroutine still waiting for a slot"""
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                if not waiter.done():
+                    loop.call_soon_threadsafe(self._wake, waiter)
+                    return
+
+    def _wake(self, waiter):
+        if waiter.done():
+            # It timed out or was cancelled in the meantime
+            self._wake_next()
+        else:
+            waiter.set_result(None)
+
+    def release(self, success=None, latency=None):
+        """Give back a slot. success=None means the call was cancelled and
+        says nothing about the provider's health"""
+        with self._lock:
+            self.in_flight -= 1
+            if success is not None:
+                slow = self.latency_threshold is not None and latency is not None and latency > self.latency_threshold
+                if success and not slow:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                else:
+                    self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        self._wake_next()
+
+    def status(self):
+        """Current limit and usage"""
+        with self._lock:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'waiting': len(self._waiters),
+                'rejected': self.rejected
+            }
@@ -0,0 +1,243 @@
+# Mathly - Content-addressed file cache on disk
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from result_cache import ResultCache
+
+
+class DiskCache:
+    """Content-addressed file store with a total size cap.
+
+    Files are named by the SHA-256 of their key, so any number of worker
+    processes can share one directory. When the store grows past max_bytes
+    the least recently used files are deleted.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._bytes = None  # measured lazily on the first write
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(*parts):
+        """Hash arbitrary JSON-serializable parts into a cache key"""
+        encoded = json.dumps(parts, sort_keys=True, default=str).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()
+
+    def path_for(self, key, suffix=''):
+        """Location of the file for a key (it may not exist)"""
+        return self.directory / key[:2] / f"{key}{suffix}"
+
+    def lookup(self, key, suffix=''):
+        """Return the path of a cached file, or None if it isn't cached"""
+        path = self.path_for(key, suffix)
+        try:
+            # Touch the file so eviction sees it as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    def get(self, key, suffix=''):
+        """Read a cached file, or return None if it isn't cached"""
+        path = self.lookup(key, suffix)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            # Evicted by another process between lookup and read
+            return None
+
+    def put(self, key, data, suffix=''):
+        """Store data under a key, returning the path it was written to"""
+        path = self.path_for(key, suffix)
+        path.parent.mkdir(exist_ok=True)
+
+        # Write to a temporary file and rename it so readers never see partial files
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._measure()
+            else:
+                self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict()
+        return path
+
+    def delete(self, key, suffix=''):
+        """Remove a cached file if it exists"""
+        try:
+            self.path_for(key, suffix).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _files(self):
+        return [path for path in self.directory.glob('*/*') if not path.name.endswith('.tmp')]
+
+    def _measure(self):
+        total = 0
+        for path in self._files():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def _evict(self):
+        """Delete least recently used files until the store is at 90% of its cap"""
+        entries = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._bytes = total
+
+    def stats(self):
+        """Hit/miss counters and current usage"""
+        return {
+            'directory': str(self.directory),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class TieredJSONCache:
+    """JSON entries in a memory-bounded LRU (ResultCache) in front of a DiskCache.
+
+    The disk tier is optional; when present, entries survive restarts and
+    are shared between worker processes. Every entry carries its own
+    expiry time, so a disk hit is kept in memory only for what is left of
+    its lifetime. Subclasses decide the keys and what goes in an entry.
+    """
+
+    # What the entries are, for log messages
+    label = 'cache entry'
+
+    def __init__(self, memory, disk=None, ttl=86400, metrics=()):
+        self.memory = memory
+        self.disk = disk
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self.metrics = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0}
+        self.metrics.update(metrics)
+
+    @staticmethod
+    def tiers_from_env(prefix, ttl, max_entries, max_bytes, disk_bytes, default_dir=None):
+        """Memory and disk tiers from <prefix>_* environment variables.
+
+        Returns None when <prefix>_ENTRIES is 0. The disk tier lives in
+        <prefix>_DIR (default_dir when unset); an empty directory keeps
+        entries in memory only.
+        """
+        memory = ResultCache.from_env(prefix, max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+        if memory is None:
+            return None
+
+        disk = None
+        cache_dir = os.getenv(f'{prefix}_DIR', default_dir or '')
+        if cache_dir:
+            disk_bytes = int(os.getenv(f'{prefix}_DISK_BYTES', str(disk_bytes)))
+            disk = DiskCache(cache_dir, max_bytes=disk_bytes)
+        return memory, disk
+
+    def _record(self, name, amount=1):
+        with self._lock:
+            self.metrics[name] += amount
+
+    def get_entry(self, key):
+        """The entry stored under a key, from memory or else from disk, or None"""
+        entry = self.memory.get(key)
+
+        if entry is None and self.disk is not None:
+            entry = self._load(key)
+            if entry is not None:
+                self._record('disk_hits')
+                # Keep the disk copy's remaining lifetime in memory as well
+                self.memory.put(key, entry, ttl=max(1e-3, entry['expires_at'] - time.time()))
+
+        if entry is None:
+            self._record('misses')
+        return entry
+
+    def put_entry(self, key, entry, ttl=None):
+        """Store a JSON-serializable dict under a key in both tiers"""
+        ttl = self.ttl if ttl is None else ttl
+        entry = dict(entry, expires_at=time.time() + ttl)
+        self.memory.put(key, entry, ttl=ttl)
+        self._record('stores')
+
+        if self.disk is not None:
+            try:
+                self.disk.put(key, json.dumps(entry).encode('utf-8'), '.json')
+            except OSError as e:
+                print(f"Could not persist {self.label}: {e}")
+
+    def _load(self, key):
+        """Read a persisted entry, dropping it if it has expired"""
+        data = self.disk.get(key, '.json')
+        if data is None:
+            return None
+        try:
+            entry = json.loads(data)
+        except ValueError:
+            self.disk.delete(key, '.json')
+            return None
+        if entry.get('expires_at', 0) <= time.time():
+            self.disk.delete(key, '.json')
+            return None
+        return entry
+
+    def clear(self):
+        """Forget every entry held in memory"""
+        self.memory.clear()
+
+    def stats(self):
+        """Hit/miss counters of both tiers"""
+        with self._lock:
+            result = dict(self.metrics)
+        result['memory'] = self.memory.stats()
+        if self.disk is not None:
+            result['disk'] = self.disk.stats()
+        return result
@@ -0,0 +1,224 @@
+# Mathly - Safe compiler for arithmetic expressions
+import ast
+import functools
+import math
+import numbers
+from collections import namedtuple
+
+# Limits that keep a single expression from hanging a worker
+MAX_EXPRESSION_LENGTH = 1000
+MAX_DEPTH = 50
+MAX_INT_BITS = 8192
+MAX_FACTORIAL = 2000
+MAX_ROUND_DIGITS = 100
+
+_BINARY_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+
+# A compiled expression and its validated syntax tree (ast.dump), which
+# identifies the expression however it was spaced
+CompiledExpression = namedtuple('CompiledExpression', ['code', 'key'])
+
+
+class UnsafeExpressionError(ValueError):
+    """Raised when an expression uses syntax or values outside the whitelist"""
+
+
+def _check_int_bits(bits):
+    if bits > MAX_INT_BITS:
+        raise UnsafeExpressionError("Result is too large to calculate")
+
+
+def _is_int(value):
+    return isinstance(value, int)
+
+
+def _guarded_pow(base, exponent, modulo=None):
+    """pow() that refuses to build enormous integers"""
+    if modulo is None and _is_int(base) and _is_int(exponent) and exponent > 0 and abs(base) > 1:
+        _check_int_bits(base.bit_length() * exponent)
+    return pow(base, exponent) if modulo is None else pow(base, exponent, modulo)
+
+
+def _guarded_mul(left, right):
+    """Multiplication restricted to numbers and bounded in size"""
+    if not isinstance(left, numbers.Number) or not isinstance(right, numbers.Number):
+        raise UnsafeExpressionError("Only numbers can be multiplied")
+    if _is_int(left) and _is_int(right):
+        _check_int_bits(left.bit_length() + right.bit_length())
+    return left * right
+
+
+def _log2_factorial(n):
+    return math.lgamma(n + 1) / math.log(2)
+
+
+# Upper bounds on the bit length of each combinatorial function's result
+_RESULT_BITS = {
+    'factorial': lambda n, *args: _log2_factorial(n),
+    'perm': lambda n, k=None: _log2_factorial(n) - (_log2_factorial(n - k) if k is not None and 0 <= k <= n else 0),
+    'comb': lambda n, k: (_log2_factorial(n) - _log2_factorial(k) - _log2_factorial(n - k)) if 0 <= k <= n else 0,
+}
+
+
+def _guard_argument_size(func, name):
+    """Wrap a combinatorial function so its argument and the size of its result are bounded"""
+    @functools.wraps(func)
+    def guarded(n, *args):
+        if _is_int(n) and n > MAX_FACTORIAL:
+            raise UnsafeExpressionError(f"{name}() argument must be at most {MAX_FACTORIAL}")
+        if _is_int(n) and n >= 0 and all(_is_int(arg) for arg in args):
+            try:
+                bits = _RESULT_BITS[name](n, *args)
+            except TypeError:
+                bits = 0  # Wrong arguments; let func report them
+            _check_int_bits(bits)
+        return func(n, *args)
+    return guarded
+
+
+def _guarded_round(number, ndigits=None):
+    """round() with a bounded number of digits"""
+    if ndigits is None:
+        return round(number)
+    if abs(ndigits) > MAX_ROUND_DIGITS:
+        raise UnsafeExpressionError("Too many digits to round to")
+    return round(number, ndigits)
+
+
+class _Validator(ast.NodeTransformer):
+    """Check every node against the whitelist and route risky operations
+    through their guarded helpers"""
+
+    def __init__(self, names):
+        self.names = names
+        self.depth = 0
+
+    def visit(self, node):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise UnsafeExpressionError("Expression is nested too deeply")
+        try:
+            return super().visit(node)
+        finally:
+            self.depth -= 1
+
+    def generic_visit(self, node):
+        raise UnsafeExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float, complex)):
+            raise UnsafeExpressionError("Only numeric constants are allowed")
+        if _is_int(node.value):
+            _check_int_bits(node.value.bit_length())
+        return node
+
+    def visit_Name(self, node):
+        if node.id not in self.names or node.id == 'math':
+            raise UnsafeExpressionError(f"Unknown name: {node.id}")
+        return node
+
+    def visit_Attribute(self, node):
+        # math.sqrt(x) is the same as sqrt(x), which every math function has
+        if not (isinstance(node.value, ast.Name) and node.value.id == 'math'):
+            raise UnsafeExpressionError("Only math module attributes are allowed")
+        if node.attr.startswith('_') or node.attr not in self.names:
+            raise UnsafeExpressionError(f"Unknown name: math.{node.attr}")
+        return ast.copy_location(ast.Name(id=node.attr, ctx=ast.Load()), node)
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARY_OPERATORS):
+            raise UnsafeExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BINARY_OPERATORS):
+            raise UnsafeExpressionError(f"Unsupported operator: {type(node.op).__name__}")
+        left = self.visit(node.left)
+        right = self.visit(node.right)
+
+        if isinstance(node.op, (ast.Pow, ast.Mult)):
+            helper = '_guarded_pow' if isinstance(node.op, ast.Pow) else '_guarded_mul'
+            call = ast.Call(func=ast.Name(id=helper, ctx=ast.Load()), args=[left, right], keywords=[])
+            return ast.copy_location(call, node)
+
+        node.left, node.right = left, right
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, (ast.Name, ast.Attribute)):
+            raise UnsafeExpressionError("Only named functions can be called")
+        node.func = self.visit(node.func)
+        if not callable(self.names[node.func.id]):
+            raise UnsafeExpressionError(f"{node.func.id} is not a function")
+
+        # Lists and tuples are only allowed as arguments, e.g. sum([1, 2, 3])
+        node.args = [self._visit_argument(arg) for arg in node.args]
+        for keyword in node.keywords:
+            if keyword.arg is None:
+                raise UnsafeExpressionError("Unsupported syntax: **kwargs")
+            keyword.value = self._visit_argument(keyword.value)
+        return node
+
+    def _visit_argument(self, node):
+        if isinstance(node, (ast.List, ast.Tuple)):
+            node.elts = [self.visit(element) for element in node.elts]
+            return node
+        return self.visit(node)
+
+
+class ExpressionCompiler:
+    """Compile arithmetic expressions into whitelisted, cached code objects.
+
+    Expressions may only use numbers, arithmetic operators and the functions
+    in the given table. Each distinct expression is parsed and validated
+    once; later evaluations reuse the compiled code.
+    """
+
+    def __init__(self, functions, cache_size=1024):
+        self.names = dict(functions)
+
+        # Names visible to compiled code, with risky functions swapped for guarded ones
+        self.namespace = dict(functions)
+        for name in ('factorial', 'comb', 'perm'):
+            if name in self.namespace:
+                self.namespace[name] = _guard_argument_size(self.namespace[name], name)
+        # math.pow works in floats and can't build huge integers; only the builtin needs the guard
+        if self.namespace.get('pow') is pow:
+            self.namespace['pow'] = _guarded_pow
+        if 'round' in self.namespace:
+            self.namespace['round'] = _guarded_round
+        self.namespace['_guarded_pow'] = _guarded_pow
+        self.namespace['_guarded_mul'] = _guarded_mul
+
+        self.compile = functools.lru_cache(maxsize=cache_size)(self._compile)
+
+    def _compile(self, expression):
+        """Parse, validate and compile an expression into a CompiledExpression"""
+        if len(expression) > MAX_EXPRESSION_LENGTH:
+            raise UnsafeExpressionError("Expression is too long")
+
+        # ^ means power in math notation; bitwise operators are not allowed anyway
+        source = expression.strip().replace('^', '**')
+        try:
+            tree = ast.parse(source, mode='eval')
+        except (RecursionError, MemoryError):
+            raise UnsafeExpressionError("Expression is nested too deeply")
+
+        tree = _Validator(self.names).visit(tree)
+        ast.fix_missing_locations(tree)
+        return CompiledExpression(compile(tree, '<expression>', 'eval'), ast.dump(tree))
+
+    def run(self, compiled):
+        """Evaluate a CompiledExpression"""
+        return eval(compiled.code, {'__builtins__': {}}, self.namespace)
+
+    def evaluate(self, expression):
+        """Evaluate an expression, compiling it on first use"""
+        return self.run(self.compile(expression))
@@ -0,0 +1,176 @@
+# Mathly - Formula data that can be reloaded while the server is running
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from formula_store import FormulaStore
+from formula_search import FormulaSearchEngine, FormulaSuggester
+
+# The formula database used when no other file is configured
+DEFAULT_FORMULAS_FILE = Path(__file__).parent.parent / 'data' / 'expanded_formulas.json'
+
+# Everything built from one version of a formula file. It is never modified
+# after it is built; a reload builds a new one and replaces it.
+FormulaState = namedtuple('FormulaState', [
+    'formulas', 'store', 'search', 'suggester', 'version', 'source_signature', 'loaded_at', 'load_seconds'
+])
+
+
+def source_signature(path):
+    """(size, mtime) of a file, or None if it can't be read"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class FormulaRegistry:
+    """The loaded formula data, reloaded when its file changes.
+
+    Readers call current() and get an immutable FormulaState; they never
+    take a lock. A reload builds the new store and indexes off to the side
+    and then replaces the state reference in one assignment, so a reader
+    sees either the old state or the new one, never a half-built index.
+    A watcher thread polls the file every watch_interval seconds (0 turns
+    it off); reload() can also be called directly.
+    """
+
+    def __init__(self, formulas_file, watch_interval=2.0):
+        self.formulas_file = str(formulas_file)
+        self.watch_interval = watch_interval
+
+        self.reloads = 0
+        self.last_error = None
+        self._failed_signature = None
+        self._reload_lock = threading.Lock()
+        self._watcher_lock = threading.Lock()
+        self._watcher_pid = None
+        self._stop = threading.Event()
+
+        try:
+            self._state = self._build()
+        except Exception as e:
+            # Serve an empty database until the file can be loaded
+            self._failed_signature = source_signature(self.formulas_file)
+            self.last_error = f"{type(e).__name__}: {e}"
+            print(f"Error loading formulas: {self.last_error}")
+            self._state = self._build({"formulas": {}}, signature=None)
+
+    @classmethod
+    def from_env(cls, formulas_file):
+        """Build a registry, reading the watch interval from MATHLY_FORMULA_WATCH_INTERVAL"""
+        return cls(formulas_file, watch_interval=float(os.getenv('MATHLY_FORMULA_WATCH_INTERVAL', '2')))
+
+    def _build(self, formulas=None, signature=0):
+        """Load the formula file (unless formulas are given) and build its store and indexes"""
+        start = time.perf_counter()
+        if formulas is None:
+            signature = source_signature(self.formulas_file)
+            with open(self.formulas_file, 'r') as file:
+                formulas = json.load(file)
+        store = FormulaStore(formulas)
+        return FormulaState(
+            formulas=formulas,
+            store=store,
+            search=FormulaSearchEngine(store),
+            suggester=FormulaSuggester(store),
+            version=store.version,
+            source_signature=signature,
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - start
+        )
+
+    def current(self):
+        """The formula data currently in use"""
+        if self.watch_interval and self._watcher_pid != os.getpid():
+            self._start_watcher()
+        return self._state
+
+    def reload(self, force=False):
+        """Rebuild from the formula file if it changed (or always, with force).
+
+        Returns True if a new version was swapped in. On failure the old
+        data stays in use and the error is kept in last_error.
+        """
+        with self._reload_lock:
+            state = self._state
+            signature = source_signature(self.formulas_file)
+            # A file that failed to load is tried again once it changes
+            if not force and signature in (state.source_signature, self._failed_signature):
+                return False
+            try:
+                new_state = self._build()
+            except Exception as e:
+                self._failed_signature = signature
+                self.last_error = f"{type(e).__name__}: {e}"
+                print(f"Error reloading formulas from {self.formulas_file}: {self.last_error}")
+                return False
+
+            self.last_error = None
+            self._failed_signature = None
+            self._state = new_state
+            self.reloads += 1
+            if new_state.version != state.version:
+                print(f"Reloaded formulas from {self.formulas_file}: version {new_state.version} "
+                      f"({len(new_state.store)} formulas in {new_state.load_seconds:.3f}s)")
+            return True
+
+    def _start_watcher(self):
+        """Start the file watcher in this process (again after a fork)"""
+        with self._watcher_lock:
+            if self._watcher_pid == os.getpid():
+                return
+            self._watcher_pid = os.getpid()
+            self._stop.clear()
+            threading.Thread(target=self._watch, name='mathly-formula-watcher', daemon=True).start()
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Error watching {self.formulas_file}: {e}")
+
+    def stop(self):
+        """Stop the file watcher"""
+        self._stop.set()
+        self._watcher_pid = None
+
+    def status(self):
+        """Version and load information of the formula data in use"""
+        state = self._state
+        return {
+            'version': state.version,
+            'source': self.formulas_file,
+            'formulas': len(state.store),
+            'loaded_at': state.loaded_at,
+            'load_seconds': round(state.load_seconds, 4),
+            'reloads': self.reloads,
+            'watch_interval': self.watch_interval,
+            'last_error': self.last_error
+        }
+
+
+# One registry per formula file for the whole process
+_shared_registries = {}
+_shared_lock = threading.Lock()
+
+
+def shared_registry(formulas_file=None):
+    """The process-wide registry of a formula file.
+
+    Defaults to MATHLY_FORMULA_FILE, or data/expanded_formulas.json. Every
+    caller asking for the same file gets the same registry, so the formula
+    data is loaded and indexed once per process.
+    """
+    formulas_file = formulas_file or os.getenv('MATHLY_FORMULA_FILE') or DEFAULT_FORMULAS_FILE
+    key = os.path.abspath(formulas_file)
+    with _shared_lock:
+        registry = _shared_registries.get(key)
+        if registry is None:
+            registry = _shared_registries[key] = FormulaRegistry.from_env(formulas_file)
+        return registry
@@ -0,0 +1,274 @@
+# Mathly - Ranked, typo-tolerant search over the formula store
+import functools
+import heapq
+import math
+from collections import Counter
+
+import numpy as np # type: ignore
+
+from formula_store import tokenize
+
+# BM25 parameters; names count NAME_WEIGHT times as much as the formula text
+BM25_K1 = 1.2
+BM25_B = 0.75
+NAME_WEIGHT = 2.0
+
+# Query words that are not whole terms are completed (prefix) or corrected (trigrams)
+PREFIX_EXPANSIONS = 8
+PREFIX_WEIGHT = 0.8
+FUZZY_EXPANSIONS = 3
+FUZZY_MIN_SIMILARITY = 0.45
+
+
+def trigrams(term):
+    """Character trigrams of a term, padded so short terms and word edges count"""
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PrefixTrie:
+    """Character trie over a set of terms.
+
+    Every node keeps its best completions, precomputed when the trie is
+    built, so completing a prefix costs one step per character.
+    """
+
+    def __init__(self, ranked_terms, max_completions=10):
+        """ranked_terms: the terms, best first"""
+        self.max_completions = max_completions
+        self.root = {}
+        # Each node keeps the first few terms that pass through it
+        for term in ranked_terms:
+            node = self.root
+            for char in term:
+                node = node.setdefault(char, {})
+                completions = node.setdefault('', [])
+                if len(completions) < max_completions:
+                    completions.append(term)
+        self._freeze(self.root)
+
+    def _freeze(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for char, child in node.items():
+                if char:
+                    child[''] = tuple(child[''])
+                    stack.append(child)
+
+    def complete(self, prefix, limit=None):
+        """Best terms starting with the prefix"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return ()
+        completions = node.get('', ())
+        return completions[:limit] if limit else completions
+
+
+class FormulaSearchEngine:
+    """Search engine over a FormulaStore.
+
+    Each formula is a document made of its path names and its formula
+    text, scored with BM25 (names weighted NAME_WEIGHT times). The
+    per-term scores are computed when the index is built and kept as
+    numpy arrays, so a query adds up the postings of its terms with a few
+    vectorised operations and picks the top results with argpartition. A query word that is not a known
+    term is completed through the prefix trie ("pytha" -> pythagorean) or,
+    failing that, corrected through the trigram index ("pythagorus").
+    """
+
+    def __init__(self, store):
+        self.store = store
+        documents = []
+        for entry in store.entries:
+            names = [token for name in entry.path for token in tokenize(name)]
+            text = tokenize(entry.formula) if isinstance(entry.formula, str) else []
+            documents.append((Counter(names), Counter(text), NAME_WEIGHT * len(names) + len(text)))
+
+        count = len(documents) or 1
+        average_length = sum(length for _, _, length in documents) / count or 1.0
+
+        frequencies = {}
+        for doc_id, (names, text, length) in enumerate(documents):
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            for term in names.keys() | text.keys():
+                tf = NAME_WEIGHT * names[term] + text[term]
+                frequencies.setdefault(term, []).append((doc_id, tf * (BM25_K1 + 1) / (tf + norm)))
+
+        # term -> (doc ids, bm25 scores) with the idf folded in
+        self._postings = {}
+        for term, postings in frequencies.items():
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            doc_ids, weights = zip(*postings)
+            self._postings[term] = (np.array(doc_ids, dtype=np.int32), np.array(weights) * idf)
+
+        # Completions are ranked by how many formulas use the term
+        self.trie = PrefixTrie(sorted(self._postings, key=lambda term: (-len(self._postings[term][0]), term)))
+
+        self._categories = {category: index for index, category in enumerate(store.categories)}
+        self._document_categories = np.array([self._categories[entry.path[0]] for entry in store.entries], dtype=np.int32)
+
+        self._trigrams = {}
+        for term in self._postings:
+            for trigram in trigrams(term):
+                self._trigrams.setdefault(trigram, []).append(term)
+
+    def similar_terms(self, word, limit=FUZZY_EXPANSIONS):
+        """Known terms closest to a misspelt word, as (term, similarity) pairs"""
+        word_trigrams = trigrams(word)
+        shared = Counter()
+        for trigram in word_trigrams:
+            shared.update(self._trigrams.get(trigram, ()))
+
+        candidates = []
+        for term, overlap in shared.items():
+            # Dice coefficient of the trigram sets
+            similarity = 2.0 * overlap / (len(word_trigrams) + len(term))
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                candidates.append((similarity, term))
+        return [(term, similarity) for similarity, term in heapq.nlargest(limit, candidates)]
+
+    def expand(self, word, complete=False):
+        """The terms a query word stands for, with their weights.
+
+        Unknown words are completed as prefixes, and corrected if nothing
+        starts with them; complete=True also completes a known word (the
+        word the user is still typing).
+        """
+        expansions = {}
+        if word in self._postings:
+            expansions[word] = 1.0
+        if complete or not expansions:
+            for term in self.trie.complete(word, PREFIX_EXPANSIONS):
+                expansions.setdefault(term, PREFIX_WEIGHT)
+        if not expansions:
+            expansions.update(self.similar_terms(word))
+        return expansions
+
+    def search(self, query, category=None, page=1, per_page=10):
+        """Rank the formulas for a query.
+
+        Returns (total, results) where results is the requested page of
+        (FormulaEntry, score) pairs, best first.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        # The last word may be unfinished unless the query ends with a space
+        unfinished = words[-1] if words and not query[-1:].isspace() else None
+
+        scores = np.zeros(len(self.store.entries))
+        for word in words:
+            expansions = self.expand(word, complete=word == unfinished)
+            if len(expansions) == 1:
+                (term, weight), = expansions.items()
+                doc_ids, weights = self._postings[term]
+                scores[doc_ids] += weight * weights
+                continue
+            # A document counts each query word once, through its best matching term
+            word_scores = np.zeros(len(scores))
+            for term, weight in expansions.items():
+                doc_ids, weights = self._postings[term]
+                word_scores[doc_ids] = np.maximum(word_scores[doc_ids], weight * weights)
+            scores += word_scores
+
+        if category:
+            scores[self._document_categories != self._categories.get(category, -1)] = 0.0
+
+        matched = np.flatnonzero(scores)
+        page = max(1, page)
+        wanted = page * per_page
+        if len(matched) > wanted:
+            matched = matched[np.argpartition(-scores[matched], wanted - 1)[:wanted]]
+        # Best first, ties in document order
+        matched = matched[np.lexsort((matched, -scores[matched]))][(page - 1) * per_page:]
+
+        entries = self.store.entries
+        return int(np.count_nonzero(scores)), [(entries[doc_id], float(scores[doc_id])) for doc_id in matched]
+
+    def stats(self):
+        """Size of the search index"""
+        return {
+            'documents': len(self.store.entries),
+            'terms': len(self._postings),
+            'trigrams': len(self._trigrams)
+        }
+
+
+class FormulaSuggester:
+    """Formula name autocomplete for the chat input.
+
+    Every word-suffix of every formula name ("law of sines", "of sines",
+    "sines") is a key in a PrefixTrie, and the suggestion payloads are
+    built up front, so a keystroke costs a walk down the trie. Answers are
+    memoized per query.
+    """
+
+    def __init__(self, store, max_suggestions=8, max_query_words=5):
+        self.max_suggestions = max_suggestions
+        self.max_query_words = max_query_words
+
+        self._suggestions = []
+        keys = {}
+        for entry_id, entry in enumerate(store.entries):
+            words = tokenize(entry.path[-1])
+            label = ' '.join(words)
+            self._suggestions.append({
+                'label': label,
+                'path': ' > '.join(entry.path[:-1]),
+                'formula': entry.formula
+            })
+            for start in range(len(words)):
+                keys.setdefault(' '.join(words[start:]), []).append(entry_id)
+        self._keys = {key: tuple(entry_ids) for key, entry_ids in keys.items()}
+
+        # Whole names before word-suffixes, then names shared by more formulas, then shorter ones
+        full_names = {suggestion['label'] for suggestion in self._suggestions}
+        ranked = sorted(self._keys, key=lambda key: (key not in full_names, -len(self._keys[key]), len(key), key))
+        self.trie = PrefixTrie(ranked, max_completions=max_suggestions)
+
+        self.suggest = functools.lru_cache(maxsize=4096)(self._suggest)
+
+    def _suggest(self, query):
+        """Suggestions for what is being typed, best first.
+
+        The longest tail of the query that starts a formula name is
+        completed; each suggestion's completion is the query with that
+        tail replaced by the full name.
+        """
+        words = tokenize(query)
+        if not words:
+            return []
+        unfinished = not query[-1:].isspace()
+
+        for start in range(max(0, len(words) - self.max_query_words), len(words)):
+            prefix = ' '.join(words[start:]) + ('' if unfinished else ' ')
+            keys = self.trie.complete(prefix)
+            if not keys:
+                continue
+
+            typed = ' '.join(words[:start])
+            seen = set()
+            results = []
+            for key in keys:
+                for entry_id in self._keys[key]:
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    suggestion = dict(self._suggestions[entry_id])
+                    suggestion['completion'] = f"{typed} {key}".strip()
+                    results.append(suggestion)
+                    if len(results) >= self.max_suggestions:
+                        return results
+            return results
+        return []
+
+    def stats(self):
+        """Size of the autocomplete index and its memo"""
+        info = self.suggest.cache_info()
+        return {
+            'keys': len(self._keys),
+            'cached_queries': info.currsize,
+            'hits': info.hits,
+            'misses': info.misses
+        }
@@ -0,0 +1,133 @@
+# Mathly - Flattened, prerendered formula store
+import hashlib
+import json
+import re
+from collections import namedtuple
+from collections.abc import Mapping
+from types import MappingProxyType
+
+# One formula: its path of names (category, topic, sub, ...) and its prerendered search line
+FormulaEntry = namedtuple('FormulaEntry', ['path', 'formula', 'display'])
+
+_TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# Limits of a category listing
+MAX_CATEGORY_FORMULAS = 15
+MAX_TOPIC_FORMULAS = 3
+
+
+def content_version(formulas):
+    """Content hash of a formulas dict; it changes whenever any formula does"""
+    canonical = json.dumps(formulas, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def tokenize(text):
+    """Lowercase word tokens of a name or query: 'law_of_sines' -> ['law', 'of', 'sines']"""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class FormulaStore:
+    """Immutable, flattened view of the nested formulas JSON.
+
+    The nested dict is flattened once into a tuple of FormulaEntry leaves
+    (searched by FormulaSearchEngine), and the category and topic listings
+    are rendered up front, so get_formula answers with dict hits.
+    """
+
+    def __init__(self, formulas):
+        self.version = content_version(formulas)
+
+        formulas = formulas.get('formulas', {})
+        entries = []
+
+        def visit(path, value):
+            if isinstance(value, Mapping):
+                for name, child in value.items():
+                    visit(path + (name,), child)
+            else:
+                entries.append(FormulaEntry(path, value, f"{' > '.join(path)}: {value}"))
+
+        for category, topics in formulas.items():
+            visit((category,), topics)
+
+        self.entries = tuple(entries)
+        self.categories = tuple(formulas)
+        self._category_set = frozenset(self.categories)
+
+        # Prerendered answers of get_formula
+        self._category_text = MappingProxyType({
+            category: self._render_category(category, formulas[category]) for category in self.categories
+            if isinstance(formulas[category], Mapping) and formulas[category]
+        })
+        self._topic_text = MappingProxyType({
+            (category, topic): self._render_topic(topic, value)
+            for category in self.categories if isinstance(formulas[category], Mapping)
+            for topic, value in formulas[category].items() if value
+        })
+
+    @staticmethod
+    def _render_topic(topic, value):
+        if not isinstance(value, Mapping):
+            return f"{topic}: {value}"
+        result = []
+        for sub_name, sub_formula in value.items():
+            if isinstance(sub_formula, Mapping):
+                result.append(f"{topic} {sub_name}:")
+                for sub_sub_name, sub_sub_formula in sub_formula.items():
+                    result.append(f"  • {sub_sub_name}: {sub_sub_formula}")
+            else:
+                result.append(f"{topic} {sub_name}: {sub_formula}")
+        return "\n".join(result)
+
+    @staticmethod
+    def _render_category(category, formulas):
+        result = []
+        formula_count = 0
+        for name, formula in formulas.items():
+            if formula_count >= MAX_CATEGORY_FORMULAS:
+                result.append(f"... and more {category} formulas (ask for specific topics for more details)")
+                break
+
+            if isinstance(formula, Mapping):
+                result.append(f"{name}:")
+                sub_count = 0
+                for sub_name, sub_formula in formula.items():
+                    if sub_count < MAX_TOPIC_FORMULAS:
+                        if isinstance(sub_formula, Mapping):
+                            result.append(f"  • {sub_name}: (complex formula - ask specifically for details)")
+                        else:
+                            result.append(f"  • {sub_name}: {sub_formula}")
+                        sub_count += 1
+                    formula_count += 1
+                    if formula_count >= MAX_CATEGORY_FORMULAS:
+                        break
+                if sub_count >= MAX_TOPIC_FORMULAS:
+                    result.append(f"  • ... and more formulas for {name}")
+            else:
+                result.append(f"{name}: {formula}")
+                formula_count += 1
+        return "\n".join(result)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def has_category(self, category):
+        """Whether the category exists"""
+        return category in self._category_set
+
+    def category_text(self, category):
+        """Prerendered listing of a category, or None"""
+        return self._category_text.get(category)
+
+    def topic_text(self, category, topic):
+        """Prerendered formulas of a topic, or None"""
+        return self._topic_text.get((category, topic))
+
+    def stats(self):
+        """Size of the store"""
+        return {
+            'version': self.version,
+            'entries': len(self.entries),
+            'categories': len(self.categories)
+        }
@@ -0,0 +1,92 @@
+# Mathly - Latency tracking and hedging policy for LLM provider calls
+import math
+import os
+import threading
+
+
+class LatencyHistogram:
+    """Log-bucketed latency histogram that favours recent samples.
+
+    Buckets grow by 25% from 10ms to about 2 minutes. Once the histogram
+    holds `window` samples every count is halved, so old latencies fade out
+    and percentiles follow the provider's current behaviour.
+    """
+
+    def __init__(self, min_latency=0.01, max_latency=120.0, growth=1.25, window=1000):
+        count = int(math.ceil(math.log(max_latency / min_latency, growth))) + 1
+        self.growth = growth
+        self.bounds = [min_latency * growth ** i for i in range(count)]
+        self.counts = [0] * (count + 1)  # the last bucket catches anything slower
+        self.window = window
+        self.total = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        """Record one latency sample"""
+        index = 0
+        if seconds > self.bounds[0]:
+            index = min(len(self.bounds), int(math.ceil(math.log(seconds / self.bounds[0], self.growth))))
+            # Correct for floating point error at bucket edges
+            while index < len(self.bounds) and seconds > self.bounds[index]:
+                index += 1
+        with self._lock:
+            self.counts[index] += 1
+            self.total += 1
+            if self.total >= self.window:
+                self.counts = [count // 2 for count in self.counts]
+                self.total = sum(self.counts)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, or None if empty"""
+        with self._lock:
+            if not self.total:
+                return None
+            target = q * self.total
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= target and count:
+                    return self.bounds[min(index, len(self.bounds) - 1)]
+            return self.bounds[-1]
+
+    def summary(self):
+        """Sample count and common percentiles in seconds"""
+        return {
+            'samples': self.total,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99)
+        }
+
+
+class HedgePolicy:
+    """Decide how long to wait on the primary provider before hedging.
+
+    The delay is the primary's recent latency percentile (p95 by default),
+    clamped to [min_delay, max_delay]. Until enough samples are collected
+    the default delay is used.
+    """
+
+    def __init__(self, percentile=0.95, default_delay=2.0, min_delay=0.25, max_delay=10.0, min_samples=20):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+
+    @classmethod
+    def from_env(cls):
+        """Build a policy from MATHLY_HEDGE_* environment variables"""
+        return cls(
+            percentile=float(os.getenv('MATHLY_HEDGE_PERCENTILE', '0.95')),
+            default_delay=float(os.getenv('MATHLY_HEDGE_DEFAULT_DELAY', '2.0')),
+            min_delay=float(os.getenv('MATHLY_HEDGE_MIN_DELAY', '0.25')),
+            max_delay=float(os.getenv('MATHLY_HEDGE_MAX_DELAY', '10.0'))
+        )
+
+    def delay_for(self, histogram):
+        """Seconds to wait for the primary before firing the secondary"""
+        if histogram.total < self.min_samples:
+            return self.default_delay
+        delay = histogram.percentile(self.percentile)
+        return min(self.max_delay, max(self.min_delay, delay))
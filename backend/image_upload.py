@@ -0,0 +1,115 @@
+# Mathly - Streaming image uploads: request body -> spooled file -> lazily decoded image
+import base64
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+
+from PIL import Image, UnidentifiedImageError # type: ignore
+
+# Bytes read from the upload at a time
+CHUNK_SIZE = 64 * 1024
+# Uploads larger than this are spooled to a temporary file instead of memory
+SPOOL_BYTES = 1024 * 1024
+
+
+class ImageUploadError(Exception):
+    """The upload is missing or is not a readable image"""
+    status = 400
+
+
+class ImageTooLargeError(ImageUploadError):
+    """The upload is larger than the size cap"""
+    status = 413
+
+
+def max_image_bytes():
+    """Size cap of an uploaded image, from MATHLY_IMAGE_MAX_BYTES"""
+    return int(os.getenv('MATHLY_IMAGE_MAX_BYTES', str(20 * 1024 * 1024)))
+
+
+# An uploaded image (opened, not yet decoded), with the SHA-256 and size of the uploaded bytes
+UploadedImage = namedtuple('UploadedImage', ['image', 'sha256', 'size'])
+
+
+def open_chunks(chunks, max_bytes):
+    """Spool the chunks of an encoded image and open it without decoding it.
+
+    Each chunk is hashed and written to a spooled file that moves to disk
+    once it passes SPOOL_BYTES, so a large upload is never held in memory
+    as a whole. The pixels are only decoded when the image is loaded,
+    which lets the caller pick a smaller decoding size first (Image.draft).
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            raise ImageTooLargeError(f"Image is larger than {max_bytes} bytes")
+        digest.update(chunk)
+        spool.write(chunk)
+    if not size:
+        raise ImageUploadError("No image provided")
+    spool.seek(0)
+    try:
+        image = Image.open(spool)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(f"Image has too many pixels: {e}")
+    except UnidentifiedImageError:
+        raise ImageUploadError("Could not read the image: not a supported image format")
+    except (OSError, SyntaxError) as e:
+        raise ImageUploadError(f"Could not read the image: {e}")
+    return UploadedImage(image, digest.hexdigest(), size)
+
+
+def iter_stream(stream, chunk_size=CHUNK_SIZE):
+    """Chunks of a file-like object until it is exhausted"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def iter_base64(data, chunk_size=CHUNK_SIZE):
+    """Decoded chunks of a base64 string (or data URL), decoded piece by piece"""
+    start = data.find(',') + 1
+    # Whole 4-character groups, so every piece decodes on its own
+    step = chunk_size // 3 * 4
+    for offset in range(start, len(data), step):
+        try:
+            yield base64.b64decode(data[offset:offset + step])
+        except ValueError as e:
+            raise ImageUploadError(f"Image is not valid base64: {e}")
+
+
+def read_upload(request, max_bytes=None):
+    """Open the image of an /api/image request.
+
+    Accepts the raw image as the request body (image/* or
+    application/octet-stream), a multipart form with an 'image' file, or
+    the older JSON body with a base64 data URL in 'image'.
+    """
+    max_bytes = max_image_bytes() if max_bytes is None else max_bytes
+    raw = request.mimetype not in ('application/json', 'multipart/form-data')
+    # Base64 and form encoding add to the size of the image itself
+    body_limit = max_bytes if raw else max_bytes * 4 // 3 + CHUNK_SIZE
+    if request.content_length is not None and request.content_length > body_limit:
+        # Refuse before reading any of it
+        raise ImageTooLargeError(f"Image is larger than {max_bytes} bytes")
+
+    if request.mimetype == 'application/json':
+        data = request.get_json(silent=True) or {}
+        image_data = data.get('image', '')
+        if not isinstance(image_data, str) or not image_data:
+            raise ImageUploadError("No image provided")
+        return open_chunks(iter_base64(image_data), max_bytes)
+
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        if upload is None:
+            raise ImageUploadError("No image provided")
+        return open_chunks(iter_stream(upload.stream), max_bytes)
+
+    return open_chunks(iter_stream(request.stream), max_bytes)
@@ -0,0 +1,99 @@
+# Mathly - Multi-keyword matching in a single pass (Aho-Corasick)
+from collections import deque
+
+
+class KeywordHits:
+    """The keywords found in one piece of text.
+
+    Membership tests against compiled keywords are set lookups. Words that
+    were not compiled into the matcher fall back to a substring check, so
+    the answer is always the same as `word in text`.
+    """
+
+    def __init__(self, text, found, vocabulary):
+        self.text = text
+        self.found = found
+        self.vocabulary = vocabulary
+
+    def __contains__(self, word):
+        if word in self.vocabulary:
+            return word in self.found
+        return word in self.text
+
+    def __iter__(self):
+        return iter(self.found)
+
+    def __len__(self):
+        return len(self.found)
+
+    def any(self, words):
+        """Whether any of the words occurs in the text"""
+        return any(word in self for word in words)
+
+    def all(self, words):
+        """Whether every one of the words occurs in the text"""
+        return all(word in self for word in words)
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over a fixed set of keywords.
+
+    Built once, it finds every keyword occurring in a text (as a substring,
+    overlaps included) in a single pass, so the cost of a lookup depends on
+    the length of the text and not on the number of keywords. Matching is
+    case-insensitive.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = frozenset(keyword.lower() for keyword in keywords if keyword)
+
+        # Trie of the keywords
+        goto = [{}]
+        output = [()]
+        for keyword in sorted(self.keywords):
+            state = 0
+            for char in keyword:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto.append({})
+                    output.append(())
+                    goto[state][char] = next_state
+                state = next_state
+            output[state] = (keyword,)
+
+        # Breadth-first, so a state's failure target is finished before the state itself.
+        # Each state's transitions include the ones inherited through its failure link,
+        # which turns the automaton into a DFA with one dict lookup per character.
+        fail = [0] * len(goto)
+        self._transitions = [None] * len(goto)
+        self._transitions[0] = dict(goto[0])
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            transitions = dict(self._transitions[fail[state]])
+            transitions.update(goto[state])
+            self._transitions[state] = transitions
+            for char, next_state in goto[state].items():
+                fail[next_state] = self._transitions[fail[state]].get(char, 0)
+                output[next_state] = output[next_state] + output[fail[next_state]]
+                queue.append(next_state)
+        self._output = output
+
+    @property
+    def state_count(self):
+        """Number of states in the automaton"""
+        return len(self._transitions)
+
+    def find(self, text):
+        """Find every keyword in the text, returning a KeywordHits"""
+        text = text.lower()
+        transitions = self._transitions
+        output = self._output
+        found = set()
+        state = 0
+        for char in text:
+            state = transitions[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return KeywordHits(text, found, self.keywords)
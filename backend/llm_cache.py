@@ -0,0 +1,172 @@
+# Mathly - Response cache for LLM answers, keyed on the normalized question
+import os
+import re
+from decimal import Decimal, InvalidOperation
+
+from disk_cache import DiskCache, TieredJSONCache
+from result_cache import ResultCache
+
+# Bump when the provider prompts change so old answers are not served
+PROMPT_VERSION = 1
+
+# Filler words that don't change what is being asked
+STOP_WORDS = {
+    'a', 'an', 'the', 'is', 'are', 'was', 'were', 'be', 'what', 'whats',
+    'please', 'pls', 'can', 'could', 'would', 'you', 'me', 'i', 'my',
+    'tell', 'give', 'show', 'hey', 'hi', 'hello', 'thanks', 'thank'
+}
+
+CONTRACTIONS = {
+    "what's": 'what is',
+    "whats": 'what is',
+    "it's": 'it is',
+    "that's": 'that is',
+    "how's": 'how is',
+    "where's": 'where is',
+    "i'm": 'i am',
+    "don't": 'do not',
+    "doesn't": 'does not',
+    "can't": 'cannot',
+    "isn't": 'is not'
+}
+
+# Bump when normalize_query changes, so answers stored under old keys are not served
+NORMALIZATION_VERSION = 3
+
+# Spelled-out operators; a single letter next to one is a variable ("a times b"), not an article
+OPERATOR_WORDS = {
+    'plus', 'minus', 'times', 'over', 'divided', 'multiplied', 'equals', 'squared', 'cubed', 'mod'
+}
+
+# Numbers, single symbols that matter in maths, and commas between numbers: "12,345" may be
+# a list as well as a thousands separator, so it must not become 12345
+_TOKEN_PATTERN = re.compile(r"\d*\.\d+|\d+|[a-z]+(?:'[a-z]+)?|[-+*/^=<>()²³√π∫∑%!]|(?<=\d),(?=\s*\d)")
+
+
+def canonical_number(text):
+    """Write a number the same way however it was typed: 1000.50 -> 1000.5, 3.0 -> 3"""
+    try:
+        number = Decimal(text)
+    except InvalidOperation:
+        return text
+    if number == number.to_integral_value():
+        return str(int(number))
+    return format(number.normalize(), 'f')
+
+
+def normalize_query(query):
+    """Fold a question into the form used as its cache key.
+
+    Case, whitespace, punctuation and filler words are dropped and numbers
+    are written canonically, while maths symbols and word order are kept:
+    "What's the Pythagorean theorem?" and "what is the pythagorean theorem"
+    both become "pythagorean theorem".
+    """
+    text = query.lower().replace('’', "'")
+    for contraction, expansion in CONTRACTIONS.items():
+        text = re.sub(rf"\b{re.escape(contraction)}(?!\w)", expansion, text)
+
+    tokens = _TOKEN_PATTERN.findall(text)
+    normalized = []
+    for index, token in enumerate(tokens):
+        previous = tokens[index - 1] if index else ''
+        if token[0].isdigit() or token[0] == '.':
+            # After a comma the digits may be a thousands group, whose zeros matter ("1,000")
+            normalized.append(token if previous == ',' else canonical_number(token))
+        elif token[0].isalpha():
+            # Single letters next to numbers, symbols or spelled-out operators are variables
+            # ("a + 2", "i^2", "a times b"), and so is a last word ("solve for a"); an article
+            # always comes before something
+            following = tokens[index + 1] if index + 1 < len(tokens) else ''
+            in_formula = len(token) == 1 and (not following or any(
+                neighbour and (not neighbour[0].isalpha() or neighbour in OPERATOR_WORDS)
+                for neighbour in (previous, following)))
+            if token not in STOP_WORDS or in_formula:
+                normalized.append(token.replace("'", ''))
+        elif token == '!':
+            # A factorial follows a number, a bracket or a variable; otherwise it's punctuation
+            if previous and (previous[0].isdigit() or previous == ')' or (len(previous) == 1 and previous.isalpha())):
+                normalized.append(token)
+        else:
+            normalized.append(token)
+    return ' '.join(normalized)
+
+
+class LLMResponseCache(TieredJSONCache):
+    """Cache of LLM answers in front of the paid provider calls.
+
+    Answers live in a memory-bounded LRU (ResultCache) and, when a directory
+    is configured, are also written to disk so they survive restarts and are
+    shared between worker processes. Each entry carries its own expiry.
+    Every hit is counted as a provider call saved, with its estimated cost.
+    """
+
+    label = 'LLM answer'
+
+    def __init__(self, memory=None, disk=None, ttl=86400, cost_per_1k_tokens=0.015):
+        if memory is None:
+            memory = ResultCache(max_entries=2048, max_bytes=16 * 1024 * 1024, ttl=ttl)
+        super().__init__(memory, disk, ttl, metrics={
+            'calls_saved': 0,
+            'seconds_saved': 0.0,
+            'tokens_saved': 0,
+            'cost_saved': 0.0
+        })
+        self.cost_per_1k_tokens = cost_per_1k_tokens
+
+    @classmethod
+    def from_env(cls):
+        """Build a cache from MATHLY_LLM_CACHE_* environment variables.
+
+        Returns None when MATHLY_LLM_CACHE_ENTRIES is 0. Answers are only
+        persisted when MATHLY_LLM_CACHE_DIR is set.
+        """
+        ttl = float(os.getenv('MATHLY_LLM_CACHE_TTL', '86400'))
+        tiers = cls.tiers_from_env('MATHLY_LLM_CACHE', ttl, max_entries=2048, max_bytes=16 * 1024 * 1024,
+                                   disk_bytes=64 * 1024 * 1024)
+        if tiers is None:
+            return None
+        cost = float(os.getenv('MATHLY_LLM_COST_PER_1K_TOKENS', '0.015'))
+        return cls(memory=tiers[0], disk=tiers[1], ttl=ttl, cost_per_1k_tokens=cost)
+
+    @staticmethod
+    def key_for(query):
+        """Cache key of a question"""
+        return DiskCache.make_key('llm', PROMPT_VERSION, NORMALIZATION_VERSION, normalize_query(query))
+
+    @staticmethod
+    def estimate_tokens(query, answer):
+        """Rough token count of a provider call (about 4 characters per token)"""
+        return (len(query) + len(answer)) // 4
+
+    def get(self, query):
+        """Cached answer to a question, or None"""
+        entry = self.get_entry(self.key_for(query))
+        if entry is None:
+            return None
+
+        with self._lock:
+            self.metrics['hits'] += 1
+            self.metrics['calls_saved'] += 1
+            self.metrics['seconds_saved'] += entry['latency']
+            self.metrics['tokens_saved'] += entry['tokens']
+            self.metrics['cost_saved'] += entry['tokens'] / 1000 * self.cost_per_1k_tokens
+        return entry['answer']
+
+    def put(self, query, answer, latency=0.0, ttl=None):
+        """Store a provider's answer to a question"""
+        if not answer:
+            return
+        self.put_entry(self.key_for(query), {
+            'answer': answer,
+            'latency': round(latency, 3),
+            'tokens': self.estimate_tokens(query, answer),
+            'query': normalize_query(query)
+        }, ttl=ttl)
+
+    def stats(self):
+        """Cache usage and the estimated provider cost it saved"""
+        result = super().stats()
+        result['seconds_saved'] = round(result['seconds_saved'], 3)
+        result['cost_saved'] = round(result['cost_saved'], 4)
+        return result
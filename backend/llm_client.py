@@ -0,0 +1,173 @@
+# Mathly - Shared HTTP client for the LLM provider APIs
+import asyncio
+import os
+import queue
+import threading
+
+# Try to import httpx, but don't fail if not available
+try:
+    import httpx # type: ignore
+except ImportError:
+    httpx = None
+    print("httpx not installed, LLM provider calls are disabled")
+
+try:
+    import h2 # type: ignore  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class LLMClientError(Exception):
+    """Raised when a provider request fails or runs out of time"""
+
+
+class LLMClient:
+    """Keep-alive HTTP client shared by every LLM provider call.
+
+    A single httpx.AsyncClient (connection pooled, HTTP/2 when the h2
+    package is installed) lives on a private event loop thread. Sync
+    callers block on it with a total deadline; async callers on any event
+    loop await it without tying up a thread, so one process can keep
+    hundreds of requests in flight.
+    """
+
+    def __init__(self, connect_timeout=5.0, read_timeout=60.0, total_timeout=90.0,
+                 max_connections=200, max_keepalive_connections=50, http2=True):
+        if httpx is None:
+            raise LLMClientError("httpx is required for LLM provider calls")
+
+        self.total_timeout = total_timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout,
+                                      write=connect_timeout, pool=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_keepalive_connections)
+
+        self._lock = threading.Lock()
+        self._loop = None
+        self._client = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls):
+        """Build a client from MATHLY_LLM_* environment variables"""
+        return cls(
+            connect_timeout=float(os.getenv('MATHLY_LLM_CONNECT_TIMEOUT', '5')),
+            read_timeout=float(os.getenv('MATHLY_LLM_READ_TIMEOUT', '60')),
+            total_timeout=float(os.getenv('MATHLY_LLM_TOTAL_TIMEOUT', '90')),
+            max_connections=int(os.getenv('MATHLY_LLM_MAX_CONNECTIONS', '200')),
+            http2=os.getenv('MATHLY_LLM_HTTP2', '1') != '0'
+        )
+
+    @property
+    def loop(self):
+        """The client's event loop, started on first use (and again after a fork)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._client = httpx.AsyncClient(http2=self.http2, timeout=self._timeout, limits=self._limits)
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name='mathly-llm-client', daemon=True).start()
+            return self._loop
+
+    async def _post_json(self, url, headers, payload):
+        response = await self._client.post(url, headers=headers, json=payload)
+        try:
+            data = response.json()
+        except ValueError:
+            data = None
+        return response.status_code, data
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine on the client's loop and wait for its result"""
+        timeout = self.total_timeout if timeout is None else timeout
+        future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(coroutine, timeout), self.loop)
+        try:
+            return future.result()
+        except asyncio.TimeoutError:
+            raise LLMClientError(f"Request took longer than {timeout:g} seconds")
+
+    async def run_async(self, coroutine, timeout=None):
+        """Await a coroutine that uses the client from any event loop"""
+        timeout = self.total_timeout if timeout is None else timeout
+        loop = self.loop
+        try:
+            if asyncio.get_running_loop() is loop:
+                return await asyncio.wait_for(coroutine, timeout)
+            # Cancelling the caller cancels the request on the client loop as well
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(asyncio.wait_for(coroutine, timeout), loop))
+        except asyncio.TimeoutError:
+            raise LLMClientError(f"Request took longer than {timeout:g} seconds")
+
+    def iter_async(self, async_iterator, timeout=None):
+        """Iterate an async generator that uses the client from a sync caller.
+
+        Items are handed over as soon as they are produced. Closing the
+        returned generator early cancels the async one.
+        """
+        timeout = self.total_timeout if timeout is None else timeout
+        items = queue.Queue()
+        finished = object()
+
+        async def pump():
+            try:
+                async for item in async_iterator:
+                    items.put(item)
+            finally:
+                items.put(finished)
+
+        future = asyncio.run_coroutine_threadsafe(asyncio.wait_for(pump(), timeout), self.loop)
+        try:
+            while True:
+                item = items.get()
+                if item is finished:
+                    break
+                yield item
+            future.result()
+        except asyncio.TimeoutError:
+            raise LLMClientError(f"Stream took longer than {timeout:g} seconds")
+        finally:
+            future.cancel()
+
+    async def astream_lines(self, url, headers, payload):
+        """POST a JSON payload and yield the response body line by line, for
+        providers that stream their answers as server-sent events"""
+        async with self._client.stream('POST', url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                raise LLMClientError(f"Streaming request failed with status {response.status_code}")
+            async for line in response.aiter_lines():
+                yield line
+
+    def post_json(self, url, headers, payload, timeout=None):
+        """POST a JSON payload and return (status code, decoded JSON or None)"""
+        return self.run(self._post_json(url, headers, payload), timeout)
+
+    async def apost_json(self, url, headers, payload, timeout=None):
+        """Async version of post_json"""
+        return await self.run_async(self._post_json(url, headers, payload), timeout)
+
+    def close(self):
+        """Close pooled connections and stop the loop thread"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            loop, client = self._loop, self._client
+            self._loop = self._client = None
+        asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+# Client shared by every MathAIModel in the process
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_client():
+    """Get the process-wide LLM client, or None if httpx is not installed"""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None and httpx is not None:
+            _shared_client = LLMClient.from_env()
+        return _shared_client
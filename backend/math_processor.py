@@ -2,14 +2,145 @@
 import math
 import re
 import numpy as np # type: ignore
-from sympy import symbols, solve, simplify, expand, factor, sympify, Eq, diff, integrate, limit, Symbol # type: ignore
+from sympy import symbols, solve, simplify, expand, factor, sympify, Eq, diff, integrate, limit, Symbol, srepr, lambdify # type: ignore
 from sympy.parsing.sympy_parser import parse_expr # type: ignore
-from pathlib import Path
-import json
+import functools
+import inspect
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from symbolic_pool import SymbolicTimeoutError, SymbolicWorkerError
+from expression_compiler import ExpressionCompiler
+from problem_classifier import ProblemClassifier
+from formula_registry import shared_registry
+
+# Per-process MathProcessor used inside symbolic pool workers
+_worker_processor = None
+
+
+def _run_symbolic_job(method_name, args, kwargs):
+    """Run a MathProcessor method inside a symbolic pool worker"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = MathProcessor()
+    return getattr(_worker_processor, method_name)(*args, **kwargs)
+
+
+def _iter_symbolic_job(method_name, args, kwargs):
+    """Stream the steps of a MathProcessor solver inside a symbolic pool worker"""
+    global _worker_processor
+    if _worker_processor is None:
+        _worker_processor = MathProcessor()
+    return _worker_processor.iter_steps(method_name, *args, **kwargs)
+
+
+# Most points evaluate_over_points will compute in one call
+MAX_EVALUATION_POINTS = 1000000
+
+# Step-by-step solvers: (symbolic pool operation, step generator, error message)
+STEP_SOLVERS = {
+    'solve_equation_with_steps': ('solve', '_equation_steps', "Error solving equation"),
+    'differentiate_with_steps': ('differentiate', '_derivative_steps', "Error differentiating expression"),
+    'integrate_with_steps': ('integrate', '_integral_steps', "Error integrating expression"),
+    'calculate_limit': ('limit', '_limit_steps', "Error calculating limit"),
+    'factor_expression': ('factor', '_factor_steps', "Error factoring expression"),
+    'expand_expression': ('expand', '_expansion_steps', "Error expanding expression"),
+}
+
+
+def _clean_expression(expression):
+    """The text the step-by-step solvers parse: ^ as **, 2x as 2*x, runs of spaces as one"""
+    clean_expr = ' '.join(str(expression).split()).replace('^', '**')
+    return re.sub(r'(\d)([a-zA-Z])', r'\1*\2', clean_expr)
+
+
+def _clean_equation(equation):
+    """The (left, right) sides the equation solver parses"""
+    # Extract just the equation if there's text around it
+    equation_match = re.search(r'([^=]*=\s*[^=]*)', equation)
+    if equation_match:
+        equation = equation_match.group(1).strip()
+    equation = equation.replace('x²', 'x**2')
+
+    # Convert expressions to equations
+    if '=' not in equation:
+        equation = equation + " = 0"
+    left_str, right_str = equation.split('=')
+    return _clean_expression(left_str).strip(), _clean_expression(right_str).strip()
+
+
+def _display(clean_expr):
+    """Show a cleaned expression the way the steps write math: x^2, 2·x"""
+    return clean_expr.replace('**', '^').replace('*', '·')
+
+
+def _prepare_numeric(clean_expr, variable, derivative=0):
+    """Parse an expression (and take its derivative), returning it as srepr text.
+
+    This is the SymPy half of compiling an expression for NumPy. parse_expr
+    evaluates eagerly (9**9**9 never returns), so it runs in the symbolic
+    pool when there is one; the text is already evaluated and cheap to rebuild.
+    """
+    x = symbols(variable)
+    expr = parse_expr(clean_expr)
+    unknown = expr.free_symbols - {x}
+    if unknown:
+        names = ', '.join(sorted(str(symbol) for symbol in unknown))
+        raise ValueError(f"Expression depends on symbols other than {variable}: {names}")
+    if derivative:
+        expr = diff(expr, x, derivative)
+    return srepr(expr)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_numeric(prepared, variable):
+    """Compile a prepared expression into a NumPy function of one variable"""
+    return lambdify(symbols(variable), sympify(prepared), modules='numpy')
+
+
+def symbolic_operation(operation):
+    """Serve the decorated method from the result cache, or run it in the
+    symbolic worker pool if one is configured"""
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            cache_key = self._result_cache_key(method.__name__, signature.bind(self, *args, **kwargs))
+            if cache_key is not None:
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    return cached
+
+            if self.symbolic_pool is None:
+                result = method(self, *args, **kwargs)
+            else:
+                try:
+                    result = self.symbolic_pool.run(operation, _run_symbolic_job, method.__name__, args, kwargs)
+                except SymbolicWorkerError as e:
+                    return f"Error running {operation}: {str(e)}"
+
+            # Don't cache failures, the input may just have been mistyped
+            if cache_key is not None and not result.startswith('Error'):
+                self.result_cache.put(cache_key, result)
+            return result
+        return wrapper
+    return decorator
+
 
 class MathProcessor:
-    def __init__(self):
-        # Create a dictionary of safe functions that can be used with eval
+    def __init__(self, symbolic_pool=None, result_cache=None, formula_registry=None):
+        # Optional SymbolicWorkerPool that bounds the run time of SymPy work
+        self.symbolic_pool = symbolic_pool
+        # Optional ResultCache shared by the step-by-step solvers
+        self.result_cache = result_cache
+        # Thread pool for batches, created on first use
+        self._batch_executor = None
+        self._batch_executor_pid = None
+        self._batch_lock = threading.Lock()
+        
+        # Create a dictionary of safe functions that expressions may call
         self.safe_functions = {
             'abs': abs,
             'round': round,
@@ -24,28 +155,86 @@ class MathProcessor:
         for func_name in dir(math):
             if not func_name.startswith('_'):
                 self.safe_functions[func_name] = getattr(math, func_name)
+
+        # Arithmetic expressions are compiled once against the safe functions
+        self.expression_compiler = ExpressionCompiler(self.safe_functions)
+        # Expressions evaluated over points are parsed once (in the symbolic pool, if any)
+        self._prepare_numeric = functools.lru_cache(maxsize=256)(self._prepare_numeric_uncached)
         
-        # Load formulas
-        formulas_path = Path(__file__).parent.parent / 'data' / 'math_formulas.json'
-        with open(formulas_path) as f:
-            self.formulas = json.load(f)
+        # Formula data, shared with MathAIModel (the process-wide registry unless one is given).
+        # Resolved on first use, so symbolic pool workers never load it.
+        self._formula_registry = formula_registry
+        # (store, classifier for its categories), replaced together so threads never mix them
+        self._classifier = (None, None)
+
+    @property
+    def formula_registry(self):
+        if self._formula_registry is None:
+            self._formula_registry = shared_registry()
+        return self._formula_registry
+
+    @formula_registry.setter
+    def formula_registry(self, registry):
+        self._formula_registry = registry
+
+    @property
+    def formulas(self):
+        return self.formula_registry.current().formulas
+
+    @property
+    def classifier(self):
+        """Classifies questions and pulls out their expression in one pass"""
+        store = self.formula_registry.current().store
+        built_for, classifier = self._classifier
+        # Rebuilt when a reload brings in new data, since the categories may have changed
+        if built_for is not store:
+            classifier = ProblemClassifier(store.categories)
+            self._classifier = (store, classifier)
+        return classifier
 
     def evaluate_expression(self, expression):
         """Safely evaluate a mathematical expression"""
         try:
-            # Clean and secure the expression
-            cleaned_expr = self._clean_expression(expression)
-            return eval(cleaned_expr, {"__builtins__": {}}, self.safe_functions)
+            compiled = self.expression_compiler.compile(expression)
         except Exception as e:
             return f"Error: {str(e)}"
 
-    def _clean_expression(self, expression):
-        """Clean and secure the expression for evaluation"""
-        # Remove any potentially dangerous code
-        if any(keyword in expression for keyword in ['import', 'exec', 'eval', 'compile', 'open', '__']):
-            raise ValueError("Potentially unsafe expression")
-        return expression
-    
+        cache_key = None
+        if self.result_cache is not None:
+            # Keyed on the syntax tree: spacing doesn't change it, and "2 3" never gets this far
+            cache_key = ('evaluate_expression', compiled.key)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        try:
+            result = self.expression_compiler.run(compiled)
+        except Exception as e:
+            return f"Error: {str(e)}"
+
+        if cache_key is not None:
+            self.result_cache.put(cache_key, result)
+        return result
+
+    def _result_cache_key(self, method_name, bound_args):
+        """Build the result cache key for a solver call, or None if it can't be cached.
+
+        The key is the cleaned text the solver parses, and the steps only
+        show that text, so every input with the same key gets the same answer.
+        """
+        if self.result_cache is None:
+            return None
+        bound_args.apply_defaults()
+        arguments = list(bound_args.arguments.items())[1:]  # skip self
+        try:
+            if method_name == 'solve_equation_with_steps':
+                clean = ' = '.join(_clean_equation(arguments[0][1]))
+            else:
+                clean = _clean_expression(arguments[0][1])
+        except Exception:
+            return None
+        return (method_name, clean) + tuple((name, str(value)) for name, value in arguments[1:])
+
     def solve_basic_equation(self, equation):
         """Solve a simple linear equation using basic algebra"""
         try:
@@ -93,372 +282,435 @@ class MathProcessor:
         except Exception as e:
             return f"Error solving equation: {str(e)}"
     
+    @symbolic_operation('solve')
     def solve_equation_with_steps(self, equation):
         """Solve an equation with step-by-step explanation"""
-        try:
-            # Extract just the equation if there's text around it
-            equation_pattern = r'([^=]*=\s*[^=]*)'
-            equation_match = re.search(equation_pattern, equation)
-            if equation_match:
-                equation = equation_match.group(1).strip()
-            
-            # Check for common equation patterns in text
-            if 'x^2' in equation or 'x²' in equation:
-                equation = re.sub(r'x²', 'x**2', equation)
-                equation = re.sub(r'x\^2', 'x**2', equation)
-            
-            # Parse the equation
-            if '=' not in equation:
-                equation = equation + " = 0"  # Convert expressions to equations
-
-            # Split the equation into left and right parts
-            left_str, right_str = equation.split('=')
-            left_str = left_str.strip()
-            right_str = right_str.strip()
-
-            # Clean the expressions (replace ^ with **)
-            left_str = left_str.replace('^', '**')
-            right_str = right_str.replace('^', '**')
-            
-            # Add multiplication operators where needed (e.g., 2x -> 2*x)
-            left_str = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', left_str)
-            right_str = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', right_str)
-            
-            print(f"Parsing equation: Left: '{left_str}', Right: '{right_str}'")
-            
-            # Convert to SymPy expressions
-            x = symbols('x')
-            
-            # Special handling for simple cases
-            if re.match(r'^x\*\*2\s*[\+\-]\s*\d+\s*\*\s*x\s*[\+\-]\s*\d+$', left_str) and right_str == '0':
-                # Directly extract coefficients for quadratic equation ax^2 + bx + c = 0
-                print("Detected standard form quadratic equation")
-                return self._solve_quadratic_with_steps(left_str)
-                
-            left_expr = parse_expr(left_str)
-            right_expr = parse_expr(right_str)
-            
-            # Create the equation
-            eq = Eq(left_expr, right_expr)
-            
-            # Solve the equation
-            solution = solve(eq, x)
-            
-            # Generate step-by-step explanation
-            steps = []
-            display_left = left_str.replace('**', '^').replace('*', '·')
-            display_right = right_str.replace('**', '^').replace('*', '·')
-            steps.append(f"Step 1: Start with the equation {display_left} = {display_right}")
-            
-            # Move all terms to left side
-            steps.append(f"Step 2: Subtract {display_right} from both sides")
-            steps.append(f"         {display_left} - {display_right} = 0")
-            
-            # Simplify
-            simplified = simplify(left_expr - right_expr)
-            simplified_str = str(simplified).replace('**', '^').replace('*', '·')
-            steps.append(f"Step 3: Simplify the equation")
-            steps.append(f"         {simplified_str} = 0")
-            
-            # Solve for x
-            if solution:
-                steps.append(f"Step 4: Solve for x")
-                solution_str = str(solution).replace('**', '^').replace('*', '·')
-                steps.append(f"         x = {solution_str}")
-                steps.append(f"\nAnswer: x = {solution_str}")
-            else:
-                steps.append("\nNo solution found.")
-                
-            return "\n".join(steps)
-        except Exception as e:
-            import traceback
-            traceback_str = traceback.format_exc()
-            return f"Error solving equation: {str(e)}\n{traceback_str}"
+        return self._collect_steps('solve_equation_with_steps', equation)
     
+    @symbolic_operation('differentiate')
     def differentiate_with_steps(self, expression, variable='x'):
         """Differentiate an expression with step-by-step explanation"""
-        try:
-            # Clean the expression (replace ^ with ** and add * where needed)
-            clean_expr = expression.replace('^', '**')
-            
-            # Add multiplication operators where needed (e.g., 2x -> 2*x)
-            clean_expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', clean_expr)
-            
-            # Parse the expression
-            x = symbols(variable)
-            expr = parse_expr(clean_expr)
-            
-            # Compute the derivative
-            derivative = diff(expr, x)
-            
-            # Generate step-by-step explanation
-            steps = []
-            steps.append(f"Step 1: Start with the expression f({variable}) = {expression}")
-            steps.append(f"Step 2: Apply differentiation rules")
-            
-            # If expression is a sum/difference, show term-by-term differentiation
-            terms = clean_expr.split('+')
-            if len(terms) > 1:
-                steps.append(f"         We can differentiate each term separately:")
-                for i, term in enumerate(terms):
-                    term = term.strip()
-                    if '-' in term and term[0] != '-':
-                        # Handle subtraction within terms
-                        sub_terms = term.split('-')
-                        for j, sub_term in enumerate(sub_terms):
-                            if j == 0:
-                                result = diff(parse_expr(sub_term), x)
-                                display_term = sub_term.replace('**', '^').replace('*', '·')
-                                steps.append(f"         d/d{variable}({display_term}) = {str(result).replace('**', '^').replace('*', '·')}")
-                            else:
-                                result = diff(-parse_expr(sub_term), x)
-                                display_term = sub_term.replace('**', '^').replace('*', '·')
-                                steps.append(f"         d/d{variable}(-{display_term}) = {str(result).replace('**', '^').replace('*', '·')}")
-                    else:
-                        result = diff(parse_expr(term), x)
-                        display_term = term.replace('**', '^').replace('*', '·')
-                        steps.append(f"         d/d{variable}({display_term}) = {str(result).replace('**', '^').replace('*', '·')}")
-            
-            # Show product rule, quotient rule, chain rule application if relevant
-            if '*' in clean_expr and '/' not in clean_expr:
-                steps.append(f"         Using the product rule: d/d{variable}(f·g) = f·(dg/d{variable}) + g·(df/d{variable})")
-            elif '/' in clean_expr:
-                steps.append(f"         Using the quotient rule: d/d{variable}(f/g) = (g·(df/d{variable}) - f·(dg/d{variable}))/g²")
-            
-            steps.append(f"Step 3: Simplify the result")
-            formatted_derivative = str(derivative).replace('**', '^').replace('*', '·')
-            steps.append(f"         d/d{variable}({expression}) = {formatted_derivative}")
-            steps.append(f"\nAnswer: d/d{variable}({expression}) = {formatted_derivative}")
-                
-            return "\n".join(steps)
-        except Exception as e:
-            import traceback
-            traceback_str = traceback.format_exc()
-            return f"Error differentiating expression: {str(e)}\n{traceback_str}"
+        return self._collect_steps('differentiate_with_steps', expression, variable)
     
+    @symbolic_operation('integrate')
     def integrate_with_steps(self, expression, variable='x'):
         """Integrate an expression with step-by-step explanation"""
-        try:
-            # Clean the expression (replace ^ with **)
-            clean_expr = expression.replace('^', '**')
-            
-            # Add multiplication operators where needed (e.g., 2x -> 2*x)
-            clean_expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', clean_expr)
-            
-            # Parse the expression
-            x = symbols(variable)
-            expr = parse_expr(clean_expr)
-            
-            # Compute the integral
-            integral = integrate(expr, x)
-            
-            # Generate step-by-step explanation
-            steps = []
-            steps.append(f"Step 1: Start with the expression {expression}")
-            steps.append(f"Step 2: Apply integration rules")
-            
-            # If expression is a sum/difference, show term-by-term integration
-            terms = clean_expr.split('+')
-            if len(terms) > 1:
-                steps.append(f"         We can integrate each term separately:")
-                for i, term in enumerate(terms):
-                    term = term.strip()
-                    if '-' in term and term[0] != '-':
-                        # Handle subtraction within terms
-                        sub_terms = term.split('-')
-                        for j, sub_term in enumerate(sub_terms):
-                            if j == 0:
-                                result = integrate(parse_expr(sub_term), x)
-                                display_term = sub_term.replace('**', '^').replace('*', '·')
-                                steps.append(f"         ∫{display_term} d{variable} = {str(result).replace('**', '^').replace('*', '·')}")
-                            else:
-                                result = integrate(-parse_expr(sub_term), x)
-                                display_term = sub_term.replace('**', '^').replace('*', '·')
-                                steps.append(f"         ∫-{display_term} d{variable} = {str(result).replace('**', '^').replace('*', '·')}")
-                    else:
-                        result = integrate(parse_expr(term), x)
-                        display_term = term.replace('**', '^').replace('*', '·')
-                        steps.append(f"         ∫{display_term} d{variable} = {str(result).replace('**', '^').replace('*', '·')}")
-            
-            # Show specific integration rules applied
-            if f"{variable}**" in clean_expr or f"{variable}^" in expression:
-                steps.append(f"         Using power rule: ∫{variable}^n d{variable} = {variable}^(n+1)/(n+1) + C")
-            elif f"sin({variable})" in clean_expr:
-                steps.append(f"         Using sin rule: ∫sin({variable}) d{variable} = -cos({variable}) + C")
-            elif f"cos({variable})" in clean_expr:
-                steps.append(f"         Using cos rule: ∫cos({variable}) d{variable} = sin({variable}) + C")
-            elif f"e**{variable}" in clean_expr or f"exp({variable})" in clean_expr:
-                steps.append(f"         Using exponential rule: ∫e^{variable} d{variable} = e^{variable} + C")
-            
-            steps.append(f"Step 3: Add the constant of integration")
-            formatted_integral = str(integral).replace('**', '^').replace('*', '·')
-            steps.append(f"         ∫{expression} d{variable} = {formatted_integral} + C")
-            steps.append(f"\nAnswer: ∫{expression} d{variable} = {formatted_integral} + C")
-                
-            return "\n".join(steps)
-        except Exception as e:
-            import traceback
-            traceback_str = traceback.format_exc()
-            return f"Error integrating expression: {str(e)}\n{traceback_str}"
+        return self._collect_steps('integrate_with_steps', expression, variable)
     
+    @symbolic_operation('limit')
     def calculate_limit(self, expression, variable='x', point='0'):
         """Calculate the limit of an expression as variable approaches point"""
-        try:
-            # Clean the expression (replace ^ with **)
-            clean_expr = expression.replace('^', '**')
-            
-            # Add multiplication operators where needed (e.g., 2x -> 2*x)
-            clean_expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', clean_expr)
-            
-            # Parse the expression and point
-            x = symbols(variable)
-            expr = parse_expr(clean_expr)
-            
-            # Handle infinity
-            if str(point).lower() in ['inf', 'infinity', '∞']:
-                point_eval = float('inf')
-            elif str(point).lower() in ['-inf', '-infinity', '-∞']:
-                point_eval = float('-inf')
-            else:
-                point_eval = float(point)
-            
-            # Calculate the limit
-            result = limit(expr, x, point_eval)
-            
-            # Generate explanation
-            explanation = [
-                f"Calculating limit of {expression} as {variable} approaches {point}:",
-                f"lim_{{{variable}→{point}}} {expression} = {str(result).replace('**', '^').replace('*', '·')}"
-            ]
-            
-            # Check for special cases
-            if result == float('inf') or result == float('-inf'):
-                explanation.append(f"The limit is {'positive' if result > 0 else 'negative'} infinity.")
-            
-            # Check for indeterminate forms
-            if str(result) == 'nan':
-                explanation.append("This appears to be an indeterminate form.")
-                
-                # Try using L'Hôpital's rule for 0/0 or ∞/∞ forms
-                if '/' in clean_expr:
-                    explanation.append("We can try using L'Hôpital's rule.")
-                    num, denom = clean_expr.split('/')
-                    num_expr = parse_expr(num)
-                    denom_expr = parse_expr(denom)
-                    
-                    # Check limits of numerator and denominator separately
-                    num_limit = limit(num_expr, x, point_eval)
-                    denom_limit = limit(denom_expr, x, point_eval)
-                    
-                    if (num_limit == 0 and denom_limit == 0) or \
-                       (abs(num_limit) == float('inf') and abs(denom_limit) == float('inf')):
-                        # Apply L'Hôpital's rule
-                        num_diff = diff(num_expr, x)
-                        denom_diff = diff(denom_expr, x)
-                        new_expr = num_diff / denom_diff
-                        new_result = limit(new_expr, x, point_eval)
-                        
-                        num_diff_str = str(num_diff).replace('**', '^').replace('*', '·')
-                        denom_diff_str = str(denom_diff).replace('**', '^').replace('*', '·')
-                        new_result_str = str(new_result).replace('**', '^').replace('*', '·')
-                        explanation.append(f"Applying L'Hôpital's rule:")
-                        explanation.append(f"lim_{{{variable}→{point}}} {num_diff_str}/{denom_diff_str} = {new_result_str}")
-                        result = new_result
-            
-            result_str = str(result).replace('**', '^').replace('*', '·')
-            explanation.append(f"\nAnswer: The limit equals {result_str}")
-            return "\n".join(explanation)
-        except Exception as e:
-            import traceback
-            traceback_str = traceback.format_exc()
-            return f"Error calculating limit: {str(e)}\n{traceback_str}"
+        return self._collect_steps('calculate_limit', expression, variable, point)
     
+    @symbolic_operation('factor')
     def factor_expression(self, expression):
         """Factor an algebraic expression with explanation"""
-        try:
-            # Clean the expression (replace ^ with **)
-            clean_expr = expression.replace('^', '**')
-            
-            # Add multiplication operators where needed (e.g., 2x -> 2*x)
-            clean_expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', clean_expr)
-            
-            # Parse the expression
-            expr = parse_expr(clean_expr)
-            
-            # Factor the expression
-            factored = factor(expr)
-            
-            # Generate explanation
-            explanation = [
-                f"Factoring the expression {expression}:",
-                f"Step 1: Identify common factors and factorizable patterns"
-            ]
-            
-            # Check if it's a quadratic and show the steps
-            if expr.is_polynomial() and expr.as_poly().degree() == 2:
-                explanation.append(f"Step 2: This is a quadratic expression. We can factor it using the quadratic formula or grouping.")
-            elif '*' in str(factored) and str(factored) != str(expr):
-                explanation.append(f"Step 2: Extract common factors and identify factorizable patterns")
-            else:
-                explanation.append(f"Step 2: Apply algebraic factoring techniques")
-                
-            explanation.append(f"Step 3: The factored form is:")
-            formatted_factored = str(factored).replace('**', '^').replace('*', '·')
-            explanation.append(f"{formatted_factored}")
-            
-            # If no factorization was possible
-            if str(factored) == str(expr):
-                explanation.append("\nThis expression is already in its simplest factored form.")
-            
-            explanation.append(f"\nAnswer: {expression} = {formatted_factored}")
-            return "\n".join(explanation)
-        except Exception as e:
-            import traceback
-            traceback_str = traceback.format_exc()
-            return f"Error factoring expression: {str(e)}\n{traceback_str}"
+        return self._collect_steps('factor_expression', expression)
     
+    @symbolic_operation('expand')
     def expand_expression(self, expression):
         """Expand an algebraic expression with explanation"""
+        return self._collect_steps('expand_expression', expression)
+    
+    def _step_error(self, method_name, error):
+        """Format the error message a step-by-step solver returns"""
+        import traceback
+        traceback_str = traceback.format_exc()
+        return f"{STEP_SOLVERS[method_name][2]}: {str(error)}\n{traceback_str}"
+
+    def _collect_steps(self, method_name, *args, **kwargs):
+        """Run a solver's step generator to the end and join its steps"""
+        steps = getattr(self, STEP_SOLVERS[method_name][1])
         try:
-            # Clean the expression (replace ^ with **)
-            clean_expr = expression.replace('^', '**')
-            
-            # Add multiplication operators where needed (e.g., 2x -> 2*x)
-            clean_expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', clean_expr)
-            
-            # Parse the expression
-            expr = parse_expr(clean_expr)
-            
-            # Expand the expression
-            expanded = expand(expr)
-            
-            # Generate explanation
-            explanation = [
-                f"Expanding the expression {expression}:",
-                f"Step 1: Apply the distributive property to remove parentheses"
-            ]
-            
-            if '**2' in str(expr) or '^2' in expression:
-                explanation.append(f"Step 2: Use the formula (a + b)² = a² + 2ab + b² or similar patterns")
-            elif '*' in str(expr):
-                explanation.append(f"Step 2: Multiply each term in the first parenthesis by each term in the second")
-            
-            explanation.append(f"Step 3: Combine like terms")
-            explanation.append(f"The expanded form is:")
-            formatted_expanded = str(expanded).replace('**', '^').replace('*', '·')
-            explanation.append(f"{formatted_expanded}")
-            
-            # If no expansion was possible
-            if str(expanded) == str(expr):
-                explanation.append("\nThis expression is already in its expanded form.")
-            
-            explanation.append(f"\nAnswer: {expression} = {formatted_expanded}")
-            return "\n".join(explanation)
+            return "\n".join(steps(*args, **kwargs))
         except Exception as e:
-            import traceback
-            traceback_str = traceback.format_exc()
-            return f"Error expanding expression: {str(e)}\n{traceback_str}"
-    
+            return self._step_error(method_name, e)
+
+    def iter_steps(self, method_name, *args, **kwargs):
+        """Yield the steps of a step-by-step solver as they are produced.
+
+        Joined with newlines the steps equal the solver's normal result. A
+        cached result comes back as a single step; if solving fails part
+        way, the last step is the error message.
+        """
+        operation, generator_name, _ = STEP_SOLVERS[method_name]
+        signature = inspect.signature(getattr(MathProcessor, method_name))
+        cache_key = self._result_cache_key(method_name, signature.bind(self, *args, **kwargs))
+        if cache_key is not None:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        if self.symbolic_pool is None:
+            steps = getattr(self, generator_name)(*args, **kwargs)
+        else:
+            steps = self.symbolic_pool.iter_run(operation, _iter_symbolic_job, method_name, args, kwargs)
+
+        produced = []
+        try:
+            for step in steps:
+                produced.append(step)
+                yield step
+        except SymbolicTimeoutError:
+            raise
+        except SymbolicWorkerError as e:
+            yield f"Error running {operation}: {str(e)}"
+            return
+        except Exception as e:
+            yield self._step_error(method_name, e)
+            return
+
+        # Workers report failures as a final error step; don't cache those
+        if cache_key is not None and produced and not produced[-1].startswith('Error'):
+            self.result_cache.put(cache_key, "\n".join(produced))
+
+    def _equation_steps(self, equation):
+        """Yield the steps of solve_equation_with_steps as they are worked out"""
+        # Split into sides, replace ^ with ** and add * where needed (2x -> 2*x)
+        left_str, right_str = _clean_equation(equation)
+        
+        print(f"Parsing equation: Left: '{left_str}', Right: '{right_str}'")
+        
+        # Convert to SymPy expressions
+        x = symbols('x')
+        
+        # Special handling for simple cases
+        if re.match(r'^x\*\*2\s*[\+\-]\s*\d+\s*\*\s*x\s*[\+\-]\s*\d+$', left_str) and right_str == '0':
+            # Directly extract coefficients for quadratic equation ax^2 + bx + c = 0
+            print("Detected standard form quadratic equation")
+            yield self._solve_quadratic_with_steps(left_str)
+            return
+            
+        left_expr = parse_expr(left_str)
+        right_expr = parse_expr(right_str)
+        
+        # Create the equation
+        eq = Eq(left_expr, right_expr)
+        
+        # Generate step-by-step explanation
+        display_left = _display(left_str)
+        display_right = _display(right_str)
+        yield f"Step 1: Start with the equation {display_left} = {display_right}"
+        
+        # Move all terms to left side
+        yield f"Step 2: Subtract {display_right} from both sides"
+        yield f"         {display_left} - {display_right} = 0"
+        
+        # Simplify
+        simplified = simplify(left_expr - right_expr)
+        simplified_str = str(simplified).replace('**', '^').replace('*', '·')
+        yield f"Step 3: Simplify the equation"
+        yield f"         {simplified_str} = 0"
+        
+        # Solve for x
+        solution = solve(eq, x)
+        if solution:
+            yield f"Step 4: Solve for x"
+            solution_str = str(solution).replace('**', '^').replace('*', '·')
+            yield f"         x = {solution_str}"
+            yield f"\nAnswer: x = {solution_str}"
+        else:
+            yield "\nNo solution found."
+
+
+    def _derivative_steps(self, expression, variable='x'):
+        """Yield the steps of differentiate_with_steps as they are worked out"""
+        # Clean the expression (replace ^ with ** and add * where needed, e.g. 2x -> 2*x);
+        # the steps show the cleaned form, which is what the result cache is keyed on
+        clean_expr = _clean_expression(expression)
+        expression = _display(clean_expr)
+        
+        # Parse the expression
+        x = symbols(variable)
+        expr = parse_expr(clean_expr)
+        
+        # Generate step-by-step explanation
+        yield f"Step 1: Start with the expression f({variable}) = {expression}"
+        yield f"Step 2: Apply differentiation rules"
+        
+        # If expression is a sum/difference, show term-by-term differentiation
+        terms = clean_expr.split('+')
+        if len(terms) > 1:
+            yield f"         We can differentiate each term separately:"
+            for i, term in enumerate(terms):
+                term = term.strip()
+                if '-' in term and term[0] != '-':
+                    # Handle subtraction within terms
+                    sub_terms = term.split('-')
+                    for j, sub_term in enumerate(sub_terms):
+                        if j == 0:
+                            result = diff(parse_expr(sub_term), x)
+                            display_term = sub_term.replace('**', '^').replace('*', '·')
+                            yield f"         d/d{variable}({display_term}) = {str(result).replace('**', '^').replace('*', '·')}"
+                        else:
+                            result = diff(-parse_expr(sub_term), x)
+                            display_term = sub_term.replace('**', '^').replace('*', '·')
+                            yield f"         d/d{variable}(-{display_term}) = {str(result).replace('**', '^').replace('*', '·')}"
+                else:
+                    result = diff(parse_expr(term), x)
+                    display_term = term.replace('**', '^').replace('*', '·')
+                    yield f"         d/d{variable}({display_term}) = {str(result).replace('**', '^').replace('*', '·')}"
+        
+        # Show product rule, quotient rule, chain rule application if relevant
+        if '*' in clean_expr and '/' not in clean_expr:
+            yield f"         Using the product rule: d/d{variable}(f·g) = f·(dg/d{variable}) + g·(df/d{variable})"
+        elif '/' in clean_expr:
+            yield f"         Using the quotient rule: d/d{variable}(f/g) = (g·(df/d{variable}) - f·(dg/d{variable}))/g²"
+        
+        # Compute the derivative
+        derivative = diff(expr, x)
+        
+        yield f"Step 3: Simplify the result"
+        formatted_derivative = str(derivative).replace('**', '^').replace('*', '·')
+        yield f"         d/d{variable}({expression}) = {formatted_derivative}"
+        yield f"\nAnswer: d/d{variable}({expression}) = {formatted_derivative}"
+
+
+    def _integral_steps(self, expression, variable='x'):
+        """Yield the steps of integrate_with_steps as they are worked out"""
+        # Clean the expression (replace ^ with ** and add * where needed, e.g. 2x -> 2*x);
+        # the steps show the cleaned form, which is what the result cache is keyed on
+        clean_expr = _clean_expression(expression)
+        expression = _display(clean_expr)
+        
+        # Parse the expression
+        x = symbols(variable)
+        expr = parse_expr(clean_expr)
+        
+        # Generate step-by-step explanation
+        yield f"Step 1: Start with the expression {expression}"
+        yield f"Step 2: Apply integration rules"
+        
+        # If expression is a sum/difference, show term-by-term integration
+        terms = clean_expr.split('+')
+        if len(terms) > 1:
+            yield f"         We can integrate each term separately:"
+            for i, term in enumerate(terms):
+                term = term.strip()
+                if '-' in term and term[0] != '-':
+                    # Handle subtraction within terms
+                    sub_terms = term.split('-')
+                    for j, sub_term in enumerate(sub_terms):
+                        if j == 0:
+                            result = integrate(parse_expr(sub_term), x)
+                            display_term = sub_term.replace('**', '^').replace('*', '·')
+                            yield f"         ∫{display_term} d{variable} = {str(result).replace('**', '^').replace('*', '·')}"
+                        else:
+                            result = integrate(-parse_expr(sub_term), x)
+                            display_term = sub_term.replace('**', '^').replace('*', '·')
+                            yield f"         ∫-{display_term} d{variable} = {str(result).replace('**', '^').replace('*', '·')}"
+                else:
+                    result = integrate(parse_expr(term), x)
+                    display_term = term.replace('**', '^').replace('*', '·')
+                    yield f"         ∫{display_term} d{variable} = {str(result).replace('**', '^').replace('*', '·')}"
+        
+        # Show specific integration rules applied
+        if f"{variable}**" in clean_expr:
+            yield f"         Using power rule: ∫{variable}^n d{variable} = {variable}^(n+1)/(n+1) + C"
+        elif f"sin({variable})" in clean_expr:
+            yield f"         Using sin rule: ∫sin({variable}) d{variable} = -cos({variable}) + C"
+        elif f"cos({variable})" in clean_expr:
+            yield f"         Using cos rule: ∫cos({variable}) d{variable} = sin({variable}) + C"
+        elif f"e**{variable}" in clean_expr or f"exp({variable})" in clean_expr:
+            yield f"         Using exponential rule: ∫e^{variable} d{variable} = e^{variable} + C"
+        
+        # Compute the integral
+        integral = integrate(expr, x)
+        
+        yield f"Step 3: Add the constant of integration"
+        formatted_integral = str(integral).replace('**', '^').replace('*', '·')
+        yield f"         ∫{expression} d{variable} = {formatted_integral} + C"
+        yield f"\nAnswer: ∫{expression} d{variable} = {formatted_integral} + C"
+
+
+    def _limit_steps(self, expression, variable='x', point='0'):
+        """Yield the explanation of calculate_limit as it is worked out"""
+        # Clean the expression (replace ^ with ** and add * where needed, e.g. 2x -> 2*x);
+        # the steps show the cleaned form, which is what the result cache is keyed on
+        clean_expr = _clean_expression(expression)
+        expression = _display(clean_expr)
+        
+        # Parse the expression and point
+        x = symbols(variable)
+        expr = parse_expr(clean_expr)
+        
+        # Handle infinity
+        if str(point).lower() in ['inf', 'infinity', '∞']:
+            point_eval = float('inf')
+        elif str(point).lower() in ['-inf', '-infinity', '-∞']:
+            point_eval = float('-inf')
+        else:
+            point_eval = float(point)
+        
+        # Generate explanation
+        yield f"Calculating limit of {expression} as {variable} approaches {point}:"
+        
+        # Calculate the limit
+        result = limit(expr, x, point_eval)
+        yield f"lim_{{{variable}→{point}}} {expression} = {str(result).replace('**', '^').replace('*', '·')}"
+        
+        # Check for special cases
+        if result == float('inf') or result == float('-inf'):
+            yield f"The limit is {'positive' if result > 0 else 'negative'} infinity."
+        
+        # Check for indeterminate forms
+        if str(result) == 'nan':
+            yield "This appears to be an indeterminate form."
+            
+            # Try using L'Hôpital's rule for 0/0 or ∞/∞ forms
+            if '/' in clean_expr:
+                yield "We can try using L'Hôpital's rule."
+                num, denom = clean_expr.split('/')
+                num_expr = parse_expr(num)
+                denom_expr = parse_expr(denom)
+                
+                # Check limits of numerator and denominator separately
+                num_limit = limit(num_expr, x, point_eval)
+                denom_limit = limit(denom_expr, x, point_eval)
+                
+                if (num_limit == 0 and denom_limit == 0) or \
+                   (abs(num_limit) == float('inf') and abs(denom_limit) == float('inf')):
+                    # Apply L'Hôpital's rule
+                    num_diff = diff(num_expr, x)
+                    denom_diff = diff(denom_expr, x)
+                    new_expr = num_diff / denom_diff
+                    new_result = limit(new_expr, x, point_eval)
+                    
+                    num_diff_str = str(num_diff).replace('**', '^').replace('*', '·')
+                    denom_diff_str = str(denom_diff).replace('**', '^').replace('*', '·')
+                    new_result_str = str(new_result).replace('**', '^').replace('*', '·')
+                    yield f"Applying L'Hôpital's rule:"
+                    yield f"lim_{{{variable}→{point}}} {num_diff_str}/{denom_diff_str} = {new_result_str}"
+                    result = new_result
+        
+        result_str = str(result).replace('**', '^').replace('*', '·')
+        yield f"\nAnswer: The limit equals {result_str}"
+
+
+    def _factor_steps(self, expression):
+        """Yield the explanation of factor_expression as it is worked out"""
+        # Clean the expression (replace ^ with ** and add * where needed, e.g. 2x -> 2*x);
+        # the steps show the cleaned form, which is what the result cache is keyed on
+        clean_expr = _clean_expression(expression)
+        expression = _display(clean_expr)
+        
+        # Parse the expression
+        expr = parse_expr(clean_expr)
+        
+        # Generate explanation
+        yield f"Factoring the expression {expression}:"
+        yield f"Step 1: Identify common factors and factorizable patterns"
+        
+        # Factor the expression
+        factored = factor(expr)
+        
+        # Check if it's a quadratic and show the steps
+        if expr.is_polynomial() and expr.as_poly().degree() == 2:
+            yield f"Step 2: This is a quadratic expression. We can factor it using the quadratic formula or grouping."
+        elif '*' in str(factored) and str(factored) != str(expr):
+            yield f"Step 2: Extract common factors and identify factorizable patterns"
+        else:
+            yield f"Step 2: Apply algebraic factoring techniques"
+            
+        yield f"Step 3: The factored form is:"
+        formatted_factored = str(factored).replace('**', '^').replace('*', '·')
+        yield f"{formatted_factored}"
+        
+        # If no factorization was possible
+        if str(factored) == str(expr):
+            yield "\nThis expression is already in its simplest factored form."
+        
+        yield f"\nAnswer: {expression} = {formatted_factored}"
+
+
+    def _expansion_steps(self, expression):
+        """Yield the explanation of expand_expression as it is worked out"""
+        # Clean the expression (replace ^ with ** and add * where needed, e.g. 2x -> 2*x);
+        # the steps show the cleaned form, which is what the result cache is keyed on
+        clean_expr = _clean_expression(expression)
+        expression = _display(clean_expr)
+        
+        # Parse the expression
+        expr = parse_expr(clean_expr)
+        
+        # Generate explanation
+        yield f"Expanding the expression {expression}:"
+        yield f"Step 1: Apply the distributive property to remove parentheses"
+        
+        # Expand the expression
+        expanded = expand(expr)
+        
+        if '**2' in str(expr) or '**2' in clean_expr:
+            yield f"Step 2: Use the formula (a + b)² = a² + 2ab + b² or similar patterns"
+        elif '*' in str(expr):
+            yield f"Step 2: Multiply each term in the first parenthesis by each term in the second"
+        
+        yield f"Step 3: Combine like terms"
+        yield f"The expanded form is:"
+        formatted_expanded = str(expanded).replace('**', '^').replace('*', '·')
+        yield f"{formatted_expanded}"
+        
+        # If no expansion was possible
+        if str(expanded) == str(expr):
+            yield "\nThis expression is already in its expanded form."
+        
+        yield f"\nAnswer: {expression} = {formatted_expanded}"
+
+    def _clean_numeric_expression(self, expression, variable):
+        """Clean a function definition like f(x) = x^3 - 2x, returning (expression, variable)"""
+        definition = re.match(r'^\s*[a-zA-Z]\w*\s*\(\s*([a-zA-Z])\s*\)\s*=\s*(.+)$', expression)
+        if definition:
+            variable, expression = definition.group(1), definition.group(2)
+
+        clean_expr = expression.strip().replace('^', '**')
+        clean_expr = re.sub(r'(\d)([a-zA-Z])', r'\1*\2', clean_expr)
+        return clean_expr, variable
+
+    def make_points(self, start, stop, step=None, num=None):
+        """Build an evenly spaced grid from start to stop (inclusive)"""
+        start, stop = float(start), float(stop)
+        if step is not None:
+            step = float(step)
+            if step <= 0:
+                raise ValueError("Step must be positive")
+            num = int(round(abs(stop - start) / step)) + 1
+        num = int(num or 1000)
+
+        if num < 1 or num > MAX_EVALUATION_POINTS:
+            raise ValueError(f"Number of points must be between 1 and {MAX_EVALUATION_POINTS}")
+        return np.linspace(start, stop, num)
+
+    def _prepare_numeric_uncached(self, clean_expr, variable, derivative):
+        if self.symbolic_pool is None:
+            return _prepare_numeric(clean_expr, variable, derivative)
+        return self.symbolic_pool.run('numeric', _prepare_numeric, clean_expr, variable, derivative)
+
+    def evaluate_over_points(self, expression, points, variable='x', derivative=0):
+        """Evaluate an expression (or its nth derivative) at many points in one
+        vectorized pass.
+
+        Returns a float64 array with NaN wherever the expression is undefined
+        or not real. Raises SymbolicTimeoutError if parsing the expression
+        overruns the symbolic pool's 'numeric' time budget.
+        """
+        clean_expr, variable = self._clean_numeric_expression(expression, variable)
+        func = _compile_numeric(self._prepare_numeric(clean_expr, variable, derivative), variable)
+
+        x = np.asarray(points, dtype=np.float64)
+        if x.size > MAX_EVALUATION_POINTS:
+            raise ValueError(f"At most {MAX_EVALUATION_POINTS} points can be evaluated at once")
+
+        with np.errstate(all='ignore'):
+            values = np.asarray(func(x))
+
+        # Constant expressions come back as a single value
+        if values.shape != x.shape:
+            values = np.broadcast_to(values, x.shape)
+        if np.iscomplexobj(values):
+            values = np.where(np.abs(values.imag) < 1e-12, values.real, np.nan)
+        return np.asarray(values, dtype=np.float64)
+
     def get_formula(self, category, formula_name):
         """Get a specific formula from the loaded formulas"""
         try:
@@ -477,146 +729,122 @@ class MathProcessor:
         except KeyError:
             return f"Category '{category}' not found in formulas."
     
+    def classify(self, problem_text):
+        """Parse a math problem: its type, expression, variable and limit point"""
+        return self.classifier.parse(problem_text)
+
     def identify_problem_type(self, problem_text):
         """Try to determine the type of math problem"""
-        problem_text = problem_text.lower()
-        
-        # Check for equations with explicit patterns first
-        quadratic_patterns = [
-            r'x\^2', r'x²', r'\dx\^2', r'\dx²',  # Finds x^2, x², 2x^2, etc.
-            r'quadratic equation', r'quadratic formula'
-        ]
-        
-        # Check for quadratic equation patterns
-        for pattern in quadratic_patterns:
-            if re.search(pattern, problem_text):
-                return 'quadratic_equation'
-        
-        # Check for other types of equations
-        if 'solve' in problem_text and ('equation' in problem_text or '=' in problem_text):
-            return 'equation'
-        elif 'derivative' in problem_text or 'differentiate' in problem_text:
-            return 'differentiation'
-        elif 'integrate' in problem_text or 'integral' in problem_text:
-            return 'integration'
-        elif 'limit' in problem_text:
-            return 'limit'
-        elif 'factor' in problem_text:
-            return 'factoring'
-        elif 'expand' in problem_text:
-            return 'expansion'
-        elif 'formula' in problem_text or 'formulas' in problem_text:
-            for category in self.formulas["formulas"]:
-                if category in problem_text:
-                    return f'formula_{category}'
-            return 'formula_general'
-        elif any(kw in problem_text for kw in ['calculate', 'compute', 'evaluate']):
-            return 'calculation'
-        # Check if the text contains an equation with x² or x^2
-        elif re.search(r'x\^2|x²', problem_text) and ('=' in problem_text):
-            return 'quadratic_equation'
-        else:
-            return 'general'
+        return self.classifier.parse(problem_text).problem_type
+    
+    def _solve_parsed(self, parsed):
+        """Run the solver for a parsed problem, or return None if it has none"""
+        call = parsed.solver_call()
+        if call is None:
+            return None
+        method, args, kwargs = call
+        return getattr(self, method)(*args, **kwargs)
     
     def process_image_text(self, text):
         """Process extracted text from an image to identify and solve math problems"""
         try:
             # Clean up the extracted text
             cleaned_text = text.strip().replace('\n', ' ')
-            
-            # Identify the problem type
-            problem_type = self.identify_problem_type(cleaned_text)
-            
-            # Extract the actual math expression or equation
-            expression = self._extract_math_expression(cleaned_text)
+            parsed = self.classify(cleaned_text)
             
             # Solve based on problem type
-            if problem_type == 'equation':
-                return self.solve_equation_with_steps(expression)
-            elif problem_type == 'differentiation':
-                # Extract variable if specified
-                var_match = re.search(r'with respect to ([a-z])', cleaned_text.lower())
-                variable = var_match.group(1) if var_match else 'x'
-                return self.differentiate_with_steps(expression, variable=variable)
-            elif problem_type == 'integration':
-                # Extract variable if specified
-                var_match = re.search(r'with respect to ([a-z])', cleaned_text.lower())
-                variable = var_match.group(1) if var_match else 'x'
-                return self.integrate_with_steps(expression, variable=variable)
-            elif problem_type == 'limit':
-                # Extract limit point and variable if specified
-                var_match = re.search(r'(?:as|when)\s+([a-z])\s+(?:approaches|→|goes to|tends to)\s+([\w\-\+\.∞]+)', cleaned_text.lower())
-                if var_match:
-                    variable = var_match.group(1)
-                    point = var_match.group(2)
-                else:
-                    variable = 'x'
-                    point_match = re.search(r'as\s+\w+\s+approaches\s+([\w\-\+\.∞]+)', cleaned_text.lower())
-                    point = point_match.group(1) if point_match else '0'
-                
-                return self.calculate_limit(expression, variable=variable, point=point)
-            elif problem_type == 'factoring':
-                return self.factor_expression(expression)
-            elif problem_type == 'expansion':
-                return self.expand_expression(expression)
-            else:
-                # Try to evaluate as a general expression
-                return self.evaluate_expression(expression)
+            solution = self._solve_parsed(parsed)
+            if solution is not None:
+                return solution
+            
+            # Try to evaluate as a general expression
+            return self.evaluate_expression(parsed.expression)
+        except SymbolicTimeoutError:
+            raise
         except Exception as e:
             return f"Error processing image text: {str(e)}"
-    
-    def _extract_math_expression(self, text):
-        """Extract the mathematical expression from text"""
-        # Look for common patterns in math problems
-        equation_patterns = [
-            r'(?:solve|find)?\s*(?:the)?\s*(?:equation)?\s*(.+?=.+?)(?:$|\.|\?)',  # Equations with =
-            r'(?:evaluate|calculate|compute|find|determine)\s*(?:the)?\s*(?:value of)?\s*(.+?)(?:$|\.|\?)',  # Expressions to evaluate
-            r'(?:differentiate|derivative of|integrate|integral of|limit of|factor|expand)\s*(.+?)(?:$|with respect to|\.|when|\?)',  # Calculus problems
-        ]
-        
-        for pattern in equation_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
-        
-        # If no pattern matches, return the cleaned text
-        return text.strip()
 
     def process_question(self, question):
         """Process a math question and return the result"""
         try:
-            # Identify the type of problem
-            problem_type = self.identify_problem_type(question)
-            
-            # Extract the mathematical expression
-            expression = self._extract_math_expression(question)
+            parsed = self.classify(question)
+            problem_type = parsed.problem_type
             
             # Process based on problem type
-            if problem_type == 'equation':
-                return self.solve_equation_with_steps(expression)
-            elif problem_type == 'differentiation':
-                return self.differentiate_with_steps(expression)
-            elif problem_type == 'integration':
-                return self.integrate_with_steps(expression)
-            elif problem_type == 'limit':
-                # Extract limit point if specified
-                match = re.search(r'as\s+\w+\s+approaches\s+([\w\-\+\.]+)', question.lower())
-                point = match.group(1) if match else '0'
-                return self.calculate_limit(expression, point=point)
-            elif problem_type == 'factoring':
-                return self.factor_expression(expression)
-            elif problem_type == 'expansion':
-                return self.expand_expression(expression)
+            solution = self._solve_parsed(parsed)
+            if solution is not None:
+                return solution
             elif problem_type.startswith('formula_'):
                 category = problem_type.split('_')[1]
                 return self.get_all_formulas_in_category(category)
             elif problem_type == 'calculation':
-                return self.evaluate_expression(expression)
+                return self.evaluate_expression(parsed.expression)
             else:
                 return "I'm not sure how to solve this problem. Could you please rephrase it?"
+        except SymbolicTimeoutError:
+            raise
         except Exception as e:
             return f"Error processing question: {str(e)}"
     
+    def _get_batch_executor(self):
+        """Get the thread pool that fans batch questions out to the solvers"""
+        with self._batch_lock:
+            if self._batch_executor is None or self._batch_executor_pid != os.getpid():
+                # Symbolic work runs in the worker pool, so keep enough threads to feed it
+                workers = self.symbolic_pool.size if self.symbolic_pool is not None else (os.cpu_count() or 2)
+                self._batch_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='mathly-batch')
+                self._batch_executor_pid = os.getpid()
+            return self._batch_executor
+
+    def _timed_question(self, question):
+        """Process one batch question, recording its status and timing"""
+        start = time.perf_counter()
+        try:
+            answer = self.process_question(question)
+            status = 'error' if isinstance(answer, str) and answer.startswith('Error') else 'ok'
+            outcome = {'status': status, 'answer': answer}
+        except SymbolicTimeoutError as e:
+            outcome = {'status': 'timeout', 'answer': None, 'error': str(e)}
+        except Exception as e:
+            outcome = {'status': 'error', 'answer': None, 'error': str(e)}
+        outcome['time_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return outcome
+
+    def iter_question_batch(self, questions):
+        """Solve a batch of questions concurrently, yielding each result as it completes.
+
+        Identical questions (ignoring whitespace) are solved once; the repeats
+        carry a duplicate_of field pointing at the first occurrence.
+        """
+        groups = {}
+        for index, question in enumerate(questions):
+            groups.setdefault(' '.join(question.split()), []).append(index)
+
+        executor = self._get_batch_executor()
+        futures = {executor.submit(self._timed_question, questions[indexes[0]]): indexes
+                   for indexes in groups.values()}
+        try:
+            for future in as_completed(futures):
+                indexes = futures[future]
+                outcome = future.result()
+                for position, index in enumerate(indexes):
+                    item = {'index': index, 'question': questions[index]}
+                    item.update(outcome)
+                    if position:
+                        item['duplicate_of'] = indexes[0]
+                    yield item
+        finally:
+            # The caller stopped early (e.g. the client disconnected)
+            for future in futures:
+                future.cancel()
+
+    def solve_batch(self, questions):
+        """Solve a batch of questions concurrently and return the results in input order"""
+        results = [None] * len(questions)
+        for item in self.iter_question_batch(questions):
+            results[item['index']] = item
+        return results
+
     def _solve_quadratic_with_steps(self, equation):
         """Solve a quadratic equation with step-by-step explanation"""
         try:
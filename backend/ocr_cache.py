@@ -0,0 +1,81 @@
+# Mathly - Cache of /api/image results, keyed on the hash of the uploaded image
+import os
+import tempfile
+from pathlib import Path
+
+from disk_cache import DiskCache, TieredJSONCache
+from result_cache import ResultCache
+
+# Bump when preprocessing or OCR changes in a way that changes the extracted text
+OCR_VERSION = 1
+
+
+class OCRResultCache(TieredJSONCache):
+    """Extracted text and answers of uploaded images, keyed on the SHA-256 of the image bytes.
+
+    Entries live in a memory-bounded LRU (ResultCache) in front of a
+    size-capped DiskCache that worker processes share and that survives
+    restarts. The key also covers the OCR settings, so changing them reads
+    images again. Each answer records the formula data version it was
+    computed with; once the formulas change, a hit only saves the OCR and
+    the answer is worked out again.
+    """
+
+    label = 'OCR result'
+
+    def __init__(self, memory=None, disk=None, ttl=7 * 86400, settings=()):
+        if memory is None:
+            memory = ResultCache(max_entries=1024, max_bytes=8 * 1024 * 1024, ttl=ttl)
+        super().__init__(memory, disk, ttl, metrics={'text_only_hits': 0, 'seconds_saved': 0.0})
+        self.settings = list(settings)
+
+    @classmethod
+    def from_env(cls, settings=()):
+        """Build a cache from MATHLY_OCR_CACHE_* environment variables.
+
+        Returns None when MATHLY_OCR_CACHE_ENTRIES is 0. An empty
+        MATHLY_OCR_CACHE_DIR keeps entries in memory only.
+        """
+        ttl = float(os.getenv('MATHLY_OCR_CACHE_TTL', str(7 * 86400)))
+        tiers = cls.tiers_from_env('MATHLY_OCR_CACHE', ttl, max_entries=1024, max_bytes=8 * 1024 * 1024,
+                                   disk_bytes=64 * 1024 * 1024,
+                                   default_dir=str(Path(tempfile.gettempdir()) / 'mathly_ocr'))
+        if tiers is None:
+            return None
+        return cls(memory=tiers[0], disk=tiers[1], ttl=ttl, settings=settings)
+
+    def key_for(self, sha256):
+        """Cache key of an image"""
+        return DiskCache.make_key('ocr', OCR_VERSION, self.settings, sha256)
+
+    def get(self, sha256, formula_version):
+        """Cached (text, answer) of an image, or None.
+
+        The answer is None when solving failed or used other formula data.
+        """
+        entry = self.get_entry(self.key_for(sha256))
+        if entry is None:
+            return None
+
+        if entry['response'] is None or entry['formula_version'] != formula_version:
+            self._record('text_only_hits')
+            return entry['text'], None
+        with self._lock:
+            self.metrics['hits'] += 1
+            self.metrics['seconds_saved'] += entry['seconds']
+        return entry['text'], entry['response']
+
+    def put(self, sha256, text, response, formula_version, seconds=0.0, ttl=None):
+        """Store the text read from an image and the answer given for it"""
+        self.put_entry(self.key_for(sha256), {
+            'text': text,
+            'response': response,
+            'formula_version': formula_version,
+            'seconds': round(seconds, 3)
+        }, ttl=ttl)
+
+    def stats(self):
+        """Cache usage and the processing time it saved"""
+        result = super().stats()
+        result['seconds_saved'] = round(result['seconds_saved'], 3)
+        return result
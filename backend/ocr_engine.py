@@ -0,0 +1,231 @@
+# Mathly - Pool of warm Tesseract engines with bounded concurrency
+import os
+import shlex
+import threading
+import time
+
+import numpy as np # type: ignore
+from PIL import Image # type: ignore
+
+try:
+    import tesserocr # type: ignore
+except ImportError:
+    tesserocr = None
+
+try:
+    import pytesseract # type: ignore
+except ImportError:
+    pytesseract = None
+
+# Characters that appear in typed or printed math problems; MATHLY_OCR_WHITELIST=math selects it
+MATH_WHITELIST = (
+    "0123456789"
+    "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    "+-*/=^()[]{}<>.,:;?!%|'√π×÷≤≥≠∞∫∑ "
+)
+
+
+class OCRBusyError(Exception):
+    """Raised when every engine is busy and the queue is full or the wait ran out"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _TesserocrEngine:
+    """A Tesseract instance loaded once, called through the C API"""
+
+    def __init__(self, lang, psm, whitelist, tessdata):
+        kwargs = {'lang': lang, 'psm': psm}
+        if tessdata:
+            kwargs['path'] = tessdata
+        self.api = tesserocr.PyTessBaseAPI(**kwargs)
+        if whitelist:
+            self.api.SetVariable('tessedit_char_whitelist', whitelist)
+
+    def recognize(self, image, dpi):
+        self.api.SetImage(image)
+        if dpi:
+            self.api.SetSourceResolution(dpi)
+        try:
+            return self.api.GetUTF8Text()
+        finally:
+            self.api.Clear()
+
+    def stop(self):
+        self.api.End()
+
+
+class _CommandEngine:
+    """The tesseract command through pytesseract: a new process for every image"""
+
+    def __init__(self, lang, psm, whitelist, tessdata):
+        self.lang = lang
+        config = [f'--psm {psm}']
+        if tessdata:
+            config.append(f'--tessdata-dir {shlex.quote(tessdata)}')
+        if whitelist:
+            config.append('-c ' + shlex.quote(f'tessedit_char_whitelist={whitelist}'))
+        self.config = ' '.join(config)
+
+    def recognize(self, image, dpi):
+        config = f'{self.config} --dpi {dpi}' if dpi else self.config
+        return pytesseract.image_to_string(image, lang=self.lang, config=config)
+
+    def stop(self):
+        pass
+
+
+class OCREnginePool:
+    """Keeps up to `engines` Tesseract engines loaded and hands them out one job at a time.
+
+    With tesserocr installed each engine is a Tesseract instance that keeps
+    its language model loaded between images; otherwise it falls back to
+    pytesseract, which starts the tesseract command for every image, and
+    the pool only bounds how many run at once. Engines are created lazily,
+    so creating a pool is cheap and safe to do at import time. Requests
+    beyond `engines` wait in a queue of at most `max_queue` for up to
+    `queue_timeout` seconds, after which OCRBusyError is raised.
+    """
+
+    def __init__(self, engines=None, max_queue=32, queue_timeout=10.0, psm=6, whitelist='',
+                 lang='eng', tessdata=None, backend=None):
+        self.size = max(1, engines or os.cpu_count() or 2)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.psm = psm
+        self.whitelist = MATH_WHITELIST if whitelist == 'math' else whitelist
+        self.lang = lang
+        self.tessdata = tessdata
+        if backend is None:
+            backend = 'tesserocr' if tesserocr is not None else 'pytesseract'
+        self.backend = backend
+        self._engine_class = _TesserocrEngine if backend == 'tesserocr' else _CommandEngine
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    @classmethod
+    def from_env(cls):
+        """Build a pool from MATHLY_OCR_* environment variables"""
+        engines = os.getenv('MATHLY_OCR_ENGINES')
+        return cls(
+            engines=int(engines) if engines else None,
+            max_queue=int(os.getenv('MATHLY_OCR_QUEUE', '32')),
+            queue_timeout=float(os.getenv('MATHLY_OCR_QUEUE_TIMEOUT', '10')),
+            psm=int(os.getenv('MATHLY_OCR_PSM', '6')),
+            whitelist=os.getenv('MATHLY_OCR_WHITELIST', ''),
+            lang=os.getenv('MATHLY_OCR_LANG', 'eng'),
+            tessdata=os.getenv('TESSDATA_PREFIX') or None,
+            backend=os.getenv('MATHLY_OCR_BACKEND') or None
+        )
+
+    def _reset(self):
+        """Forget all engines (used at start-up and after a fork)"""
+        self._pid = os.getpid()
+        self._available = threading.Condition(self._lock)
+        # Most recently used last, so the warmest engine is reused first
+        self._idle = []
+        self._live = 0
+        self._waiting = 0
+        self.stats = {'completed': 0, 'failed': 0, 'rejected': 0, 'timed_out': 0, 'engines_started': 0}
+
+    def _acquire(self):
+        """Get an idle engine, starting a new one if the pool is not full, else wait in the queue"""
+        deadline = None
+        with self._lock:
+            if self._pid != os.getpid():
+                # We were forked; the inherited engines belong to the parent
+                self._reset()
+            available = self._available
+            while not self._idle and self._live >= self.size:
+                if deadline is None:
+                    if self._waiting >= self.max_queue:
+                        self.stats['rejected'] += 1
+                        raise OCRBusyError("Too many images are being read right now. Please try again in a moment.")
+                    deadline = time.monotonic() + self.queue_timeout
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timed_out'] += 1
+                    raise OCRBusyError("Timed out waiting to read the image. Please try again in a moment.")
+                self._waiting += 1
+                try:
+                    available.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            if self._idle:
+                return self._idle.pop()
+            self._live += 1
+
+        try:
+            engine = self._engine_class(self.lang, self.psm, self.whitelist, self.tessdata)
+        except Exception:
+            with self._lock:
+                self._live -= 1
+                available.notify()
+            raise
+        with self._lock:
+            self.stats['engines_started'] += 1
+        return engine
+
+    def _release(self, engine):
+        with self._lock:
+            self.stats['completed'] += 1
+            if self._pid == os.getpid():
+                self._idle.append(engine)
+                self._available.notify()
+
+    def _discard(self, engine):
+        """Drop an engine whose job failed; the next request starts a fresh one"""
+        try:
+            engine.stop()
+        except Exception:
+            pass
+        with self._lock:
+            self.stats['failed'] += 1
+            if self._pid == os.getpid():
+                self._live -= 1
+                self._available.notify()
+
+    def recognize(self, image, dpi=None):
+        """Text in an image (PIL image or grayscale NumPy array).
+
+        dpi, when known, is passed to Tesseract as the source resolution.
+        Raises OCRBusyError when no engine frees up in time.
+        """
+        if isinstance(image, np.ndarray):
+            image = Image.fromarray(image)
+        engine = self._acquire()
+        try:
+            text = engine.recognize(image, dpi)
+        except Exception:
+            self._discard(engine)
+            raise
+        self._release(engine)
+        return text
+
+    def status(self):
+        """Engine counts, queue length and job counters"""
+        with self._lock:
+            result = {
+                'backend': self.backend,
+                'engines': self.size,
+                'live': self._live if self._pid == os.getpid() else 0,
+                'idle': len(self._idle) if self._pid == os.getpid() else 0,
+                'waiting': self._waiting if self._pid == os.getpid() else 0,
+                'psm': self.psm,
+                'whitelist': bool(self.whitelist),
+            }
+            result.update(self.stats)
+        return result
+
+    def shutdown(self):
+        """Stop all idle engines"""
+        if self._pid != os.getpid():
+            return
+        with self._lock:
+            engines, self._idle = self._idle, []
+            self._live -= len(engines)
+        for engine in engines:
+            engine.stop()
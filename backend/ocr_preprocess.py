@@ -0,0 +1,164 @@
+# Mathly - OCR preprocessing: reduced grayscale decode, text region crop, deskew, rescale
+import os
+from collections import namedtuple
+
+import cv2 # type: ignore
+import numpy as np # type: ignore
+from PIL import Image # type: ignore
+
+# The image handed to Tesseract and what was done to get it: the crop box
+# (left, top, right, bottom) in decoded pixels, the rotation in degrees and
+# the scale applied after cropping
+PreparedImage = namedtuple('PreparedImage', ['image', 'dpi', 'decoded_size', 'crop', 'angle', 'scale'])
+
+# Tesseract reads best when capital letters are about a tenth of an inch
+# tall at the resolution it is told, i.e. 30 pixels at 300 DPI
+CHAR_HEIGHT_PER_DPI = 0.1
+MAX_SCALE = 4.0
+MIN_SCALE = 0.25
+
+
+class OCRPreprocessor:
+    """Turns a photo of a math problem into a small, clean image for Tesseract.
+
+    The photo is decoded straight to grayscale at a reduced size (JPEG
+    draft mode decodes at 1/2, 1/4 or 1/8 scale without touching the full
+    resolution pixels). Character-sized blobs are found with an adaptive
+    threshold; the region holding them is cropped, straightened and scaled
+    so the characters come out at the height Tesseract expects for
+    target_dpi, then binarized.
+    """
+
+    def __init__(self, max_side=2000, target_dpi=300, max_skew=15.0):
+        self.max_side = max_side
+        self.target_dpi = target_dpi
+        self.max_skew = max_skew
+
+    @classmethod
+    def from_env(cls):
+        """Build a preprocessor from MATHLY_OCR_* environment variables"""
+        return cls(
+            max_side=int(os.getenv('MATHLY_OCR_MAX_SIDE', '2000')),
+            target_dpi=int(os.getenv('MATHLY_OCR_TARGET_DPI', '300')),
+            max_skew=float(os.getenv('MATHLY_OCR_MAX_SKEW', '15'))
+        )
+
+    def decode(self, image):
+        """Decode an opened (not yet loaded) image as grayscale, about max_side pixels long at most"""
+        width, height = image.size
+        factor = self.max_side / max(width, height)
+        if factor < 1:
+            # Only JPEG can decode smaller; other formats ignore this and are reduced below
+            image.draft('L', (int(width * factor), int(height * factor)))
+
+        if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+            # Transparent areas are paper, not ink
+            background = Image.new('RGBA', image.size, 'white')
+            background.alpha_composite(image.convert('RGBA'))
+            image = background
+        if image.mode != 'L':
+            image = image.convert('L')
+        # Draft decoding lands at or just above the requested size; that is close enough
+        if max(image.size) > self.max_side * 1.1:
+            image.thumbnail((self.max_side, self.max_side), reducing_gap=2.0)
+        return np.asarray(image)
+
+    @staticmethod
+    def find_characters(gray):
+        """Mask of the character-sized blobs and their median height, or (None, 0)"""
+        height, width = gray.shape
+        block = max(15, (min(height, width) // 30) | 1)
+        ink = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, block, 15)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        if count <= 1:
+            return None, 0
+
+        widths, heights, areas = stats[1:, cv2.CC_STAT_WIDTH], stats[1:, cv2.CC_STAT_HEIGHT], stats[1:, cv2.CC_STAT_AREA]
+        keep = ((heights >= max(4, height // 200)) & (heights <= height // 4) & (widths <= width // 3)
+                & (areas >= 8) & (areas <= 0.9 * widths * heights))
+        if not keep.any():
+            return None, 0
+        mask = np.isin(labels, np.flatnonzero(keep) + 1).astype(np.uint8) * 255
+        return mask, int(np.median(heights[keep]))
+
+    @staticmethod
+    def text_region(mask, char_height):
+        """Bounding box of the text blocks that hold most of the characters, or None"""
+        # Smear characters into words and lines, then keep the blocks with real text in them
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (char_height * 2 + 1, char_height // 2 + 1))
+        blocks = cv2.dilate(mask, kernel)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(blocks, connectivity=8)
+        ink = np.bincount(labels[mask > 0], minlength=count)[1:]
+        # Lines of text are wider than they are tall; paper edges and shadows are not
+        ink[stats[1:, cv2.CC_STAT_WIDTH] * 2 < stats[1:, cv2.CC_STAT_HEIGHT]] = 0
+        if not ink.any():
+            return None
+        kept = np.flatnonzero(ink >= 0.2 * ink.max())
+        left = stats[kept + 1, cv2.CC_STAT_LEFT]
+        top = stats[kept + 1, cv2.CC_STAT_TOP]
+        right = left + stats[kept + 1, cv2.CC_STAT_WIDTH]
+        bottom = top + stats[kept + 1, cv2.CC_STAT_HEIGHT]
+
+        height, width = mask.shape
+        margin = char_height
+        return (max(0, int(left.min()) - margin), max(0, int(top.min()) - margin),
+                min(width, int(right.max()) + margin), min(height, int(bottom.max()) + margin))
+
+    def skew_angle(self, mask):
+        """Rotation (degrees) that makes the text lines horizontal.
+
+        Tries angles up to max_skew and keeps the one whose row profile is
+        sharpest, i.e. where ink rows and gaps between lines separate best.
+        """
+        if not self.max_skew:
+            return 0.0
+        # A small copy is enough to find the angle
+        factor = min(1.0, 400 / max(mask.shape))
+        small = cv2.resize(mask, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA) if factor < 1 else mask
+        height, width = small.shape
+        center = (width / 2, height / 2)
+
+        def sharpness(angle):
+            rotation = cv2.getRotationMatrix2D(center, angle, 1.0)
+            rotated = cv2.warpAffine(small, rotation, (width, height), flags=cv2.INTER_NEAREST)
+            return float(np.var(rotated.sum(axis=1, dtype=np.float64)))
+
+        best = max(np.arange(-self.max_skew, self.max_skew + 0.01, 1.0), key=sharpness)
+        best = max(np.arange(best - 0.8, best + 0.81, 0.2), key=sharpness)
+        return round(float(best), 1) if abs(best) >= 0.3 else 0.0
+
+    def whole(self, gray):
+        """No recognizable text region: hand over the whole image, binarized"""
+        binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+        size = (gray.shape[1], gray.shape[0])
+        return PreparedImage(binary, self.target_dpi, size, (0, 0) + size, 0.0, 1.0)
+
+    def prepare(self, image):
+        """Preprocess an opened image for OCR"""
+        gray = self.decode(image)
+        decoded_size = (gray.shape[1], gray.shape[0])
+        mask, char_height = self.find_characters(gray)
+        if mask is None:
+            return self.whole(gray)
+
+        crop = self.text_region(mask, char_height)
+        if crop is None:
+            return self.whole(gray)
+        left, top, right, bottom = crop
+        region = gray[top:bottom, left:right]
+        angle = self.skew_angle(mask[top:bottom, left:right])
+        if angle:
+            height, width = region.shape
+            rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+            region = cv2.warpAffine(region, rotation, (width, height), flags=cv2.INTER_LINEAR,
+                                    borderMode=cv2.BORDER_REPLICATE)
+
+        scale = min(MAX_SCALE, max(MIN_SCALE, self.target_dpi * CHAR_HEIGHT_PER_DPI / char_height))
+        if abs(scale - 1) > 0.1:
+            region = cv2.resize(region, None, fx=scale, fy=scale,
+                                interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+        else:
+            scale = 1.0
+
+        binary = cv2.threshold(region, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1]
+        return PreparedImage(binary, self.target_dpi, decoded_size, crop, angle, round(scale, 3))
@@ -0,0 +1,145 @@
+# Mathly - Server-side function plots
+import io
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np # type: ignore
+from disk_cache import DiskCache
+
+# Bump when the drawing code changes so old images are not served
+RENDER_VERSION = 1
+
+PLOT_FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml'
+}
+
+
+class PlotRenderer:
+    """Render function plots off the request thread into a content-addressed cache.
+
+    Matplotlib is only imported by the first render, so it adds nothing to
+    worker start-up time. Concurrent requests for the same plot share a
+    single render.
+    """
+
+    def __init__(self, math_processor, cache=None, max_workers=2, num_points=1000, render_timeout=30):
+        self.math_processor = math_processor
+        self.cache = cache
+        self.max_workers = max_workers
+        self.num_points = num_points
+        self.render_timeout = render_timeout
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._in_flight = {}
+
+    @classmethod
+    def from_env(cls, math_processor):
+        """Build a renderer from MATHLY_PLOT_* environment variables"""
+        cache_dir = os.getenv('MATHLY_PLOT_CACHE_DIR', str(Path(tempfile.gettempdir()) / 'mathly_plots'))
+        cache_bytes = int(os.getenv('MATHLY_PLOT_CACHE_BYTES', str(256 * 1024 * 1024)))
+        workers = int(os.getenv('MATHLY_PLOT_WORKERS', '2'))
+        return cls(math_processor, cache=DiskCache(cache_dir, max_bytes=cache_bytes), max_workers=workers)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='mathly-plot')
+                self._executor_pid = os.getpid()
+                self._in_flight = {}
+            return self._executor
+
+    def render(self, expression, variable='x', x_min=-10.0, x_max=10.0, fmt='png',
+               show_derivative=True, show_roots=True):
+        """Render a plot and return (cache key, path of the image file)"""
+        if fmt not in PLOT_FORMATS:
+            raise ValueError(f"Unsupported plot format: {fmt}")
+        x_min, x_max = float(x_min), float(x_max)
+        if not x_min < x_max:
+            raise ValueError("x_min must be smaller than x_max")
+
+        clean_expr, variable = self.math_processor._clean_numeric_expression(expression, variable)
+        options = (clean_expr, variable, x_min, x_max, bool(show_derivative), bool(show_roots))
+        key = DiskCache.make_key('plot', RENDER_VERSION, fmt, *options)
+        suffix = '.' + fmt
+
+        path = self.cache.lookup(key, suffix)
+        if path is not None:
+            return key, path
+
+        # Share the render with any request already drawing the same plot
+        executor = self._get_executor()
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = executor.submit(self._render_to_cache, key, suffix, fmt, expression, *options[1:])
+                self._in_flight[key] = future
+                future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        return key, future.result(timeout=self.render_timeout)
+
+    def _render_to_cache(self, key, suffix, fmt, expression, variable, x_min, x_max, show_derivative, show_roots):
+        data = self.draw(expression, variable, x_min, x_max, fmt, show_derivative, show_roots)
+        return self.cache.put(key, data, suffix)
+
+    def draw(self, expression, variable='x', x_min=-10.0, x_max=10.0, fmt='png',
+             show_derivative=True, show_roots=True):
+        """Draw a plot and return the encoded image bytes"""
+        from matplotlib.figure import Figure # type: ignore
+
+        x = self.math_processor.make_points(x_min, x_max, num=self.num_points)
+        y = self.math_processor.evaluate_over_points(expression, x, variable=variable)
+
+        figure = Figure(figsize=(6.4, 4.8), dpi=100)
+        axes = figure.add_subplot()
+        axes.plot(x, y, color='#4a6cf7', linewidth=2, label=f"f({variable}) = {expression}")
+
+        if show_derivative:
+            dy = self.math_processor.evaluate_over_points(expression, x, variable=variable, derivative=1)
+            axes.plot(x, dy, color='#f7874a', linewidth=1.5, linestyle='--', label=f"f'({variable})")
+
+        if show_roots:
+            roots = find_roots(x, y)
+            if roots.size:
+                axes.scatter(roots, np.zeros_like(roots), color='#d62728', zorder=3, label='roots')
+
+        # Keep asymptotes from flattening the rest of the curve
+        finite = y[np.isfinite(y)]
+        if finite.size:
+            low, high = np.percentile(finite, [2, 98])
+            margin = (high - low) * 0.1 or 1.0
+            axes.set_ylim(low - margin, high + margin)
+
+        axes.axhline(0, color='#888888', linewidth=0.8)
+        axes.axvline(0, color='#888888', linewidth=0.8)
+        axes.set_xlim(x_min, x_max)
+        axes.set_xlabel(variable)
+        axes.grid(True, alpha=0.3)
+        axes.legend(loc='best')
+
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format=fmt, bbox_inches='tight')
+        return buffer.getvalue()
+
+
+def find_roots(x, y):
+    """Estimate where a sampled function crosses zero by linear interpolation"""
+    with np.errstate(all='ignore'):
+        y0, y1 = y[:-1], y[1:]
+        finite = np.isfinite(y0) & np.isfinite(y1)
+        crossing = finite & (np.sign(y0) != np.sign(y1))
+
+        # A sign change across a huge jump is a pole (like 1/x), not a root
+        spread = np.ptp(y[np.isfinite(y)]) if np.isfinite(y).any() else 0
+        crossing &= np.abs(y1 - y0) < max(spread * 0.25, 1e-12)
+
+        index = np.nonzero(crossing)[0]
+        exact = np.nonzero(y0[index] == 0)[0]
+        roots = x[index] - y0[index] * (x[index + 1] - x[index]) / (y1[index] - y0[index])
+        roots[exact] = x[index][exact]
+    return np.unique(np.round(roots, 10))
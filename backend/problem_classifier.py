@@ -0,0 +1,163 @@
+# Mathly - Single-pass classification of math problems
+import re
+from collections import namedtuple
+
+# Step-by-step solver of each problem type on MathProcessor
+SOLVER_METHODS = {
+    'quadratic_equation': 'solve_equation_with_steps',
+    'equation': 'solve_equation_with_steps',
+    'differentiation': 'differentiate_with_steps',
+    'integration': 'integrate_with_steps',
+    'limit': 'calculate_limit',
+    'factoring': 'factor_expression',
+    'expansion': 'expand_expression'
+}
+
+# Words that introduce the expression of each problem type
+LEAD_WORDS = {
+    'equation': ('solve',),
+    'differentiation': ('differentiate', 'derivative'),
+    'integration': ('integrate', 'integral'),
+    'limit': ('limit',),
+    'factoring': ('factor', 'factorize'),
+    'expansion': ('expand', 'distribute'),
+    'calculation': ('calculate', 'compute', 'evaluate')
+}
+
+# Cues that end the expression of each problem type
+END_CUES = {
+    'equation': 'condition',
+    'differentiation': 'respect',
+    'integration': 'respect',
+    'limit': 'approach'
+}
+
+# Filler between a lead word and the expression: "solve for x in", "derivative of the function"
+_FILLER_PATTERN = re.compile(
+    r'\s*(?:(?:the|of|for\s+[a-z]\s+in|quadratic|equation|expression|function|value\s+of)\s+)*', re.IGNORECASE)
+
+
+class ParsedProblem(namedtuple('ParsedProblem', ['problem_type', 'expression', 'variable', 'point', 'cues', 'text'])):
+    """What a piece of text asks for.
+
+    problem_type is one of the identify_problem_type types, expression the
+    part to hand to the solver, variable and point the differentiation or
+    limit variable and limit point, and cues the set of keywords found.
+    """
+    __slots__ = ()
+
+    def solver_call(self):
+        """(method name, args, kwargs) of the MathProcessor solver for the problem, or None"""
+        method = SOLVER_METHODS.get(self.problem_type)
+        if method is None:
+            return None
+        if self.problem_type in ('differentiation', 'integration'):
+            return method, (self.expression,), {'variable': self.variable}
+        if self.problem_type == 'limit':
+            return method, (self.expression,), {'variable': self.variable, 'point': self.point}
+        return method, (self.expression,), {}
+
+
+class ProblemClassifier:
+    """Classify a math problem and extract its parts in one regex pass.
+
+    Every cue the classification needs (keywords, x^2, '=', "with respect
+    to x", "as x approaches 0", formula categories) is one alternative of
+    a single precompiled pattern, so the text is scanned once and the
+    expression is sliced out of the original text at the cue positions.
+    """
+
+    def __init__(self, categories=()):
+        self.categories = tuple(categories)
+        category_pattern = '|'.join(re.escape(category) for category in self.categories) or r'(?!)'
+        self.pattern = re.compile(rf'''
+            (?P<respect>with\s+respect\s+to\s+(?P<respect_var>[a-z]))
+          | (?P<approach>\b(?:as|when)\s+(?P<limit_var>[a-z]\w*)\s+(?:approaches|→|goes\s+to|tends\s+to)\s+(?P<limit_point>[\w\-\+\.∞]+))
+          | (?P<phrase>quadratic\s+(?:equation|formula))
+          | (?P<square>x\^2|x²)
+          | (?P<arithmetic>\d[\+\-\*\/\^\(\)]\d)
+          | (?P<condition>\s(?:for|where)\b)
+          | (?P<word>\b(?P<word_name>solve|equation|derivative|differentiate|integrate|integral|limit|factorize
+                    |factor|expand|distribute|formula|calculate|compute|evaluate|quadratic)s?\b)
+          | (?P<category>{category_pattern})
+          | (?P<equals>=)
+        ''', re.IGNORECASE | re.VERBOSE)
+
+    def parse(self, text):
+        """Classify the text, returning a ParsedProblem"""
+        cues = set()
+        positions = {}  # cue name -> its matches, in order
+        variable = 'x'
+        point = '0'
+        categories = set()
+
+        for match in self.pattern.finditer(text):
+            kind = match.lastgroup
+            if kind == 'word':
+                # Whole words only ("factorial" is not "factor"), plurals folded into the singular
+                name = match.group('word_name').lower()
+            elif kind == 'phrase':
+                cues.update(match.group().lower().split())
+                name = 'quadratic_phrase'
+            elif kind == 'category':
+                categories.add(match.group().lower())
+                continue
+            else:
+                name = kind
+            positions.setdefault(name, []).append(match)
+            if name not in cues:
+                cues.add(name)
+                if kind == 'respect':
+                    variable = match.group('respect_var').lower()
+                elif kind == 'approach':
+                    if len(match.group('limit_var')) == 1:
+                        variable = match.group('limit_var').lower()
+                    point = match.group('limit_point').lower()
+
+        problem_type = self._problem_type(cues, categories)
+        expression = self._expression(text, problem_type, positions)
+        return ParsedProblem(problem_type, expression, variable, point, frozenset(cues), text)
+
+    def _problem_type(self, cues, categories):
+        if 'quadratic_phrase' in cues:
+            return 'quadratic_equation'
+        if 'solve' in cues and ('equation' in cues or 'equals' in cues):
+            return 'quadratic_equation' if 'square' in cues else 'equation'
+        if 'derivative' in cues or 'differentiate' in cues:
+            return 'differentiation'
+        if 'integrate' in cues or 'integral' in cues:
+            return 'integration'
+        if 'limit' in cues:
+            return 'limit'
+        if 'factor' in cues or 'factorize' in cues:
+            return 'factoring'
+        if 'expand' in cues:
+            return 'expansion'
+        if 'square' in cues:
+            return 'quadratic_equation'
+        if 'formula' in cues:
+            for category in self.categories:
+                if category in categories:
+                    return f'formula_{category}'
+            return 'formula_general'
+        if 'calculate' in cues or 'compute' in cues or 'evaluate' in cues:
+            return 'calculation'
+        return 'general'
+
+    def _expression(self, text, problem_type, positions):
+        """Slice the expression out of the text: from after the lead word to the end cue"""
+        kind = 'equation' if problem_type == 'quadratic_equation' else problem_type
+        leads = [positions[word][0] for word in LEAD_WORDS.get(kind, ()) if word in positions]
+        if not leads:
+            return text.strip()
+
+        start = min(lead.end() for lead in leads)
+        start = _FILLER_PATTERN.match(text, start).end()
+        end = len(text)
+        for end_cue in positions.get(END_CUES.get(kind), ()):
+            if end_cue.start() >= start:
+                end = end_cue.start()
+                break
+
+        expression = text[start:end].strip().rstrip('?.').strip()
+        return expression or text.strip()
@@ -0,0 +1,136 @@
+# Mathly - In-memory result cache with LRU and TTL eviction
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Thread-safe LRU cache with per-entry expiry and a size cap in bytes.
+
+    Entries are evicted least-recently-used first whenever either the entry
+    count or the estimated total size goes over its limit.
+    """
+
+    def __init__(self, max_entries=4096, max_bytes=32 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (value, size in bytes, expiry time)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls, prefix, **defaults):
+        """Build a cache from <prefix>_ENTRIES, <prefix>_BYTES and <prefix>_TTL.
+
+        Returns None when <prefix>_ENTRIES is 0, which disables caching.
+        """
+        settings = {
+            'max_entries': ('ENTRIES', int),
+            'max_bytes': ('BYTES', int),
+            'ttl': ('TTL', float),
+        }
+        kwargs = dict(defaults)
+        for name, (suffix, cast) in settings.items():
+            value = os.getenv(f'{prefix}_{suffix}')
+            if value:
+                kwargs[name] = cast(value)
+
+        if kwargs.get('max_entries') == 0:
+            return None
+        return cls(**kwargs)
+
+    @staticmethod
+    def _estimate_size(key, value):
+        """Rough size of an entry in bytes"""
+        size = len(repr(key))
+        if isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        elif isinstance(value, str):
+            size += len(value.encode('utf-8'))
+        elif isinstance(value, int):
+            # repr() of a huge int is slow and fails past sys.get_int_max_str_digits()
+            size += value.bit_length() // 8 + 1
+        else:
+            size += len(repr(value))
+        return size
+
+    def get(self, key, default=None):
+        """Look up a key, returning default on a miss or an expired entry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        """Store a value, evicting old entries to stay within the limits.
+
+        Values that can't be sized are not stored.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            size = self._estimate_size(key, value)
+        except ValueError:
+            return
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, old_size, _) = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
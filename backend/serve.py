@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Mathly - Production server
+Runs the Flask app under gunicorn: the models are loaded once in the master
+process and shared copy-on-write by the forked workers. With --asgi the
+workers run uvicorn and answer /api/chat with the async pipeline (asgi.py)
+"""
+import argparse
+import gc
+import os
+import sys
+
+try:
+    from gunicorn.app.base import BaseApplication # type: ignore
+except ImportError:
+    BaseApplication = None
+
+try:
+    import waitress # type: ignore
+except ImportError:
+    waitress = None
+
+
+def server_options(bind=None, workers=None, threads=None, asgi=False):
+    """Server settings from MATHLY_* environment variables, overridden by the arguments"""
+    return {
+        'asgi': asgi or os.getenv('MATHLY_ASGI', '0') == '1',
+        'bind': bind or os.getenv('MATHLY_BIND', '0.0.0.0:5000'),
+        'workers': workers or int(os.getenv('MATHLY_WORKERS', str(2 * (os.cpu_count() or 1) + 1))),
+        'threads': threads or int(os.getenv('MATHLY_THREADS', '4')),
+        'keepalive': int(os.getenv('MATHLY_KEEPALIVE', '5')),
+        'max_requests': int(os.getenv('MATHLY_MAX_REQUESTS', '1000')),
+        'max_requests_jitter': int(os.getenv('MATHLY_MAX_REQUESTS_JITTER', '100')),
+        'timeout': int(os.getenv('MATHLY_WORKER_TIMEOUT', '120')),
+    }
+
+
+def warm_up(asgi=False):
+    """Import the app and load everything workers would otherwise load on their first request"""
+    import app as mathly
+    if asgi:
+        import asgi as mathly_asgi # noqa: F401
+
+    # Formula data and its indexes, the classifier and the compiled expression patterns
+    mathly.math_ai.formula_registry.current()
+    mathly.math_processor.classify("what is the formula for the area of a circle")
+    mathly.math_processor.evaluate_expression("1 + 1")
+    # Move everything loaded so far out of the garbage collector's reach, so
+    # collections in the workers don't touch (and copy) the shared pages
+    gc.collect()
+    gc.freeze()
+    return mathly
+
+
+def _worker_exit(server, worker):
+    """Stop the worker's SymPy processes and Tesseract engines when gunicorn recycles it"""
+    mathly = sys.modules.get('app')
+    if mathly is None:
+        return
+    if mathly.math_processor.symbolic_pool is not None:
+        mathly.math_processor.symbolic_pool.shutdown()
+    mathly.ocr_pool.shutdown()
+
+
+if BaseApplication is not None:
+    class MathlyServer(BaseApplication):
+        """gunicorn application that preloads the Mathly app before forking its workers"""
+
+        def __init__(self, options):
+            self.options = dict(options)
+            self.asgi = self.options.pop('asgi')
+            super().__init__()
+
+        def load_config(self):
+            for name, value in self.options.items():
+                self.cfg.set(name, value)
+            self.cfg.set('preload_app', True)
+            # gthread keeps a worker responsive while some of its requests wait on an LLM;
+            # uvicorn workers wait on them in the event loop instead
+            self.cfg.set('worker_class', 'uvicorn.workers.UvicornWorker' if self.asgi else 'gthread')
+            self.cfg.set('worker_exit', _worker_exit)
+
+        def load(self):
+            mathly = warm_up(self.asgi)
+            return sys.modules['asgi'].application if self.asgi else mathly.app
+
+
+def serve(options):
+    """Run the app with the best server available"""
+    if BaseApplication is not None:
+        if options['asgi']:
+            print(f"Mathly ASGI server on {options['bind']}: {options['workers']} workers")
+        else:
+            print(f"Mathly server on {options['bind']}: {options['workers']} workers x {options['threads']} threads")
+        MathlyServer(options).run()
+        return
+
+    mathly = warm_up(options['asgi'])
+    host, _, port = options['bind'].rpartition(':')
+    if options['asgi']:
+        import uvicorn # type: ignore
+        print(f"gunicorn not installed, serving with a single uvicorn process on {options['bind']}")
+        uvicorn.run(sys.modules['asgi'].application, host=host or '0.0.0.0', port=int(port),
+                    timeout_keep_alive=options['keepalive'])
+        return
+    if waitress is not None:
+        # No fork on this platform (e.g. Windows): one process with a thread per connection
+        print(f"gunicorn not installed, serving with waitress on {options['bind']}")
+        waitress.serve(mathly.app, host=host or '0.0.0.0', port=int(port),
+                       threads=options['workers'] * options['threads'])
+        return
+
+    print("gunicorn not installed, falling back to the development server")
+    mathly.app.run(host=host or '0.0.0.0', port=int(port), threaded=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mathly production server')
+    parser.add_argument('--bind', type=str, help='Address to listen on (host:port)')
+    parser.add_argument('--port', type=int, help='Port to listen on, on all interfaces')
+    parser.add_argument('--workers', type=int, help='Worker processes')
+    parser.add_argument('--threads', type=int, help='Threads per worker')
+    parser.add_argument('--asgi', action='store_true', help='Serve /api/chat with the async pipeline (uvicorn workers)')
+    parser.add_argument('--formula-file', type=str, help='Override formula file path')
+    args = parser.parse_args()
+
+    if args.formula_file:
+        os.environ['MATHLY_FORMULA_FILE'] = args.formula_file
+    bind = args.bind or (f'0.0.0.0:{args.port}' if args.port else None)
+    serve(server_options(bind, args.workers, args.threads, args.asgi))
+
+
+if __name__ == '__main__':
+    main()
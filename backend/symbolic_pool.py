@@ -0,0 +1,289 @@
+# Mathly - Supervised process pool for SymPy work
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+# Default time budget (seconds) for each kind of symbolic job
+DEFAULT_TIMEOUTS = {
+    'solve': 10.0,
+    'differentiate': 5.0,
+    'integrate': 15.0,
+    'limit': 10.0,
+    'factor': 5.0,
+    'expand': 5.0,
+    'numeric': 5.0,
+}
+DEFAULT_TIMEOUT = 10.0
+
+
+class SymbolicTimeoutError(Exception):
+    """Raised when a symbolic job does not finish within its time budget"""
+
+    def __init__(self, operation, time_limit):
+        super().__init__(f"The {operation} operation timed out after {time_limit:g} seconds")
+        self.operation = operation
+        self.time_limit = time_limit
+
+    def to_dict(self):
+        """Structured description of the timeout for API responses"""
+        return {
+            'error': str(self),
+            'timed_out': True,
+            'operation': self.operation,
+            'time_limit': self.time_limit
+        }
+
+
+class SymbolicWorkerError(Exception):
+    """Raised when a worker crashes or a job fails inside a worker"""
+
+
+def _worker_main(conn):
+    """Worker loop: run jobs received over the pipe until told to stop"""
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+
+        func, args, kwargs, stream = job
+        try:
+            if stream:
+                # Send each item as soon as the generator produces it
+                for item in func(*args, **kwargs):
+                    conn.send(('item', item))
+                reply = ('ok', None)
+            else:
+                reply = ('ok', func(*args, **kwargs))
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+
+class _Worker:
+    """A single worker process and the parent end of its pipe"""
+
+    def __init__(self, context):
+        parent_conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.jobs_run = 0
+
+    def stop(self):
+        """Ask the worker to exit, killing it if it does not"""
+        try:
+            self.conn.send(None)
+        except (OSError, EOFError, BrokenPipeError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self):
+        """Kill the worker process immediately"""
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class SymbolicWorkerPool:
+    """Process pool that runs symbolic jobs under a hard per-operation deadline.
+
+    Workers are started lazily, so creating a pool is cheap and safe to do at
+    import time. A job that overruns its deadline has its worker killed and a
+    fresh worker takes its place on the next request.
+    """
+
+    def __init__(self, workers=None, timeouts=None, max_jobs_per_worker=500, start_method=None):
+        self.size = max(1, workers or os.cpu_count() or 2)
+        self.timeouts = dict(DEFAULT_TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self.max_jobs_per_worker = max_jobs_per_worker
+
+        if start_method is None:
+            methods = multiprocessing.get_all_start_methods()
+            start_method = 'fork' if 'fork' in methods else 'spawn'
+        self._context = multiprocessing.get_context(start_method)
+
+        self._lock = threading.Lock()
+        self._reset()
+
+    @classmethod
+    def from_env(cls):
+        """Build a pool from MATHLY_SYMPY_* environment variables.
+
+        MATHLY_SYMPY_WORKERS=0 disables the pool, in which case None is returned
+        and symbolic work runs in the calling thread.
+        """
+        workers_env = os.getenv('MATHLY_SYMPY_WORKERS')
+        if workers_env == '0':
+            return None
+        workers = int(workers_env) if workers_env else None
+
+        timeouts = {}
+        default_timeout = os.getenv('MATHLY_SYMPY_TIMEOUT')
+        for operation in DEFAULT_TIMEOUTS:
+            value = os.getenv(f'MATHLY_{operation.upper()}_TIMEOUT', default_timeout)
+            if value:
+                timeouts[operation] = float(value)
+
+        max_jobs = int(os.getenv('MATHLY_SYMPY_MAX_JOBS', '500'))
+        return cls(workers=workers, timeouts=timeouts, max_jobs_per_worker=max_jobs)
+
+    def _reset(self):
+        """Forget all workers (used at start-up and after a fork)"""
+        self._pid = os.getpid()
+        self._idle = queue.Queue()
+        self._live = 0
+        self.stats = {'completed': 0, 'timed_out': 0, 'crashed': 0, 'recycled': 0, 'abandoned': 0}
+
+    def timeout_for(self, operation):
+        """Get the time budget for an operation"""
+        return self.timeouts.get(operation, DEFAULT_TIMEOUT)
+
+    def _acquire(self, operation, time_limit, deadline):
+        """Get an idle worker, starting a new one if the pool is not full"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # We were forked; the inherited workers belong to the parent
+                self._reset()
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._live < self.size:
+                self._live += 1
+                try:
+                    return _Worker(self._context)
+                except Exception:
+                    self._live -= 1
+                    raise
+
+        try:
+            return self._idle.get(timeout=max(0, deadline - time.monotonic()))
+        except queue.Empty:
+            with self._lock:
+                self.stats['timed_out'] += 1
+            raise SymbolicTimeoutError(operation, time_limit)
+
+    def _release(self, worker):
+        """Return a healthy worker to the pool, recycling it if it is worn out"""
+        if worker.jobs_run >= self.max_jobs_per_worker:
+            worker.stop()
+            with self._lock:
+                self._live -= 1
+                self.stats['recycled'] += 1
+        else:
+            self._idle.put(worker)
+
+    def _discard(self, worker, reason):
+        """Kill a worker that timed out or crashed"""
+        worker.kill()
+        with self._lock:
+            self._live -= 1
+            self.stats[reason] += 1
+
+    def run(self, operation, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in a worker and return its result.
+
+        func must be picklable (a module-level function). Raises
+        SymbolicTimeoutError if the job overruns the operation's deadline.
+        """
+        time_limit = self.timeout_for(operation)
+        deadline = time.monotonic() + time_limit
+        worker = self._acquire(operation, time_limit, deadline)
+
+        try:
+            worker.conn.send((func, args, kwargs, False))
+            finished = worker.conn.poll(max(0, deadline - time.monotonic()))
+        except (OSError, EOFError) as e:
+            self._discard(worker, 'crashed')
+            raise SymbolicWorkerError(f"The {operation} worker failed: {e}")
+
+        if not finished:
+            self._discard(worker, 'timed_out')
+            raise SymbolicTimeoutError(operation, time_limit)
+
+        try:
+            status, payload = worker.conn.recv()
+        except (OSError, EOFError):
+            self._discard(worker, 'crashed')
+            raise SymbolicWorkerError(f"The {operation} worker exited unexpectedly")
+
+        worker.jobs_run += 1
+        with self._lock:
+            self.stats['completed'] += 1
+        self._release(worker)
+
+        if status == 'error':
+            raise SymbolicWorkerError(payload)
+        return payload
+
+    def iter_run(self, operation, func, *args, **kwargs):
+        """Run a generator function in a worker, yielding its items as they arrive.
+
+        The whole stream shares the operation's deadline. If the caller stops
+        iterating early the worker is killed, since it may still be busy.
+        """
+        time_limit = self.timeout_for(operation)
+        deadline = time.monotonic() + time_limit
+        worker = self._acquire(operation, time_limit, deadline)
+
+        status = 'item'  # until the worker reports that the job is over
+        try:
+            try:
+                worker.conn.send((func, args, kwargs, True))
+            except (OSError, EOFError) as e:
+                status = None
+                self._discard(worker, 'crashed')
+                raise SymbolicWorkerError(f"The {operation} worker failed: {e}")
+
+            while True:
+                try:
+                    finished = worker.conn.poll(max(0, deadline - time.monotonic()))
+                    if finished:
+                        status, payload = worker.conn.recv()
+                except (OSError, EOFError):
+                    status = None
+                    self._discard(worker, 'crashed')
+                    raise SymbolicWorkerError(f"The {operation} worker exited unexpectedly")
+
+                if not finished:
+                    status = None
+                    self._discard(worker, 'timed_out')
+                    raise SymbolicTimeoutError(operation, time_limit)
+                if status != 'item':
+                    break
+                yield payload
+        finally:
+            if status == 'item':
+                # The caller stopped listening while the worker was still producing
+                self._discard(worker, 'abandoned')
+
+        worker.jobs_run += 1
+        with self._lock:
+            self.stats['completed'] += 1
+        self._release(worker)
+
+        if status == 'error':
+            raise SymbolicWorkerError(payload)
+
+    def shutdown(self):
+        """Stop all idle workers"""
+        if self._pid != os.getpid():
+            return
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+            with self._lock:
+                self._live -= 1
@@ -0,0 +1,33 @@
+# Tests for problem_classifier: run with `python -m pytest` from backend/
+from problem_classifier import ProblemClassifier
+
+classifier = ProblemClassifier(['geometry'])
+
+
+def test_factorial_is_not_factoring():
+    parsed = classifier.parse('factorial(1500)+1')
+    assert parsed.problem_type != 'factoring'
+    assert parsed.expression == 'factorial(1500)+1'
+
+
+def test_factor_lead_word_is_removed():
+    parsed = classifier.parse('Factor x^2 - 9x + 20')
+    assert parsed.problem_type == 'factoring'
+    assert parsed.expression == 'x^2 - 9x + 20'
+
+
+def test_expansion_is_not_expand():
+    parsed = classifier.parse('expansion of (x+1)^2')
+    assert parsed.problem_type != 'expansion'
+    assert parsed.expression == 'expansion of (x+1)^2'
+
+
+def test_expand_lead_word_is_removed():
+    parsed = classifier.parse('expand (x+1)^2')
+    assert parsed.problem_type == 'expansion'
+    assert parsed.expression == '(x+1)^2'
+
+
+def test_plural_lead_words():
+    assert classifier.parse('derivatives of x^3').problem_type == 'differentiation'
+    assert classifier.parse('geometry formulas').problem_type == 'formula_geometry'
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+"""
+Mathly - Benchmark for MathProcessor.evaluate_expression
+Compares the compiled expression evaluator with the old eval() path
+"""
+import math
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from math_processor import MathProcessor
+
+EXPRESSIONS = [
+    "2 + 3 * 4",
+    "5 * (3 + 2) / 4",
+    "sqrt(16) + math.pi * 2",
+    "sin(pi / 6) ** 2 + cos(pi / 6) ** 2",
+    "max(3, 7, 2) - min(4, 1) + sum([1, 2, 3, 4])",
+]
+
+
+def legacy_evaluate(expression, safe_functions):
+    """The eval() based implementation that evaluate_expression used to have"""
+    if any(keyword in expression for keyword in ['import', 'exec', 'eval', 'compile', 'open', '__']):
+        raise ValueError("Potentially unsafe expression")
+    return eval(expression, {"__builtins__": {}}, safe_functions)
+
+
+def main():
+    processor = MathProcessor()
+    compiler = processor.expression_compiler
+    number = 20000
+
+    print(f"{'expression':45} {'eval()':>10} {'compiled':>10} {'speedup':>8}")
+    for expression in EXPRESSIONS:
+        assert math.isclose(legacy_evaluate(expression, processor.safe_functions), compiler.evaluate(expression))
+
+        legacy = timeit.timeit(lambda: legacy_evaluate(expression, processor.safe_functions), number=number)
+        compiled = timeit.timeit(lambda: compiler.evaluate(expression), number=number)
+        print(f"{expression:45} {legacy / number * 1e6:8.2f}us {compiled / number * 1e6:8.2f}us {legacy / compiled:7.1f}x")
+
+    # Cold path: every expression is new, so nothing comes from the compile cache
+    cold = [f"{i} * 3 + sqrt({i})" for i in range(number)]
+    compiler.compile.cache_clear()
+    legacy = timeit.timeit(lambda: [legacy_evaluate(e, processor.safe_functions) for e in cold], number=1)
+    compiled = timeit.timeit(lambda: [compiler.evaluate(e) for e in cold], number=1)
+    print(f"{'cold (unique expressions)':45} {legacy / number * 1e6:8.2f}us {compiled / number * 1e6:8.2f}us {legacy / compiled:7.1f}x")
+
+    # Hostile input is rejected up front instead of hanging the worker
+    hostile = "9**9**9"
+    seconds = timeit.timeit(lambda: processor.evaluate_expression(hostile), number=100) / 100
+    print(f"\n{hostile!r} rejected in {seconds * 1e6:.1f}us: {processor.evaluate_expression(hostile)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Mathly - Memory benchmark for the shared formula registry
+Measures the resident size a worker spends on formula data when
+MathProcessor and MathAIModel each load their own formula file (before)
+and when they share one registry (after). Every case runs in a fresh
+process.
+"""
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+DATA_DIR = Path(__file__).parent.parent / 'data'
+
+
+def resident_bytes():
+    """Resident set size of this process"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure(case):
+    """Load the formula data the way one worker does and report what it cost"""
+    # Import everything first, so only the data itself is measured
+    import math_processor
+    import ai_model_new
+    from problem_classifier import ProblemClassifier
+
+    rss = resident_bytes()
+    tracemalloc.start()
+
+    processor = math_processor.MathProcessor()
+    model = ai_model_new.MathAIModel(str(DATA_DIR / 'expanded_formulas.json'))
+    processor.classify("what is the formula for geometry")
+    keep = [processor, model]
+    if case == 'before':
+        # What MathProcessor held on its own: math_formulas.json and a classifier over it
+        with open(DATA_DIR / 'math_formulas.json') as f:
+            formulas = json.load(f)
+        keep.append((formulas, ProblemClassifier(formulas['formulas'])))
+    else:
+        assert processor.formula_registry is model.formula_registry
+
+    heap = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return {'rss': resident_bytes() - rss, 'heap': heap}
+
+
+def main():
+    if len(sys.argv) == 2:
+        print(json.dumps(measure(sys.argv[1])))
+        return
+
+    print(f"{'':10} {'rss':>10} {'heap':>10}")
+    env = dict(os.environ, MATHLY_FORMULA_WATCH_INTERVAL='0')
+    for case in ('before', 'after'):
+        runs = []
+        for _ in range(3):
+            output = subprocess.run([sys.executable, __file__, case], env=env, capture_output=True, text=True,
+                                    check=True).stdout
+            runs.append(json.loads(output.strip().splitlines()[-1]))
+        rss = sorted(run['rss'] for run in runs)[1]
+        heap = sorted(run['heap'] for run in runs)[1]
+        print(f"{case:10} {rss / 1024:8.0f}KB {heap / 1024:8.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
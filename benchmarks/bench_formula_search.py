@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+"""
+Mathly - Benchmark for formula search
+Builds a synthetic formula database of about 50k formulas around the real
+one and times ranked, prefix and typo-tolerant queries against it
+"""
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from formula_store import FormulaStore, tokenize
+from formula_search import FormulaSearchEngine
+
+DATA_FILE = Path(__file__).parent.parent / 'data' / 'expanded_formulas.json'
+
+QUERIES = [
+    "pythagorean theorem",
+    "area circle",
+    "kinetic energy",
+    "law of sines",
+    "pytha",
+    "pythagorus",
+    "derivatve of sine",
+    "newton second law",
+]
+
+
+def synthetic_formulas(formulas, target, rng):
+    """The real formulas plus generated topics made of the real vocabulary"""
+    words = sorted({token for entry in FormulaStore(formulas).entries for name in entry.path for token in tokenize(name)})
+    symbols = ['x', 'y', 'a', 'b', 'θ', 'π', 'r²', '√n', 'sin(x)', 'e^x', 'Σ', '∫']
+    data = json.loads(json.dumps(formulas))
+    categories = list(data['formulas'])
+    count = len(FormulaStore(data))
+    while count < target:
+        category = data['formulas'][rng.choice(categories)]
+        topic = {}
+        for _ in range(rng.randint(3, 12)):
+            name = '_'.join(rng.sample(words, rng.randint(1, 3)))
+            topic[name] = f"{rng.choice(symbols)} = " + ' + '.join(rng.sample(symbols, 3))
+        category['_'.join(rng.sample(words, 2)) + f"_{count}"] = topic
+        count += len(topic)
+    return data
+
+
+def main():
+    rng = random.Random(0)
+    with open(DATA_FILE) as f:
+        formulas = json.load(f)
+
+    for target in (0, 5000, 50000):
+        data = synthetic_formulas(formulas, target, rng)
+        build = timeit.default_timer()
+        store = FormulaStore(data)
+        engine = FormulaSearchEngine(store)
+        build = timeit.default_timer() - build
+        print(f"\n{len(store)} formulas, {engine.stats()['terms']} terms (built in {build:.2f}s)")
+
+        number = 200
+        for query in QUERIES:
+            total, results = engine.search(query, per_page=10)
+            seconds = timeit.timeit(lambda: engine.search(query, per_page=10), number=number) / number
+            best = results[0][0].display[:50] if results else '-'
+            print(f"  {query!r:24} {seconds * 1e3:7.3f}ms {total:6} hits  {best}")
+
+        seconds = timeit.timeit(lambda: engine.trie.complete('pyth', 10), number=10000) / 10000
+        print(f"  {'complete(pyth)':24} {seconds * 1e3:7.4f}ms")
+
+
+if __name__ == "__main__":
+    main()
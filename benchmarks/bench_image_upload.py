@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Mathly - Benchmark for /api/image uploads
+Compares the peak Python memory and time of decoding a phone-sized photo
+sent as base64 JSON (the old way) and as a raw or multipart body spooled
+chunk by chunk and then decoded
+"""
+import base64
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from flask import Flask, request # type: ignore
+from PIL import Image # type: ignore
+
+from image_upload import read_upload
+
+app = Flask(__name__)
+
+
+def phone_photo(width=4032, height=3024):
+    """A noisy 12 megapixel JPEG, about the size a phone camera produces"""
+    image = Image.effect_noise((width // 4, height // 4), 40).resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def old_decode():
+    """What /api/image did before: parse the JSON, b64decode, then Image.open on a copy"""
+    image_data = request.json['image'].split(',')[1]
+    image = Image.open(io.BytesIO(base64.b64decode(image_data)))
+    image.load()
+    return image
+
+
+def new_decode():
+    image = read_upload(request, max_bytes=64 * 1024 * 1024).image
+    image.load()
+    return image
+
+
+def measure(decode, **request_args):
+    with app.test_request_context('/api/image', method='POST', **request_args):
+        tracemalloc.start()
+        start = time.perf_counter()
+        image = decode()
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return image.size, peak, seconds
+
+
+def main():
+    photo = phone_photo()
+    data_url = 'data:image/jpeg;base64,' + base64.b64encode(photo).decode('ascii')
+    print(f"{len(photo) / 1e6:.1f}MB JPEG, {len(data_url) / 1e6:.1f}MB as a data URL")
+
+    cases = [
+        ('base64 JSON (old)', old_decode, {'data': json.dumps({'image': data_url}), 'content_type': 'application/json'}),
+        ('base64 JSON (new)', new_decode, {'data': json.dumps({'image': data_url}), 'content_type': 'application/json'}),
+        ('multipart', new_decode, {'data': {'image': (io.BytesIO(photo), 'photo.jpg')}, 'content_type': 'multipart/form-data'}),
+        ('raw body', new_decode, {'data': photo, 'content_type': 'image/jpeg'}),
+    ]
+    print(f"  {'':20} {'peak heap':>10} {'time':>9}")
+    for name, decode, request_args in cases:
+        size, peak, seconds = measure(decode, **request_args)
+        print(f"  {name:20} {peak / 1e6:8.1f}MB {seconds * 1e3:7.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
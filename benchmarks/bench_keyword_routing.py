@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+"""
+Mathly - Benchmark for keyword routing
+Compares one substring scan per keyword with the compiled KeywordMatcher
+as the number of keywords grows
+"""
+import random
+import string
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+from ai_model_new import MathAIModel
+from keyword_matcher import KeywordMatcher
+
+QUERIES = [
+    "what is the formula for the area of a circle",
+    "how do i differentiate x^2 sin(x) using the product rule",
+    "explain the law of cosines for a triangle with sides 3, 4 and 5",
+    "what is the standard deviation of a normal distribution with variance 4",
+    "can you give me the kinematic equations for constant acceleration",
+]
+
+
+def make_keywords(count, rng):
+    """Realistic-looking keywords: one to three lowercase words"""
+    keywords = set()
+    while len(keywords) < count:
+        words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+                 for _ in range(rng.randint(1, 3))]
+        keywords.add(' '.join(words))
+    return sorted(keywords)
+
+
+def substring_scan(keywords, text):
+    """What the routing used to do: one `keyword in text` test per keyword"""
+    return {keyword for keyword in keywords if keyword in text}
+
+
+def main():
+    rng = random.Random(0)
+    number = 200
+
+    print(f"{'keywords':>8} {'states':>8} {'build':>9} {'scan':>10} {'matcher':>10} {'speedup':>8}")
+    for count in (50, 200, 1000, 5000):
+        keywords = make_keywords(count, rng) + ['formula', 'area', 'circle', 'triangle', 'acceleration']
+        build = timeit.timeit(lambda: KeywordMatcher(keywords), number=1)
+        matcher = KeywordMatcher(keywords)
+
+        for query in QUERIES:
+            assert substring_scan(keywords, query) == set(matcher.find(query))
+
+        scan = timeit.timeit(lambda: [substring_scan(keywords, q) for q in QUERIES], number=number)
+        compiled = timeit.timeit(lambda: [matcher.find(q) for q in QUERIES], number=number)
+        per_query = number * len(QUERIES)
+        print(f"{len(keywords):8} {matcher.state_count:8} {build * 1e3:7.1f}ms "
+              f"{scan / per_query * 1e6:8.2f}us {compiled / per_query * 1e6:8.2f}us {scan / compiled:7.1f}x")
+
+    # End to end: basic (offline) routing of the model itself
+    model = MathAIModel(str(Path(__file__).parent.parent / 'data' / 'math_formulas.json'))
+    model.use_advanced_ai = False
+    print(f"\nMathAIModel vocabulary: {len(model.keyword_matcher.keywords)} keywords, "
+          f"{model.keyword_matcher.state_count} states")
+    seconds = timeit.timeit(lambda: [model.process_query(q) for q in QUERIES], number=number)
+    print(f"process_query (basic routing): {seconds / (number * len(QUERIES)) * 1e6:.1f}us per query")
+
+
+if __name__ == "__main__":
+    main()
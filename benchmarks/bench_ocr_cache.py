@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""
+Mathly - Benchmark for the /api/image result cache
+Uploads the same photos through the Flask app three times: the first
+upload reads and solves them, the second is answered from memory and the
+third from disk (the memory front is cleared first, as in a new worker).
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_ocr_preprocess import synthetic_corpus
+
+
+def upload_all(client, photos):
+    times = []
+    for photo in photos:
+        start = time.perf_counter()
+        response = client.post('/api/image', data=photo, content_type='image/jpeg')
+        times.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise SystemExit(f"/api/image failed: {response.json}")
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the /api/image result cache')
+    parser.add_argument('--images', type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ.setdefault('MATHLY_OCR_CACHE_DIR', tempfile.mkdtemp(prefix='mathly_ocr_bench_'))
+    import app as mathly
+
+    photos = [data for _, data, _ in synthetic_corpus(args.images, seed=5)]
+    client = mathly.app.test_client()
+    print(f"{len(photos)} photos, cache in {os.environ['MATHLY_OCR_CACHE_DIR']}")
+    print(f"  first upload          {upload_all(client, photos) * 1e3:7.1f}ms (median)")
+    print(f"  again (memory)        {upload_all(client, photos) * 1e3:7.1f}ms (median)")
+    mathly.ocr_cache.clear()
+    print(f"  again (disk)          {upload_all(client, photos) * 1e3:7.1f}ms (median)")
+    print(f"  cache: {mathly.ocr_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
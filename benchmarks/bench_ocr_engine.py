@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Mathly - Benchmark for the OCR engine pool
+Reads the same preprocessed problem images with a new engine for every
+image (what starting the tesseract command per request costs: process start
+and language model load) and with a pool of warm engines, first one image
+at a time and then with concurrent requests queueing for the engines.
+"""
+import argparse
+import io
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from PIL import Image # type: ignore
+
+from bench_ocr_preprocess import synthetic_corpus
+from ocr_engine import OCREnginePool, OCRBusyError
+from ocr_preprocess import OCRPreprocessor
+
+
+def sequential(recognize, images):
+    times = []
+    for image, dpi in images:
+        start = time.perf_counter()
+        recognize(image, dpi)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def concurrent(pool, images, clients, rounds):
+    """Every client reads `rounds` images at once; returns throughput and the busy rejections"""
+    rejected = []
+
+    def client(number):
+        for round_number in range(rounds):
+            image, dpi = images[(number + round_number) % len(images)]
+            try:
+                pool.recognize(image, dpi)
+            except OCRBusyError:
+                rejected.append(number)
+
+    threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    return (clients * rounds - len(rejected)) / seconds, len(rejected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the OCR engine pool')
+    parser.add_argument('--images', type=int, default=12)
+    parser.add_argument('--engines', type=int, help='Engines in the pool (default MATHLY_OCR_ENGINES or the CPU count)')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent requests')
+    parser.add_argument('--rounds', type=int, default=4, help='Images read by each concurrent request')
+    args = parser.parse_args()
+
+    preprocessor = OCRPreprocessor.from_env()
+    images = []
+    for _, data, _ in synthetic_corpus(args.images, seed=3):
+        prepared = preprocessor.prepare(Image.open(io.BytesIO(data)))
+        images.append((prepared.image, prepared.dpi))
+
+    pool = OCREnginePool.from_env()
+    if args.engines:
+        pool.size = args.engines
+    print(f"{len(images)} images, {pool.backend} backend, {pool.size} engines, psm {pool.psm}")
+
+    def fresh(image, dpi):
+        # A pool of its own for every image, so every image starts an engine
+        single = OCREnginePool.from_env()
+        try:
+            return single.recognize(image, dpi)
+        finally:
+            single.shutdown()
+
+    pool.recognize(*images[0])
+    print(f"  new engine per image  {sequential(fresh, images) * 1e3:6.0f}ms per image (median)")
+    print(f"  warm pool             {sequential(pool.recognize, images) * 1e3:6.0f}ms per image (median)")
+
+    throughput, rejected = concurrent(pool, images, args.clients, args.rounds)
+    print(f"  {args.clients} concurrent clients {throughput:6.1f} images/s, {rejected} turned away as busy")
+    print(f"  pool: {pool.status()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""
+Mathly - Benchmark for the OCR preprocessing of /api/image
+Compares the old preprocessing (full resolution RGB -> BGR copy -> grayscale
+-> Otsu over the whole photo) with OCRPreprocessor (draft decode, text
+region crop, deskew, rescale) on a corpus of problem photos: preprocessing
+and OCR latency, and how close the recognized text is to the truth.
+
+The corpus is either a directory of photos, each with a .txt file of the
+same name holding its text (--corpus), or synthetic phone photos of
+rendered problems: shaded paper, a dark desk edge, a random tilt, noise and
+JPEG compression.
+"""
+import argparse
+import difflib
+import io
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / 'backend'))
+
+import cv2 # type: ignore
+import numpy as np # type: ignore
+from PIL import Image, ImageDraw, ImageFilter, ImageFont # type: ignore
+
+from ocr_engine import OCREnginePool
+from ocr_preprocess import OCRPreprocessor
+
+PROBLEMS = [
+    "Solve for x: 3x + 7 = 22",
+    "Find the derivative of x^2 + 5x - 3",
+    "What is 144 divided by 12?",
+    "Simplify (x + 2)(x - 2)",
+    "Calculate the area of a circle with radius 7",
+    "Solve 2x - 5 = 3x + 4",
+    "Evaluate 15% of 240",
+    "Factor x^2 - 9x + 20",
+    "If y = 4x - 1, find y when x = 6",
+    "What is the square root of 169?",
+    "Solve the system: x + y = 10, x - y = 4",
+    "Find the slope between (2, 3) and (6, 11)",
+]
+
+
+def font_path():
+    """A TrueType font that ships with matplotlib, so the corpus looks the same everywhere"""
+    import matplotlib # type: ignore
+    return os.path.join(os.path.dirname(matplotlib.__file__), 'mpl-data', 'fonts', 'ttf', 'DejaVuSans.ttf')
+
+
+def wrap(text, width=24):
+    lines, line = [], ''
+    for word in text.split():
+        if line and len(line) + len(word) + 1 > width:
+            lines.append(line)
+            line = word
+        else:
+            line = f'{line} {word}'.strip()
+    return lines + [line]
+
+
+def synthetic_photo(text, rng, size=(4032, 3024)):
+    """A JPEG that looks like a phone photo of the problem written on a sheet of paper"""
+    width, height = size
+    # Paper lit from one side
+    shade = np.linspace(rng.uniform(170, 200), rng.uniform(225, 245), width, dtype=np.float32)
+    paper = np.tile(shade, (height, 1))
+    # The desk showing along one edge
+    desk = rng.randint(height // 12, height // 6)
+    paper[height - desk:] = rng.uniform(40, 80)
+    image = Image.fromarray(paper.astype(np.uint8))
+
+    font = ImageFont.truetype(font_path(), rng.randint(70, 120))
+    lines = wrap(text)
+    draw = ImageDraw.Draw(image)
+    line_height = int(font.size * 1.5)
+    left = rng.randint(width // 10, width // 4)
+    top = rng.randint(height // 8, height // 3)
+    for number, line in enumerate(lines):
+        draw.text((left, top + number * line_height), line, fill=rng.randint(10, 50), font=font)
+
+    image = image.rotate(rng.uniform(-8, 8), resample=Image.BICUBIC, fillcolor=200)
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.8, 1.6)))
+    pixels = np.asarray(image, dtype=np.float32) + np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, 6, (height, width))
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=88)
+    return buffer.getvalue()
+
+
+def load_corpus(directory):
+    samples = []
+    for path in sorted(Path(directory).iterdir()):
+        truth = path.with_suffix('.txt')
+        if path.suffix.lower() in ('.jpg', '.jpeg', '.png', '.webp') and truth.exists():
+            samples.append((path.name, path.read_bytes(), truth.read_text().strip()))
+    return samples
+
+
+def synthetic_corpus(count, seed):
+    rng = random.Random(seed)
+    return [(f'synthetic-{number}', synthetic_photo(PROBLEMS[number % len(PROBLEMS)], rng), PROBLEMS[number % len(PROBLEMS)])
+            for number in range(count)]
+
+
+def old_preprocess(data):
+    """What /api/image did before OCRPreprocessor"""
+    image = Image.open(io.BytesIO(data))
+    open_cv_image = np.array(image.convert('RGB'))
+    open_cv_image = open_cv_image[:, :, ::-1].copy()
+    gray = cv2.cvtColor(open_cv_image, cv2.COLOR_BGR2GRAY)
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)[1], None
+
+
+def new_preprocess(data, preprocessor):
+    prepared = preprocessor.prepare(Image.open(io.BytesIO(data)))
+    return prepared.image, prepared.dpi
+
+
+def ocr_engine():
+    """The app's OCR engine pool, or None when neither tesserocr nor the tesseract command works"""
+    pool = OCREnginePool.from_env()
+    try:
+        pool.recognize(np.full((32, 32), 255, dtype=np.uint8))
+    except Exception:
+        return None, None
+    return pool.backend, pool.recognize
+
+
+def similarity(text, truth):
+    normalize = lambda value: re.sub(r'\s+', ' ', value).strip().lower()
+    return difflib.SequenceMatcher(None, normalize(text), normalize(truth)).ratio()
+
+
+def run(name, preprocess, samples, recognize):
+    prep_times, ocr_times, scores = [], [], []
+    for _, data, truth in samples:
+        start = time.perf_counter()
+        image, dpi = preprocess(data)
+        prep_times.append(time.perf_counter() - start)
+        if recognize is not None:
+            start = time.perf_counter()
+            text = recognize(image, dpi)
+            ocr_times.append(time.perf_counter() - start)
+            scores.append(similarity(text, truth))
+
+    line = f"  {name:6} preprocess {statistics.median(prep_times) * 1e3:6.0f}ms"
+    if recognize is not None:
+        exact = sum(score >= 0.98 for score in scores)
+        line += (f"   OCR {statistics.median(ocr_times) * 1e3:6.0f}ms"
+                 f"   total {statistics.median(np.add(prep_times, ocr_times)) * 1e3:6.0f}ms"
+                 f"   accuracy {statistics.mean(scores):.3f} ({exact}/{len(scores)} exact)")
+    print(line + "   (medians)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the /api/image OCR preprocessing')
+    parser.add_argument('--corpus', type=str, help='Directory of photos with a .txt file of the same name holding the text')
+    parser.add_argument('--count', type=int, default=24, help='Synthetic photos to generate without --corpus')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    samples = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.count, args.seed)
+    engine, recognize = ocr_engine()
+    print(f"{len(samples)} photos, OCR with {engine or 'nothing (tesseract not installed, timing preprocessing only)'}")
+
+    preprocessor = OCRPreprocessor.from_env()
+    run('old', old_preprocess, samples, recognize)
+    run('new', lambda data: new_preprocess(data, preprocessor), samples, recognize)
+
+
+if __name__ == "__main__":
+    main()
@@ -47,7 +47,12 @@ document.addEventListener('DOMContentLoaded', function() {
         messageDiv.appendChild(contentDiv);
         chatMessages.appendChild(messageDiv);
         
-        // Process MathJax rendering
+        typesetMessage(contentDiv, processedMessage);
+        return contentDiv;
+    }
+    
+    // Function to render the math in a message
+    function typesetMessage(contentDiv, processedMessage) {
         if (window.MathJax) {
             try {
                 console.log("Typesetting MathJax content");
@@ -66,6 +71,80 @@ document.addEventListener('DOMContentLoaded', function() {
         chatMessages.scrollTop = chatMessages.scrollHeight;
     }
     
+    // Function to stream an answer sent as server-sent events, showing the
+    // text as it arrives instead of waiting for the whole response
+    async function streamMessage(url, payload) {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream'
+            },
+            body: JSON.stringify(payload)
+        });
+        
+        if (!response.ok || !response.body) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let contentDiv = null;
+        
+        function appendText(chunk) {
+            if (!contentDiv) {
+                // The first chunk replaces the loading indicator
+                hideLoading();
+                contentDiv = addMessage('');
+            }
+            text += chunk;
+            contentDiv.innerHTML = `<p>${text}</p>`;
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        }
+        
+        function handleEvent(rawEvent) {
+            let event = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    event = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            const eventData = data ? JSON.parse(data) : {};
+            
+            if (event === 'delta') {
+                appendText(eventData.text);
+            } else if (event === 'error') {
+                console.error("Server reported error:", eventData.error);
+                const errorText = eventData.response || `Sorry, I encountered an error: ${eventData.error}`;
+                appendText(text ? `\n\n${errorText}` : errorText);
+            }
+        }
+        
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                handleEvent(buffer.slice(0, boundary));
+                buffer = buffer.slice(boundary + 2);
+            }
+        }
+        
+        hideLoading();
+        if (contentDiv) {
+            typesetMessage(contentDiv, text);
+        } else {
+            addMessage("Sorry, I received a response but couldn't understand it. Please try again.");
+        }
+    }
+    
     // Function to show loading indicator
     function showLoading() {
         const loadingDiv = document.createElement('div');
@@ -107,6 +186,8 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Clear input field
         userInput.value = '';
+        clearTimeout(suggestTimer);
+        showSuggestions([]);
         
         // Show loading indicator
         showLoading();
@@ -115,32 +196,47 @@ document.addEventListener('DOMContentLoaded', function() {
             // Define base URL with the correct port
             const baseUrl = 'http://localhost:5001';
             let endpoint = '/api/chat';
-            let payload = {};
+            let request;
             
             if (isImage) {
+                // The photo goes up as the raw request body, not as base64 inside JSON
                 endpoint = '/api/image';
-                payload = { image: message };
+                request = {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': message.type || 'image/jpeg'
+                    },
+                    body: message
+                };
+                console.log(`Sending request to ${baseUrl}${endpoint}: ${message.size} byte image`);
             } else {
-                payload = { input: message };
+                const payload = { input: message };
+                console.log(`Sending request to ${baseUrl}${endpoint}:`, payload);
+                
+                // Chat answers are streamed when the browser can read response bodies incrementally
+                if (window.ReadableStream && window.TextDecoder) {
+                    await streamMessage(`${baseUrl}/api/chat/stream`, payload);
+                    return;
+                }
+                request = {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json'
+                    },
+                    body: JSON.stringify(payload)
+                };
             }
             
-            console.log(`Sending request to ${baseUrl}${endpoint}:`, payload);
-            
-            const response = await fetch(`${baseUrl}${endpoint}`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify(payload)
-            });
+            const response = await fetch(`${baseUrl}${endpoint}`, request);
             
             console.log("Response status:", response.status);
             
-            if (!response.ok) {
+            const data = await response.json().catch(() => ({}));
+
+            // Timed-out problems still come back with a readable response
+            if (!response.ok && !data.timed_out) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
-            
-            const data = await response.json();
             console.log("Received data:", data);
             
             // Hide loading indicator
@@ -198,6 +294,62 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
     
+    // Formula suggestions while typing: debounced, cached per query, and
+    // superseded requests are aborted so only the latest one is answered
+    const suggestionList = document.getElementById('formula-suggestions');
+    const suggestionCache = new Map();
+    const SUGGEST_DELAY_MS = 150;
+    let suggestTimer = null;
+    let suggestController = null;
+    
+    function showSuggestions(suggestions) {
+        suggestionList.innerHTML = '';
+        suggestions.forEach((suggestion) => {
+            const option = document.createElement('option');
+            option.value = suggestion.completion;
+            option.label = suggestion.path ? `${suggestion.label} (${suggestion.path})` : suggestion.label;
+            suggestionList.appendChild(option);
+        });
+    }
+    
+    async function fetchSuggestions(query) {
+        if (suggestionCache.has(query)) {
+            showSuggestions(suggestionCache.get(query));
+            return;
+        }
+        if (suggestController) {
+            suggestController.abort();
+        }
+        suggestController = window.AbortController ? new AbortController() : null;
+        try {
+            const response = await fetch(`http://localhost:5001/api/formula_suggest?q=${encodeURIComponent(query)}`, {
+                signal: suggestController ? suggestController.signal : undefined
+            });
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            suggestionCache.set(query, data.suggestions || []);
+            if (userInput.value === query) {
+                showSuggestions(data.suggestions || []);
+            }
+        } catch (error) {
+            if (error.name !== 'AbortError') {
+                console.error('Error fetching formula suggestions:', error);
+            }
+        }
+    }
+    
+    userInput.addEventListener('input', () => {
+        clearTimeout(suggestTimer);
+        const query = userInput.value;
+        if (query.trim().length < 2) {
+            showSuggestions([]);
+            return;
+        }
+        suggestTimer = setTimeout(() => fetchSuggestions(query), SUGGEST_DELAY_MS);
+    });
+    
     // Event listeners for sending messages
     sendBtn.addEventListener('click', () => sendMessage(userInput.value.trim()));
     
@@ -269,8 +421,11 @@ document.addEventListener('DOMContentLoaded', function() {
         retakeBtn.style.display = 'block';
         sendImageBtn.style.display = 'block';
         
-        // Get base64 image data
-        capturedImage = cameraCanvas.toDataURL('image/jpeg');
+        // Get the frame as a JPEG Blob (sent as is, without base64 encoding)
+        capturedImage = null;
+        cameraCanvas.toBlob((blob) => {
+            capturedImage = blob;
+        }, 'image/jpeg', 0.9);
     }
     
     function sendCapturedImage() {
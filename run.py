@@ -35,6 +35,9 @@ def main():
     parser.add_argument("--no-browser", action="store_true", help="Don't open the browser automatically")
     parser.add_argument("--formula-file", type=str, default="expanded_formulas.json", 
                       help="Formula file to use (math_formulas.json or expanded_formulas.json)")
+    parser.add_argument("--production", action="store_true",
+                      help="Run under the multi-worker production server (backend/serve.py)")
+    parser.add_argument("--workers", type=int, help="Worker processes for --production")
     args = parser.parse_args()
     
     print("Starting Mathly - AI Math Assistant...")
@@ -50,8 +53,14 @@ def main():
     
     # Start the Flask server
     print("\nStarting the backend server...")
+    if args.production:
+        server_cmd = [sys.executable, os.path.join(backend_dir, "serve.py"), f"--port={args.port}"]
+        if args.workers:
+            server_cmd.append(f"--workers={args.workers}")
+    else:
+        server_cmd = ["python", os.path.join(backend_dir, "app.py")]
     server_process = subprocess.Popen(
-        ["python", os.path.join(backend_dir, "app.py")],
+        server_cmd,
         cwd=backend_dir
     )
     
@@ -41,6 +41,11 @@ def main():
     parser.add_argument("--formula-file", type=str, choices=["math_formulas.json", "expanded_formulas.json"], 
                       default="expanded_formulas.json", 
                       help="Formula file to use")
+    parser.add_argument("--production", action="store_true",
+                      help="Run under the multi-worker production server (backend/serve.py)")
+    parser.add_argument("--workers", type=int, help="Worker processes for --production")
+    parser.add_argument("--threads", type=int, help="Threads per worker for --production")
+    parser.add_argument("--asgi", action="store_true", help="With --production, answer chats with the async pipeline")
     args = parser.parse_args()
     
     print("Starting Mathly - AI Math Assistant...")
@@ -68,9 +73,18 @@ def main():
     
     # Start the Flask server with the specified port
     print(f"\nStarting the backend server on port {args.port}...")
-    server_cmd = [sys.executable, os.path.join(backend_dir, "app.py")]
-    if args.port != 5000:
-        server_cmd.append(f"--port={args.port}")
+    if args.production:
+        server_cmd = [sys.executable, os.path.join(backend_dir, "serve.py"), f"--port={args.port}"]
+        if args.workers:
+            server_cmd.append(f"--workers={args.workers}")
+        if args.threads:
+            server_cmd.append(f"--threads={args.threads}")
+        if args.asgi:
+            server_cmd.append("--asgi")
+    else:
+        server_cmd = [sys.executable, os.path.join(backend_dir, "app.py")]
+        if args.port != 5000:
+            server_cmd.append(f"--port={args.port}")
         
     server_process = subprocess.Popen(
         server_cmd,